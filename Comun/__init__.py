@@ -0,0 +1,6 @@
+# ~/Comun/__init__.py
+"""
+Módulos compartidos por la API (Project/), el gateway (Mqtt/) y el simulador (Nodo/).
+Solo dependen de la librería estándar y no importan Project, así el gateway y el
+simulador no necesitan Flask ni SQLAlchemy.
+"""
@@ -0,0 +1,162 @@
+# ~/Comun/codec_binario.py
+import struct
+import calendar
+from datetime import datetime, timedelta
+
+"""
+Formato binario compacto para las lecturas de los collares (uplink).
+Solo depende de la librería estándar y no importa Project: lo usan el simulador (Nodo/),
+el gateway (Mqtt/) y el blueprint api_gateway, sin que los dos primeros necesiten Flask.
+
+Cada trama tiene un encabezado de largo variable seguido de un cuerpo de largo fijo
+(little endian):
+
+    Encabezado
+        B   versión del formato (VERSION)
+        B   flags: qué campos vienen informados (ver FLAG_*)
+        B   largo del client_id en bytes (N)
+        Ns  client_id en UTF-8
+
+    Cuerpo (22 bytes)
+        I   timestamp del dispositivo en segundos desde 1970-01-01 (hora local del collar)
+        i   latitud  en microgrados (lat * 1e6)
+        i   longitud en microgrados (lon * 1e6)
+        h   temperatura corporal en centésimas de grado
+        h   temperatura ambiente en centésimas de grado
+        h   acelerómetro x en centésimas
+        h   acelerómetro y en centésimas
+        h   acelerómetro z en centésimas
+
+Una lectura típica ocupa ~40 bytes contra ~250 del JSON. Un lote es simplemente la
+concatenación de tramas.
+"""
+
+VERSION = 1
+TIPO_CONTENIDO = "application/octet-stream"
+
+FLAG_POSICION = 0x01
+FLAG_TEMPERATURA = 0x02
+FLAG_TEMPERATURA_AMBIENTE = 0x04
+FLAG_ACELEROMETRO = 0x08
+
+_ENCABEZADO = struct.Struct("<BBB")
+_CUERPO = struct.Struct("<Iiihhhhh")
+_EPOCA = datetime(1970, 1, 1)
+
+
+def _a_epoch(timestamp):
+    # El timestamp del collar es hora local sin zona: se guarda y recupera tal cual
+    return calendar.timegm(timestamp.timetuple())
+
+
+def codificar_lectura(client_id, timestamp, lat=None, lon=None, temperatura=None,
+                      temperatura_ambiente=None, acelerometro=None):
+    """Codifica una lectura en una trama binaria."""
+    cid = client_id.encode("utf-8")
+    if len(cid) > 255:
+        raise ValueError("El client_id no puede superar 255 bytes")
+
+    flags = 0
+    if lat is not None and lon is not None:
+        flags |= FLAG_POSICION
+    if temperatura is not None:
+        flags |= FLAG_TEMPERATURA
+    if temperatura_ambiente is not None:
+        flags |= FLAG_TEMPERATURA_AMBIENTE
+    if acelerometro:
+        flags |= FLAG_ACELEROMETRO
+
+    acelerometro = acelerometro or {}
+    return (
+        _ENCABEZADO.pack(VERSION, flags, len(cid))
+        + cid
+        + _CUERPO.pack(
+            _a_epoch(timestamp),
+            round(lat * 1e6) if flags & FLAG_POSICION else 0,
+            round(lon * 1e6) if flags & FLAG_POSICION else 0,
+            round(temperatura * 100) if temperatura is not None else 0,
+            round(temperatura_ambiente * 100) if temperatura_ambiente is not None else 0,
+            round(acelerometro.get("x", 0) * 100),
+            round(acelerometro.get("y", 0) * 100),
+            round(acelerometro.get("z", 0) * 100),
+        )
+    )
+
+
+def codificar_payload(payload):
+    """Codifica un payload con la misma forma que el JSON del simulador."""
+    timestamp = payload["timestamp"]
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return codificar_lectura(
+        payload["client_id"],
+        timestamp,
+        lat=payload.get("lat"),
+        lon=payload.get("lon"),
+        temperatura=payload.get("temperatura"),
+        temperatura_ambiente=payload.get("temperatura_ambiente"),
+        acelerometro=payload.get("acelerometro"),
+    )
+
+
+def es_binario(payload):
+    """Indica si un payload crudo es una trama binaria (y no JSON)."""
+    return len(payload) > 0 and payload[0] == VERSION
+
+
+def leer_client_id(trama):
+    """
+    Devuelve el client_id de una trama sin decodificar el resto (lo usa el gateway).
+    Lanza ValueError si la trama está mal formada.
+    """
+    if len(trama) < _ENCABEZADO.size or len(trama) < _ENCABEZADO.size + trama[2]:
+        raise ValueError("Trama truncada")
+    largo = trama[2]
+    return bytes(trama[3:3 + largo]).decode("utf-8")
+
+
+def decodificar_lote(buffer):
+    """
+    Decodifica una o varias tramas concatenadas.
+    Devuelve dos listas paralelas: client_ids y lecturas (con la misma forma que
+    Services.ingesta.parsear_lectura). Lanza ValueError si el buffer está truncado o
+    tiene una versión desconocida.
+    """
+    vista = memoryview(buffer)
+    total = len(vista)
+    encabezado = _ENCABEZADO.unpack_from
+    cuerpo = _CUERPO.unpack_from
+    largo_cuerpo = _CUERPO.size
+    epoca = _EPOCA
+
+    client_ids = []
+    lecturas = []
+    offset = 0
+    while offset < total:
+        if total - offset < _ENCABEZADO.size:
+            raise ValueError(f"Trama truncada en el byte {offset}")
+        version, flags, largo = encabezado(vista, offset)
+        if version != VERSION:
+            raise ValueError(f"Versión de trama desconocida ({version}) en el byte {offset}")
+
+        inicio_cuerpo = offset + 3 + largo
+        if inicio_cuerpo + largo_cuerpo > total:
+            raise ValueError(f"Trama truncada en el byte {offset}")
+
+        epoch, lat, lon, temp, amb, ax, ay, az = cuerpo(vista, inicio_cuerpo)
+
+        client_ids.append(bytes(vista[offset + 3:inicio_cuerpo]).decode("utf-8"))
+        lecturas.append({
+            "timestamp": epoca + timedelta(seconds=epoch),
+            "lat": lat / 1e6 if flags & FLAG_POSICION else None,
+            "lon": lon / 1e6 if flags & FLAG_POSICION else None,
+            "temperatura": temp / 100 if flags & FLAG_TEMPERATURA else None,
+            "temperatura_ambiente": amb / 100 if flags & FLAG_TEMPERATURA_AMBIENTE else None,
+            "acelerometro": (
+                {"x": ax / 100, "y": ay / 100, "z": az / 100}
+                if flags & FLAG_ACELEROMETRO else None
+            ),
+        })
+        offset = inicio_cuerpo + largo_cuerpo
+
+    return client_ids, lecturas
@@ -0,0 +1,47 @@
+# ~/Comun/particiones.py
+import re
+import zlib
+
+"""
+Particionado de la telemetría MQTT por collar. Solo depende de la librería estándar y no
+importa Project: lo usan el simulador (Nodo/) y el gateway (Mqtt/).
+
+Con topics particionados cada collar publica siempre en
+
+    <topic base>/<particion>/<client_id>      (particion = crc32(client_id) % NUM_PARTICIONES)
+
+y cada instancia del gateway se suscribe solo a sus particiones, así todas las lecturas de
+un collar pasan por la misma instancia y mantienen su orden. Dentro de la instancia el mismo
+hash elige el worker, por lo que el orden se conserva también al reenviar.
+
+Se usa crc32 y no hash() porque el de Python cambia entre procesos.
+"""
+
+NUM_PARTICIONES = 16
+
+_CLIENT_ID_JSON = re.compile(rb'"client_id"\s*:\s*"([^"]+)"')
+
+
+def particion(client_id, total=NUM_PARTICIONES):
+    return zlib.crc32(client_id.encode("utf-8")) % total
+
+
+def topic_particionado(base, client_id, total=NUM_PARTICIONES):
+    return f"{base}/{particion(client_id, total)}/{client_id}"
+
+
+def particiones_de_instancia(instancia, instancias, total=NUM_PARTICIONES):
+    """Particiones que atiende la instancia 'instancia' (0..instancias-1) del gateway."""
+    return [p for p in range(total) if p % instancias == instancia]
+
+
+def client_id_de_mensaje(topic, payload, base):
+    """
+    client_id de un mensaje sin decodificarlo entero: del topic particionado si lo es, o
+    del JSON con una búsqueda simple. Devuelve None si no se encuentra (las tramas binarias
+    se resuelven con codec_binario.leer_client_id).
+    """
+    if topic.startswith(base + "/"):
+        return topic.rsplit("/", 1)[-1]
+    encontrado = _CLIENT_ID_JSON.search(payload)
+    return encontrado.group(1).decode("utf-8", "replace") if encontrado else None
@@ -0,0 +1,19 @@
+# ~/Comun/tiempo.py
+from datetime import datetime
+
+"""
+Timestamps de las lecturas: los comparten la API (Services/ingesta.py) y la pre-agregación
+del gateway (Mqtt/agregacion.py), para que las dos ubiquen una lectura en el mismo instante.
+"""
+
+
+def parsear_timestamp(valor):
+    """
+    Convierte el timestamp ISO 8601 del collar ("%Y-%m-%dT%H:%M:%S", con o sin fracción).
+    fromisoformat es bastante más rápido que strptime. Si trae zona horaria se pasa a hora
+    local sin zona, que es como se guardan los timestamps.
+    """
+    timestamp = datetime.fromisoformat(valor)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return timestamp
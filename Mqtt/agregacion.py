@@ -0,0 +1,243 @@
+import json
+import math
+import time
+import threading
+from datetime import datetime
+from Comun.codec_binario import es_binario, decodificar_lote
+from Comun.tiempo import parsear_timestamp
+
+"""
+Pre-agregación en el borde (gateway): en lugar de reenviar cada lectura cruda, se acumulan
+ventanas por collar (por defecto de un minuto, según el timestamp del dispositivo) y al
+cerrarse cada ventana se reenvía un resumen:
+
+    - la última posición (y su timestamp),
+    - temperatura corporal y ambiente promedio,
+    - acelerómetro promedio,
+    - y en "resumen": cantidad de lecturas, mínimo y máximo de temperatura corporal y
+      media/mínimo/máximo de la magnitud del acelerómetro.
+
+El resumen tiene la misma forma que una lectura JSON del collar, así la API lo guarda como
+una lectura más: la última posición y los promedios. Los campos de "resumen" no se guardan
+(parsear_lectura los ignora); solo quedan en el mensaje, por ejemplo en el spool o en
+dead_letter si el reenvío falla.
+
+Las lecturas anómalas (fiebre, hipotermia, aceleración fuera de rango) se reenvían además
+en el momento, sin esperar al cierre de la ventana. Los mensajes que no se pueden
+interpretar pasan tal cual, para que el reenvío los rechace y queden en dead_letter.
+
+Una ventana se cierra cuando llega una lectura del mismo collar de una ventana posterior,
+o cuando pasa un tiempo sin lecturas (vencidas()). Lo que devuelven vencidas() y vaciar()
+ya está agregado: se reenvía (o va al spool) directamente, sin volver a pasar por procesar().
+"""
+
+
+def _magnitud(acelerometro):
+    if not acelerometro:
+        return None
+    try:
+        return math.sqrt(sum(float(acelerometro.get(eje) or 0) ** 2 for eje in ("x", "y", "z")))
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class Ventana:
+    __slots__ = (
+        "inicio", "topic", "lecturas", "actualizada", "representativa",
+        "temp_suma", "temp_n", "temp_min", "temp_max",
+        "amb_suma", "amb_n",
+        "acel_suma", "acel_n", "acel_min", "acel_max", "acel_ejes",
+    )
+
+    def __init__(self, inicio, topic):
+        self.inicio = inicio
+        self.topic = topic
+        self.lecturas = 0
+        self.actualizada = time.monotonic()
+        self.representativa = None  # última lectura no reenviada como anómala
+        self.temp_suma = 0.0
+        self.temp_n = 0
+        self.temp_min = None
+        self.temp_max = None
+        self.amb_suma = 0.0
+        self.amb_n = 0
+        self.acel_suma = 0.0
+        self.acel_n = 0
+        self.acel_min = None
+        self.acel_max = None
+        self.acel_ejes = [0.0, 0.0, 0.0]
+
+    def agregar(self, lectura, anomala):
+        self.lecturas += 1
+        self.actualizada = time.monotonic()
+
+        temperatura = lectura.get("temperatura")
+        if temperatura is not None:
+            self.temp_suma += temperatura
+            self.temp_n += 1
+            self.temp_min = temperatura if self.temp_min is None else min(self.temp_min, temperatura)
+            self.temp_max = temperatura if self.temp_max is None else max(self.temp_max, temperatura)
+
+        ambiente = lectura.get("temperatura_ambiente")
+        if ambiente is not None:
+            self.amb_suma += ambiente
+            self.amb_n += 1
+
+        acelerometro = lectura.get("acelerometro")
+        magnitud = _magnitud(acelerometro)
+        if magnitud is not None:
+            self.acel_suma += magnitud
+            self.acel_n += 1
+            self.acel_min = magnitud if self.acel_min is None else min(self.acel_min, magnitud)
+            self.acel_max = magnitud if self.acel_max is None else max(self.acel_max, magnitud)
+            for i, eje in enumerate(("x", "y", "z")):
+                self.acel_ejes[i] += float(acelerometro.get(eje) or 0)
+
+        # La anómala ya se guardó con su timestamp: el resumen usa otra para no pisarla
+        if not anomala and (
+            self.representativa is None or lectura["timestamp"] >= self.representativa["timestamp"]
+        ):
+            self.representativa = lectura
+
+    def resumen(self, client_id):
+        """Lectura JSON que resume la ventana, o None si todas se reenviaron como anómalas."""
+        base = self.representativa
+        if base is None:
+            return None
+
+        lectura = {
+            "client_id": client_id,
+            "timestamp": base["timestamp"].isoformat(timespec="seconds"),
+            "lat": base.get("lat"),
+            "lon": base.get("lon"),
+            "temperatura": round(self.temp_suma / self.temp_n, 2) if self.temp_n else None,
+            "temperatura_ambiente": round(self.amb_suma / self.amb_n, 2) if self.amb_n else None,
+            "acelerometro": (
+                {eje: round(v / self.acel_n, 3) for eje, v in zip(("x", "y", "z"), self.acel_ejes)}
+                if self.acel_n else None
+            ),
+            "resumen": {
+                "ventana_inicio": self.inicio.isoformat(timespec="seconds"),
+                "lecturas": self.lecturas,
+                "temperatura_min": self.temp_min,
+                "temperatura_max": self.temp_max,
+                "acel_magnitud_media": round(self.acel_suma / self.acel_n, 3) if self.acel_n else None,
+                "acel_magnitud_min": round(self.acel_min, 3) if self.acel_min is not None else None,
+                "acel_magnitud_max": round(self.acel_max, 3) if self.acel_max is not None else None,
+            },
+        }
+        return (self.topic, json.dumps(lectura, separators=(",", ":")).encode("utf-8"))
+
+
+class AgregadorVentanas:
+    def __init__(self, ventana_s=60, temp_max=39.5, temp_min=37.0, acel_max=20.0):
+        self.ventana_s = ventana_s
+        self.temp_max = temp_max
+        self.temp_min = temp_min
+        self.acel_max = acel_max
+        self._ventanas = {}  # client_id -> Ventana
+        self._lock = threading.Lock()
+
+        self.recibidas = 0
+        self.anomalas = 0
+        self.resumenes = 0
+        self.sin_interpretar = 0
+
+    def es_anomala(self, lectura):
+        temperatura = lectura.get("temperatura")
+        if temperatura is not None and (temperatura >= self.temp_max or temperatura <= self.temp_min):
+            return True
+        magnitud = _magnitud(lectura.get("acelerometro"))
+        return magnitud is not None and magnitud >= self.acel_max
+
+    def _inicio_ventana(self, timestamp):
+        segundos = int(timestamp.timestamp())
+        return datetime.fromtimestamp(segundos - segundos % self.ventana_s)
+
+    @staticmethod
+    def _lecturas(payload):
+        """Lecturas (client_id, lectura) de un mensaje; lanza ValueError si no se puede interpretar."""
+        if es_binario(payload):
+            client_ids, lecturas = decodificar_lote(payload)
+            for client_id, lectura in zip(client_ids, lecturas):
+                lectura["client_id"] = client_id
+            return lecturas
+
+        data = json.loads(payload)
+        if not isinstance(data, dict) or not data.get("client_id") or not data.get("timestamp"):
+            raise ValueError("Lectura sin client_id o timestamp")
+        # Igual que la API: con zona horaria se pasa a hora local, no se descarta la zona
+        data["timestamp"] = parsear_timestamp(data["timestamp"])
+        return [data]
+
+    def procesar(self, mensajes):
+        """
+        Incorpora mensajes (topic, payload, ...) a las ventanas.
+        Devuelve los mensajes a reenviar ya: lecturas anómalas, resúmenes de ventanas que se
+        cerraron y mensajes que no se pudieron interpretar.
+        """
+        salida = []
+        with self._lock:
+            for mensaje in mensajes:
+                topic, payload = mensaje[0], mensaje[1]
+                try:
+                    lecturas = self._lecturas(payload)
+                except (ValueError, TypeError):
+                    self.sin_interpretar += 1
+                    salida.append(mensaje)
+                    continue
+
+                for lectura in lecturas:
+                    self.recibidas += 1
+                    client_id = lectura["client_id"]
+                    inicio = self._inicio_ventana(lectura["timestamp"])
+
+                    ventana = self._ventanas.get(client_id)
+                    if ventana is not None and inicio > ventana.inicio:
+                        salida.extend(self._cerrar(client_id))
+                        ventana = None
+                    if ventana is None:
+                        ventana = self._ventanas[client_id] = Ventana(inicio, topic)
+
+                    # Una lectura atrasada de una ventana ya cerrada se suma a la actual
+                    anomala = self.es_anomala(lectura)
+                    ventana.agregar(lectura, anomala)
+                    if anomala:
+                        self.anomalas += 1
+                        salida.append((topic, self._a_json(lectura)))
+        return salida
+
+    @staticmethod
+    def _a_json(lectura):
+        datos = dict(lectura, timestamp=lectura["timestamp"].isoformat(timespec="seconds"))
+        return json.dumps(datos, separators=(",", ":")).encode("utf-8")
+
+    def _cerrar(self, client_id):
+        ventana = self._ventanas.pop(client_id)
+        resumen = ventana.resumen(client_id)
+        if resumen is None:
+            return []
+        self.resumenes += 1
+        return [resumen]
+
+    def vencidas(self, espera_s=None):
+        """Cierra las ventanas sin lecturas nuevas hace más de 'espera_s' (por defecto, una ventana)."""
+        limite = time.monotonic() - (self.ventana_s if espera_s is None else espera_s)
+        salida = []
+        with self._lock:
+            for client_id in [c for c, v in self._ventanas.items() if v.actualizada < limite]:
+                salida.extend(self._cerrar(client_id))
+        return salida
+
+    def vaciar(self):
+        """Cierra todas las ventanas (al apagar el gateway)."""
+        return self.vencidas(espera_s=-1)
+
+    def estadisticas(self):
+        return {
+            "agregacion_recibidas": self.recibidas,
+            "agregacion_anomalas": self.anomalas,
+            "agregacion_resumenes": self.resumenes,
+            "agregacion_sin_interpretar": self.sin_interpretar,
+            "agregacion_ventanas_abiertas": len(self._ventanas),
+        }
@@ -0,0 +1,363 @@
+import os
+import sys
+import ssl
+import gzip
+import json
+import time
+import asyncio
+import logging
+import argparse
+import aiohttp
+import aiomqtt
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import mqtt_gateway_server as gw
+from Comun.codec_binario import es_binario, leer_client_id, TIPO_CONTENIDO as TIPO_BINARIO
+from Comun.particiones import particion, client_id_de_mensaje
+
+"""
+Variante asyncio del gateway MQTT -> API (requiere: pip install aiomqtt aiohttp).
+
+Un solo event loop recibe de MQTT (aiomqtt) y reenvía con aiohttp, con miles de POSTs en
+vuelo sin un hilo por petición. Reutiliza la configuración de mqtt_gateway_server.py
+(broker, TLS, topic, modo de suscripción, modo de reenvío, spool) y sus funciones
+puras (agrupar lotes, clasificar respuestas, estadísticas).
+
+Cada collar se asigna siempre a la misma tarea de reenvío (por hash de client_id), así sus
+lecturas se reenvían en orden; hay NUM_TAREAS tareas, cada una con su cola.
+El spool en disco (SQLite) se usa a través de asyncio.to_thread para no bloquear el loop.
+"""
+
+# =============================
+# CONFIGURACIÓN
+# =============================
+NUM_TAREAS = 512                 # Tareas de reenvío concurrentes (= POSTs en vuelo como máximo)
+# Mensajes en espera por tarea antes de pasar al spool. No se reparte gw.MAX_COLA entre las
+# tareas: con 512 quedarían ~19 lugares, la ráfaga de unos pocos collares iría directo al
+# spool y los lotes serían mínimos. Con dos lotes completos (gw.LOTE_MAX_MENSAJES) de
+# margen, el peor caso es NUM_TAREAS * MAX_COLA_TAREA mensajes en memoria.
+MAX_COLA_TAREA = 1000
+MAX_CONEXIONES = 256             # Conexiones keep-alive simultáneas con la API
+ESPERA_RECONEXION = 5            # Segundos antes de reintentar la conexión al broker
+USAR_TLS = True                  # False solo para pruebas locales (--sin-tls)
+
+colas = []
+sesion = None
+
+
+# =============================
+# REENVÍO
+# =============================
+async def post(url, cuerpo, headers, cantidad):
+    """POST a la API. Devuelve (resultado, resultados por lectura si respondió 207, o None)."""
+    inicio = time.perf_counter()
+    try:
+        async with sesion.post(url, data=cuerpo, headers=headers) as response:
+            texto = await response.text()
+            status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        gw.estadisticas.registrar_envio(False, time.perf_counter() - inicio, cantidad)
+        logging.error(f"Error de red al enviar {cantidad} lecturas a la API: {e!r}")
+        return gw.REINTENTAR, None
+
+    gw.estadisticas.registrar_envio(status in (200, 202, 207), time.perf_counter() - inicio, cantidad)
+    if status not in (200, 202, 207):
+        logging.warning(f"Fallo en la API: {status} - {texto}")
+    return gw.clasificar_respuesta(status), gw.leer_resultados(status, texto)
+
+
+async def enviar_individual(topic, payload):
+    """Reenvía un mensaje tal cual llegó (JSON o trama binaria) a /api/datos."""
+    try:
+        if es_binario(payload):
+            client_id = leer_client_id(payload)
+            tipo = TIPO_BINARIO
+        else:
+            data = json.loads(payload)
+            client_id = data.get("client_id") if isinstance(data, dict) else None
+            tipo = "application/json"
+    except ValueError:
+        logging.error(f"Mensaje de '{topic}' mal formado, descartado")
+        return gw.RECHAZADO
+
+    if not client_id:
+        logging.warning("Mensaje recibido sin client_id, descartado")
+        return gw.RECHAZADO
+
+    headers = {"X-Client-ID": client_id, "Content-Type": tipo}
+    resultado, _ = await post(gw.API_ENDPOINT, payload, headers, 1)
+    return resultado
+
+
+async def enviar_lote(mensajes):
+    """Como gw.enviar_lote: un POST gzip por grupo. Devuelve (reintentar, rechazados)."""
+    if gw.MODO_REENVIO == "directo":
+        return await asyncio.to_thread(gw.guardar_lote_directo, mensajes)
+
+    grupos, rechazados = gw.agrupar_lote(mensajes)
+    reintentar = []
+    for cuerpo, tipo, originales in grupos:
+        headers = {"Content-Type": tipo, "Content-Encoding": "gzip"}
+        comprimido = gzip.compress(cuerpo, compresslevel=gw.NIVEL_GZIP)
+        resultado, resultados = await post(gw.API_BATCH_ENDPOINT, comprimido, headers, len(originales))
+        if resultados is not None:
+            fallidos, descartados = gw.repartir_resultados(originales, tipo, resultados)
+            reintentar.extend(fallidos)
+            rechazados.extend(descartados)
+            gw.estadisticas.sumar("lotes")
+        elif resultado == gw.REINTENTAR:
+            reintentar.extend(originales)
+        elif resultado == gw.RECHAZADO:
+            rechazados.extend(originales)
+        else:
+            gw.estadisticas.sumar("lotes")
+    return reintentar, rechazados
+
+
+async def tomar_lote(cola):
+    """Espera el primer mensaje y junta los siguientes hasta completar el lote o el tiempo."""
+    loop = asyncio.get_running_loop()
+    lote = [await cola.get()]
+    limite = loop.time() + gw.LOTE_MAX_ESPERA_MS / 1000
+    while len(lote) < gw.LOTE_MAX_MENSAJES:
+        if not cola.empty():
+            lote.append(cola.get_nowait())
+            continue
+        restante = limite - loop.time()
+        if restante <= 0:
+            break
+        try:
+            lote.append(await asyncio.wait_for(cola.get(), restante))
+        except asyncio.TimeoutError:
+            break
+    return lote
+
+
+async def tarea_reenvio(cola):
+    while True:
+        if gw.MODO_REENVIO == "individual":
+            lote = [await cola.get()]
+        else:
+            lote = await tomar_lote(cola)
+
+        try:
+            if gw.MODO_REENVIO == "individual":
+                resultado = await enviar_individual(*lote[0])
+                reintentar = lote if resultado == gw.REINTENTAR else []
+                rechazados = lote if resultado == gw.RECHAZADO else []
+            else:
+                if gw.AGREGACION_ACTIVA:
+                    lote_salida = gw.agregador.procesar(lote)
+                else:
+                    lote_salida = lote
+                reintentar, rechazados = await enviar_lote(lote_salida) if lote_salida else ([], [])
+
+            if reintentar:
+                await asyncio.to_thread(gw.a_spool, reintentar, "reenvío fallido")
+            if rechazados:
+                await asyncio.to_thread(gw.a_dead_letter, rechazados, "rechazado")
+        except Exception as e:
+            logging.exception(f"Error inesperado al reenviar: {e}")
+            await asyncio.to_thread(gw.a_spool, lote, str(e))
+        finally:
+            for _ in lote:
+                cola.task_done()
+
+
+async def reenviar_spool():
+    """Igual que gw.reenviar_spool: en orden, a ritmo limitado y con espera creciente si falla."""
+    espera_error = 1
+    while True:
+        try:
+            pendientes = await asyncio.to_thread(gw.spool.tomar, gw.LOTE_MAX_MENSAJES)
+        except Exception as e:
+            logging.exception(f"Error al leer el spool: {e}")
+            await asyncio.sleep(gw.REPLAY_ESPERA_MAX)
+            continue
+
+        if not pendientes:
+            await asyncio.sleep(1)
+            continue
+
+        inicio = time.monotonic()
+        try:
+            reintentar, rechazados = await enviar_lote(pendientes)
+            fallo = await asyncio.to_thread(gw.actualizar_spool, pendientes, reintentar, rechazados)
+        except Exception as e:
+            logging.exception(f"Error inesperado al reenviar el spool; se reintenta en {espera_error}s: {e}")
+            await asyncio.to_thread(gw.fallar_spool, pendientes, e)
+            await asyncio.sleep(espera_error)
+            espera_error = min(espera_error * 2, gw.REPLAY_ESPERA_MAX)
+            continue
+        if fallo:
+            logging.warning(f"La API sigue sin responder; {len(reintentar)} mensajes del spool se reintentan en {espera_error}s")
+            await asyncio.sleep(espera_error)
+            espera_error = min(espera_error * 2, gw.REPLAY_ESPERA_MAX)
+            continue
+
+        espera_error = 1
+        await asyncio.sleep(max(0, gw.espera_replay(len(pendientes)) - (time.monotonic() - inicio)))
+
+
+async def cerrar_ventanas_vencidas():
+    """Como gw.cerrar_ventanas_vencidas: los resúmenes se reenvían sin volver al agregador."""
+    while True:
+        await asyncio.sleep(max(1, gw.AGREGACION_VENTANA_S / 4))
+        resumenes = gw.agregador.vencidas()
+        if not resumenes:
+            continue
+        try:
+            reintentar, rechazados = await enviar_lote(resumenes)
+            if reintentar:
+                await asyncio.to_thread(gw.a_spool, reintentar, "reenvío fallido")
+            if rechazados:
+                await asyncio.to_thread(gw.a_dead_letter, rechazados, "rechazado")
+        except Exception as e:
+            logging.exception(f"Error inesperado al reenviar resúmenes de ventanas: {e}")
+            await asyncio.to_thread(gw.a_spool, resumenes, str(e))
+
+
+async def refrescar_cache_nodos():
+    while True:
+        await asyncio.sleep(gw.DIRECTO_REFRESCO_CACHE)
+        # Crea la app la primera vez y toca la sesión de la base: fuera del event loop
+        await asyncio.to_thread(gw.invalidar_cache_nodos)
+
+
+async def reportar_estadisticas():
+    while True:
+        await asyncio.sleep(gw.INTERVALO_ESTADISTICAS)
+        resumen = await asyncio.to_thread(gw.estadisticas.resumen)
+        logging.info(f"Estadísticas del gateway async: {resumen}")
+
+
+# =============================
+# RECEPCIÓN MQTT
+# =============================
+def indice_tarea(topic, payload):
+    client_id = client_id_de_mensaje(topic, payload, gw.TOPIC)
+    if client_id is None and es_binario(payload):
+        try:
+            client_id = leer_client_id(payload)
+        except ValueError:
+            pass
+    return particion(client_id, len(colas)) if client_id else 0
+
+
+async def encolar(topic, payload):
+    try:
+        colas[indice_tarea(topic, payload)].put_nowait((topic, payload))
+    except asyncio.QueueFull:
+        logging.warning(f"Cola de reenvío llena ({MAX_COLA_TAREA}), mensaje de '{topic}' al spool")
+        await asyncio.to_thread(gw.a_spool, [(topic, payload)], "cola llena")
+
+
+async def recibir():
+    tls = aiomqtt.TLSParameters(
+        ca_certs=gw.CA_CERT,
+        certfile=gw.CLIENT_CERT,
+        keyfile=gw.CLIENT_KEY,
+        tls_version=ssl.PROTOCOL_TLSv1_2,
+    ) if USAR_TLS else None
+    while True:
+        try:
+            async with aiomqtt.Client(
+                hostname=gw.BROKER,
+                port=gw.PORT,
+                identifier=f"gateway-async-{gw.INSTANCIA}",
+                protocol=aiomqtt.ProtocolVersion.V5,
+                tls_params=tls,
+                tls_insecure=False if USAR_TLS else None,
+                keepalive=60,
+            ) as client:
+                filtros = gw.suscripciones()
+                await client.subscribe([(filtro, 0) for filtro in filtros])
+                logging.info(f"Conexión exitosa al broker MQTT; suscripto a {filtros}")
+
+                async for message in client.messages:
+                    topic = str(message.topic)
+                    payload = bytes(message.payload)
+                    gw.estadisticas.sumar("recibidos")
+                    await encolar(topic, payload)
+
+        except aiomqtt.MqttError as e:
+            logging.error(f"Conexión con el broker perdida: {e}; reintento en {ESPERA_RECONEXION}s")
+            await asyncio.sleep(ESPERA_RECONEXION)
+
+
+async def main():
+    global sesion
+
+    colas[:] = [asyncio.Queue(maxsize=MAX_COLA_TAREA) for _ in range(NUM_TAREAS)]
+    # Las estadísticas compartidas informan la profundidad de estas colas
+    gw.colas[:] = colas
+
+    conector = aiohttp.TCPConnector(limit=MAX_CONEXIONES, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=gw.TIMEOUT_API)
+    async with aiohttp.ClientSession(connector=conector, timeout=timeout) as sesion:
+        tareas = [asyncio.create_task(tarea_reenvio(cola)) for cola in colas]
+        tareas.append(asyncio.create_task(reenviar_spool()))
+        tareas.append(asyncio.create_task(reportar_estadisticas()))
+        if gw.MODO_REENVIO == "directo":
+            tareas.append(asyncio.create_task(refrescar_cache_nodos()))
+        if gw.AGREGACION_ACTIVA and gw.MODO_REENVIO != "individual":
+            tareas.append(asyncio.create_task(cerrar_ventanas_vencidas()))
+
+        logging.info(
+            f"Gateway async {gw.INSTANCIA + 1}/{gw.NUM_INSTANCIAS} ({gw.MODO_SUSCRIPCION}) con "
+            f"{NUM_TAREAS} tareas de reenvío en modo '{gw.MODO_REENVIO}'"
+        )
+        try:
+            await recibir()
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+
+def vaciar_colas_al_spool():
+    restantes = []
+    for cola in colas:
+        while not cola.empty():
+            restantes.append(cola.get_nowait())
+    if gw.AGREGACION_ACTIVA:
+        restantes = gw.agregador.procesar(restantes) + gw.agregador.vaciar()
+    if restantes:
+        gw.a_spool(restantes, "cierre del gateway")
+        logging.info(f"{len(restantes)} mensajes sin reenviar guardados en el spool")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gateway MQTT -> API de ganado (asyncio)")
+    parser.add_argument("--suscripcion", choices=["unica", "compartida", "particionada"], default=gw.MODO_SUSCRIPCION)
+    parser.add_argument("--instancia", type=int, default=gw.INSTANCIA)
+    parser.add_argument("--instancias", type=int, default=gw.NUM_INSTANCIAS)
+    parser.add_argument("--reenvio", choices=["lotes", "individual", "directo"], default=gw.MODO_REENVIO)
+    parser.add_argument("--agregar", action="store_true", default=gw.AGREGACION_ACTIVA, help="Pre-agregar por ventanas")
+    parser.add_argument("--broker", default=gw.BROKER)
+    parser.add_argument("--puerto", type=int, default=gw.PORT)
+    parser.add_argument("--sin-tls", action="store_true", help="Conectar al broker sin TLS (pruebas locales)")
+    parser.add_argument("--api", help="URL base de la API (por defecto la de API_ENDPOINT)")
+    parser.add_argument("--spool", default=gw.ruta_con_sufijo(gw.SPOOL_RUTA, "_async"))
+    args = parser.parse_args()
+    gw.AGREGACION_ACTIVA = args.agregar
+    gw.MODO_SUSCRIPCION, gw.INSTANCIA, gw.NUM_INSTANCIAS = args.suscripcion, args.instancia, args.instancias
+    gw.MODO_REENVIO = args.reenvio
+    gw.BROKER, gw.PORT = args.broker, args.puerto
+    USAR_TLS = not args.sin_tls
+    if args.api:
+        gw.API_ENDPOINT = args.api.rstrip("/") + "/api/datos"
+        gw.API_BATCH_ENDPOINT = args.api.rstrip("/") + "/api/datos/batch"
+    gw.spool.ruta = gw.ruta_con_sufijo(args.spool, f"_{gw.INSTANCIA}")
+
+    # aiomqtt necesita un loop con add_reader/add_writer (en Windows, el selector)
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        vaciar_colas_al_spool()
+        logging.info(f"Estadísticas finales del gateway async: {gw.estadisticas.resumen()}")
+        gw.spool.cerrar()
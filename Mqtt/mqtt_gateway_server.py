@@ -1,10 +1,28 @@
+import os
+import sys
 import ssl
+import gzip
 import json
+import argparse
 import time
+import queue
 import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 import paho.mqtt.client as mqtt
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from Comun.codec_binario import es_binario, leer_client_id, decodificar_lote, TIPO_CONTENIDO as TIPO_BINARIO
+from Comun.particiones import (
+    NUM_PARTICIONES,
+    particion,
+    particiones_de_instancia,
+    client_id_de_mensaje,
+)
+from spool import Spool
+from agregacion import AgregadorVentanas
+
 # =============================
 # CONFIGURACIÓN
 # =============================
@@ -12,6 +30,19 @@ BROKER = "localhost"
 PORT = 8883
 TOPIC = "ganado/sensor"
 
+# Escalado horizontal: varias instancias del gateway se reparten los mensajes.
+#   "unica": esta instancia recibe todo (TOPIC y TOPIC/#)
+#   "compartida": suscripción compartida $share/GRUPO_COMPARTIDO/...; el broker reparte los
+#                 mensajes entre las instancias del grupo, sin garantizar el orden por collar
+#   "particionada": cada instancia atiende solo sus particiones TOPIC/<particion>/<client_id>
+#                   (ver Comun/particiones.py), así cada collar pasa siempre por la misma
+#                   instancia y conserva el orden. Los collares que publican en TOPIC sin
+#                   particionar se reparten con una suscripción compartida.
+MODO_SUSCRIPCION = "unica"
+GRUPO_COMPARTIDO = "gateways"
+INSTANCIA = 0                    # 0..NUM_INSTANCIAS-1 (también por --instancia)
+NUM_INSTANCIAS = 1
+
 # Ruta a certificados
 CA_CERT = "F:/TESINA/mqtt_certs/ca.crt"
 CLIENT_CERT = "F:/TESINA/mqtt_certs/client.crt"
@@ -19,6 +50,46 @@ CLIENT_KEY = "F:/TESINA/mqtt_certs/client.key"
 
 # Endpoint simulado (ajustar a tu API real más adelante)
 API_ENDPOINT = "http://localhost:5000/api/datos"
+API_BATCH_ENDPOINT = "http://localhost:5000/api/datos/batch"
+
+# Modo de reenvío:
+#   "lotes": se juntan hasta LOTE_MAX_MENSAJES mensajes o LOTE_MAX_ESPERA_MS milisegundos
+#            y se envían comprimidos con gzip en un solo POST a API_BATCH_ENDPOINT
+#   "individual": un POST por mensaje a API_ENDPOINT
+#   "directo": sin HTTP; los lotes se escriben en la base con el mismo servicio de ingesta que
+#              usa la API (Services/procesador_ingesta.py). Solo para instalaciones en un único
+#              equipo, donde el gateway ve el mismo archivo SQLite que la API.
+MODO_REENVIO = "lotes"
+LOTE_MAX_MENSAJES = 500          # No superar INGESTA_LOTE_MAX de la API
+LOTE_MAX_ESPERA_MS = 200
+NIVEL_GZIP = 5                   # 1 = más rápido, 9 = más chico
+
+# En modo "directo" los cambios de asignación hechos desde la API no invalidan la cache de
+# nodos de este proceso: se vacía cada tantos segundos
+DIRECTO_REFRESCO_CACHE = 30
+
+# Pre-agregación en el borde (ver agregacion.py), en los modos "lotes" y "directo": se
+# reenvía un resumen por collar y ventana, más las lecturas anómalas en el momento
+AGREGACION_ACTIVA = False
+AGREGACION_VENTANA_S = 60
+AGREGACION_TEMP_MAX = 39.5       # Fiebre: se reenvía la lectura cruda en el momento
+AGREGACION_TEMP_MIN = 37.0       # Hipotermia (o collar mal colocado)
+AGREGACION_ACEL_MAX = 20.0       # Magnitud del acelerómetro (m/s²); en reposo ronda 9.8
+
+# Reenvío a la API: on_message solo encola y estos hilos hacen los POST,
+# así una API lenta no bloquea el loop de red de MQTT (ni provoca desconexiones del broker).
+# Cada worker tiene su propia cola y los mensajes de un collar van siempre al mismo worker,
+# para que se reenvíen en el orden en que llegaron.
+NUM_WORKERS = 8                  # Hilos que reenvían a la API (cada uno con su sesión keep-alive)
+MAX_COLA = 10000                 # Mensajes en espera (entre todas las colas) antes de pasar al spool
+TIMEOUT_API = 5                  # Segundos por POST
+INTERVALO_ESTADISTICAS = 30      # Cada cuántos segundos se loguean las estadísticas
+
+# Spool en disco para lo que no se pudo reenviar (API caída, 5xx, 429, cola llena, cierre)
+SPOOL_RUTA = "gateway_spool.sqlite3"
+SPOOL_MAX_INTENTOS = 10                  # Reintentos antes de pasar un mensaje a dead_letter
+REPLAY_MENSAJES_POR_SEGUNDO = 500        # Ritmo de reenvío del spool, para no saturar la API al volver
+REPLAY_ESPERA_MAX = 60                   # Segundos máximos entre reintentos mientras la API sigue caída
 
 
 # =============================
@@ -33,6 +104,92 @@ logging.basicConfig(
     ]
 )
 
+# =============================
+# COLA, SESIONES Y ESTADÍSTICAS
+# =============================
+# Resultado de un reenvío
+ENTREGADO = "entregado"      # La API lo procesó (en un 207, ver repartir_resultados)
+REINTENTAR = "reintentar"    # Error de red, 5xx o 429: va al spool
+RECHAZADO = "rechazado"      # Mal formado u otro 4xx de la API: reintentar no sirve, va a dead_letter
+
+colas = []  # Una cola por worker; se crean en iniciar_workers()
+_local = threading.local()
+
+
+def obtener_sesion():
+    """
+    Sesión HTTP del hilo actual. Reutiliza las conexiones TCP (keep-alive) entre POSTs;
+    requests.Session no es segura entre hilos, por eso cada worker tiene la suya.
+    """
+    sesion = getattr(_local, "sesion", None)
+    if sesion is None:
+        sesion = requests.Session()
+        sesion.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        sesion.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+        _local.sesion = sesion
+    return sesion
+
+
+class EstadisticasGateway:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.recibidos = 0
+        self.reenviados = 0
+        self.fallidos = 0
+        self.a_spool = 0
+        self.reenviados_spool = 0
+        self.dead_letter = 0
+        self.lotes = 0
+        self._latencias = []  # segundos de cada POST desde el último reporte
+
+    def sumar(self, campo, cantidad=1):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + cantidad)
+
+    def registrar_envio(self, ok, duracion, mensajes=1):
+        with self._lock:
+            if ok:
+                self.reenviados += mensajes
+            else:
+                self.fallidos += mensajes
+            self._latencias.append(duracion)
+
+    def resumen(self):
+        """Devuelve los totales y la latencia del período, y reinicia el período."""
+        with self._lock:
+            latencias = sorted(self._latencias)
+            self._latencias = []
+            totales = {
+                "recibidos": self.recibidos,
+                "reenviados": self.reenviados,
+                "fallidos": self.fallidos,
+                "a_spool": self.a_spool,
+                "reenviados_spool": self.reenviados_spool,
+                "dead_letter": self.dead_letter,
+                "lotes": self.lotes,
+            }
+
+        totales["cola"] = sum(cola.qsize() for cola in colas)
+        totales.update(spool.estadisticas())
+        if AGREGACION_ACTIVA:
+            totales.update(agregador.estadisticas())
+        if latencias:
+            totales["latencia_ms_p50"] = round(latencias[len(latencias) // 2] * 1000, 1)
+            totales["latencia_ms_p95"] = round(latencias[int(len(latencias) * 0.95)] * 1000, 1)
+            totales["latencia_ms_max"] = round(latencias[-1] * 1000, 1)
+        return totales
+
+
+estadisticas = EstadisticasGateway()
+spool = Spool(SPOOL_RUTA, max_intentos=SPOOL_MAX_INTENTOS)
+agregador = AgregadorVentanas(
+    ventana_s=AGREGACION_VENTANA_S,
+    temp_max=AGREGACION_TEMP_MAX,
+    temp_min=AGREGACION_TEMP_MIN,
+    acel_max=AGREGACION_ACEL_MAX,
+)
+
+
 # =============================
 # FUNCIONES DE PROCESAMIENTO
 # =============================
@@ -44,62 +201,642 @@ def procesar_y_enviar(payload: str):
         client_id = data.get("client_id")
         if not client_id:
             logging.warning("Mensaje recibido sin client_id, descartado")
-            return
+            return RECHAZADO
 
         headers = {
             "X-Client-ID": client_id,
             "Content-Type": "application/json"
         }
 
-        response = requests.post(API_ENDPOINT, json=data, headers=headers, timeout=5)
-
-        if response.status_code == 200:
-            logging.info(f"Datos de '{client_id}' enviados correctamente a la API")
-        else:
-            logging.warning(f"Fallo en la API: {response.status_code} - {response.text}")
+        return enviar(client_id, headers, json=data)
 
     except json.JSONDecodeError:
         logging.error("Error al decodificar JSON")
+        return RECHAZADO
     except requests.exceptions.RequestException as e:
         logging.error(f"Error de red al enviar a API: {e}")
+        return REINTENTAR
+
+
+def reenviar_binario(payload: bytes):
+    """Reenvía una trama binaria tal cual; la API la decodifica."""
+    try:
+        client_id = leer_client_id(payload)
+        headers = {
+            "X-Client-ID": client_id,
+            "Content-Type": TIPO_BINARIO
+        }
+
+        return enviar(client_id, headers, data=payload)
+
+    except ValueError:
+        logging.error("Trama binaria mal formada, descartada")
+        return RECHAZADO
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error de red al enviar a API: {e}")
+        return REINTENTAR
+
+
+def clasificar_respuesta(status_code):
+    if status_code == 429 or status_code >= 500:
+        return REINTENTAR
+    # 401/403/404 (sin client_id, nodo no autorizado, collar sin asignar) tampoco se
+    # arreglan reintentando: van a dead_letter para revisarlos, no se dan por entregados
+    if status_code >= 400:
+        return RECHAZADO
+    return ENTREGADO
+
+
+def enviar(client_id, headers, **cuerpo):
+    """POST a la API con la sesión keep-alive del hilo, midiendo la latencia."""
+    inicio = time.perf_counter()
+    try:
+        response = obtener_sesion().post(API_ENDPOINT, headers=headers, timeout=TIMEOUT_API, **cuerpo)
+    except requests.exceptions.RequestException:
+        estadisticas.registrar_envio(False, time.perf_counter() - inicio)
+        raise
+    estadisticas.registrar_envio(response.ok, time.perf_counter() - inicio)
+    registrar_respuesta(client_id, response)
+    return clasificar_respuesta(response.status_code)
+
+
+def agrupar_lote(mensajes):
+    """
+    Arma los cuerpos para /api/datos/batch a partir de mensajes (topic, payload, ...): las
+    lecturas JSON como una lista y las tramas binarias concatenadas.
+    Devuelve (grupos, rechazados), con grupos = [(cuerpo, content_type, mensajes originales)].
+    """
+    lecturas, con_lecturas = [], []
+    tramas, con_tramas = [], []
+    rechazados = []
+    for mensaje in mensajes:
+        topic, payload = mensaje[0], mensaje[1]
+        if es_binario(payload):
+            try:
+                leer_client_id(payload)
+            except ValueError:
+                logging.error(f"Trama binaria mal formada en '{topic}', descartada")
+                rechazados.append(mensaje)
+                continue
+            tramas.append(payload)
+            con_tramas.append(mensaje)
+            continue
+
+        try:
+            data = json.loads(payload)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            logging.error(f"Error al decodificar JSON de '{topic}', descartado")
+            rechazados.append(mensaje)
+            continue
+        if not isinstance(data, dict) or not data.get("client_id"):
+            logging.warning("Mensaje recibido sin client_id, descartado")
+            rechazados.append(mensaje)
+            continue
+        lecturas.append(data)
+        con_lecturas.append(mensaje)
+
+    grupos = []
+    if lecturas:
+        grupos.append((json.dumps(lecturas, separators=(",", ":")).encode("utf-8"), "application/json", con_lecturas))
+    if tramas:
+        grupos.append((b"".join(tramas), TIPO_BINARIO, con_tramas))
+    return grupos, rechazados
+
+
+def enviar_lote(mensajes):
+    """
+    Reenvía un lote de mensajes a /api/datos/batch, un POST comprimido con gzip por grupo.
+    Devuelve dos listas con los mensajes a reintentar y los rechazados.
+    """
+    grupos, rechazados = agrupar_lote(mensajes)
+    reintentar = []
+    for cuerpo, tipo, originales in grupos:
+        resultado, resultados = enviar_comprimido(cuerpo, tipo, len(originales))
+        if resultados is not None:
+            fallidos, descartados = repartir_resultados(originales, tipo, resultados)
+            reintentar.extend(fallidos)
+            rechazados.extend(descartados)
+        elif resultado == REINTENTAR:
+            reintentar.extend(originales)
+        elif resultado == RECHAZADO:
+            rechazados.extend(originales)
+
+    return reintentar, rechazados
+
+
+def leer_resultados(status_code, texto):
+    """
+    Resultados por lectura de una respuesta 207 de /api/datos/batch, o None si no es un 207.
+    Si el cuerpo no se puede leer devuelve una lista vacía: todo el grupo se reintenta.
+    """
+    if status_code != 207:
+        return None
+    try:
+        resultados = json.loads(texto)["resultados"]
+    except (ValueError, KeyError, TypeError):
+        logging.error("Respuesta 207 de la API sin 'resultados' legibles, el lote se reintenta")
+        return []
+    return resultados if isinstance(resultados, list) else []
+
+
+def repartir_resultados(originales, tipo, resultados):
+    """
+    Reparte los resultados por lectura de un 207 entre los mensajes originales del grupo
+    (vienen en el mismo orden; un mensaje JSON es una lectura y uno binario, una o varias
+    tramas). Un mensaje con alguna lectura para reintentar (429, 5xx o sin resultado) vuelve
+    al spool, y si no, uno con alguna lectura rechazada va a dead_letter; reenviar las
+    lecturas ya guardadas del mismo mensaje no duplica nada.
+    Devuelve (reintentar, rechazados).
+    """
+    reintentar, rechazados = [], []
+    indice = 0
+    for mensaje in originales:
+        cantidad = len(decodificar_lote(mensaje[1])[0]) if tipo == TIPO_BINARIO else 1
+        propios = resultados[indice:indice + cantidad]
+        indice += cantidad
+        codigos = [_codigo_resultado(r) for r in propios]
+        codigos = [codigo for codigo in codigos if codigo is not None]
+        if len(propios) < cantidad or any(codigo == 429 or codigo >= 500 for codigo in codigos):
+            reintentar.append(mensaje)
+        elif codigos:
+            rechazados.append(mensaje)
+    return reintentar, rechazados
+
+
+def _codigo_resultado(resultado):
+    """Código de error de un resultado por lectura (None si se guardó); uno ilegible cuenta como 500."""
+    if not isinstance(resultado, dict):
+        return 500
+    if resultado.get("status") in ("ok", "duplicada"):
+        return None
+    codigo = resultado.get("code")
+    return codigo if isinstance(codigo, int) and not isinstance(codigo, bool) else 500
+
+
+def enviar_comprimido(cuerpo: bytes, tipo: str, cantidad: int):
+    """
+    POST gzip de un grupo a /api/datos/batch.
+    Devuelve (resultado, resultados): 'resultados' son los de cada lectura si la API
+    respondió 207 (ver repartir_resultados), o None.
+    """
+    comprimido = gzip.compress(cuerpo, compresslevel=NIVEL_GZIP)
+    headers = {
+        "Content-Type": tipo,
+        "Content-Encoding": "gzip"
+    }
+
+    inicio = time.perf_counter()
+    try:
+        response = obtener_sesion().post(API_BATCH_ENDPOINT, data=comprimido, headers=headers, timeout=TIMEOUT_API)
+    except requests.exceptions.RequestException as e:
+        estadisticas.registrar_envio(False, time.perf_counter() - inicio, cantidad)
+        logging.error(f"Error de red al enviar lote de {cantidad} lecturas a la API: {e}")
+        return REINTENTAR, None
+
+    # 207: el lote se guardó salvo algunas lecturas (nodo no autorizado, límite de tasa, etc.)
+    ok = response.status_code in (200, 207)
+    estadisticas.registrar_envio(ok, time.perf_counter() - inicio, cantidad)
+    estadisticas.sumar("lotes")
+    if response.status_code == 200:
+        logging.info(f"Lote de {cantidad} lecturas enviado ({len(cuerpo)} -> {len(comprimido)} bytes)")
+    elif response.status_code == 207:
+        logging.warning(f"Lote de {cantidad} lecturas con errores; se reintentan o descartan solo esas")
+    else:
+        logging.warning(f"Fallo en la API al enviar lote: {response.status_code} - {response.text}")
+    return clasificar_respuesta(response.status_code), leer_resultados(response.status_code, response.text)
+
+
+_app = None
+_app_lock = threading.Lock()
+
+
+def obtener_app():
+    """App de Flask del modo directo (solo para el contexto de la base; no atiende peticiones)."""
+    global _app
+    with _app_lock:
+        if _app is None:
+            from Project import create_app
+            _app = create_app()
+    return _app
+
+
+def guardar_lote_directo(mensajes):
+    """
+    Escribe un lote de mensajes directamente en la base, en una sola transacción, con las
+    mismas reglas que /api/datos/batch (nodo autorizado, asignación activa, duplicados,
+    UbicacionActual). Devuelve, como enviar_lote, los mensajes a reintentar y los rechazados
+    (también los que traen lecturas de un nodo no autorizado o un collar sin asignar).
+    """
+    # Solo el modo directo necesita la app (Flask, SQLAlchemy); los demás no la importan
+    from Project import db
+    from Project.backend.src.Services.ingesta import parsear_lectura
+    from Project.backend.src.Services.procesador_ingesta import procesar_lecturas
+
+    entradas = []   # (client_id, lectura)
+    origenes = []   # mensaje de cada entrada
+    validos = []
+    rechazados = []
+    for mensaje in mensajes:
+        topic, payload = mensaje[0], mensaje[1]
+        try:
+            if es_binario(payload):
+                client_ids, lecturas = decodificar_lote(payload)
+                entradas.extend(zip(client_ids, lecturas))
+                origenes.extend([mensaje] * len(lecturas))
+            else:
+                data = json.loads(payload)
+                if not isinstance(data, dict) or not data.get("client_id"):
+                    raise ValueError("Mensaje sin client_id")
+                entradas.append((data["client_id"], parsear_lectura(data)))
+                origenes.append(mensaje)
+        except (ValueError, TypeError) as e:
+            # json.JSONDecodeError y UnicodeDecodeError son ValueError
+            logging.error(f"Mensaje de '{topic}' inválido, descartado: {e}")
+            rechazados.append(mensaje)
+            continue
+        validos.append(mensaje)
+
+    if not entradas:
+        return [], rechazados
+
+    inicio = time.perf_counter()
+    with obtener_app().app_context():
+        try:
+            resultados, guardadas = procesar_lecturas(entradas, "directo")
+        except Exception as e:
+            estadisticas.registrar_envio(False, time.perf_counter() - inicio, len(validos))
+            logging.error(f"Error al escribir lote de {len(entradas)} lecturas en la base: {e}")
+            return validos, rechazados
+        finally:
+            db.session.remove()
+
+    estadisticas.registrar_envio(True, time.perf_counter() - inicio, len(validos))
+    estadisticas.sumar("lotes")
+    errores = sum(1 for r in resultados if r["status"] == "error")
+    if errores:
+        logging.warning(f"Lote de {len(entradas)} lecturas escrito en la base; {errores} rechazadas (nodo o collar)")
+        con_error = {id(mensaje) for mensaje, r in zip(origenes, resultados) if r["status"] == "error"}
+        rechazados.extend(mensaje for mensaje in validos if id(mensaje) in con_error)
+    else:
+        logging.info(f"Lote de {len(entradas)} lecturas escrito en la base ({len(guardadas)} nuevas)")
+    return [], rechazados
+
+
+def reenviar_lote(mensajes):
+    if MODO_REENVIO == "directo":
+        return guardar_lote_directo(mensajes)
+    return enviar_lote(mensajes)
+
+
+def registrar_respuesta(client_id, response):
+    if response.status_code == 200:
+        logging.info(f"Datos de '{client_id}' enviados correctamente a la API")
+    else:
+        logging.warning(f"Fallo en la API: {response.status_code} - {response.text}")
+
+
+def a_spool(mensajes, motivo):
+    try:
+        spool.guardar(mensajes, motivo)
+        estadisticas.sumar("a_spool", len(mensajes))
+    except Exception as e:
+        # Sin disco no queda otra que perderlos, pero que quede registrado
+        logging.exception(f"No se pudieron guardar {len(mensajes)} mensajes en el spool: {e}")
+
+
+def a_dead_letter(mensajes, motivo):
+    try:
+        spool.descartar(mensajes, motivo)
+        estadisticas.sumar("dead_letter", len(mensajes))
+    except Exception as e:
+        logging.exception(f"No se pudieron guardar {len(mensajes)} mensajes en dead_letter: {e}")
 
 
 # =============================
 # CALLBACKS MQTT
 # =============================
-def on_connect(client, userdata, flags, rc):
+def suscripciones():
+    """Filtros de topic de esta instancia según MODO_SUSCRIPCION (sin solaparse entre sí)."""
+    if MODO_SUSCRIPCION == "compartida":
+        return [f"$share/{GRUPO_COMPARTIDO}/{TOPIC}/#"]
+    if MODO_SUSCRIPCION == "particionada":
+        return [f"$share/{GRUPO_COMPARTIDO}/{TOPIC}"] + [
+            f"{TOPIC}/{p}/+" for p in particiones_de_instancia(INSTANCIA, NUM_INSTANCIAS, NUM_PARTICIONES)
+        ]
+    # TOPIC/# incluye también a TOPIC
+    return [f"{TOPIC}/#"]
+
+
+def on_connect(client, userdata, flags, rc, properties=None):
     if rc == 0:
-        logging.info("Conexión exitosa al broker MQTT")
-        client.subscribe(TOPIC)
+        filtros = suscripciones()
+        logging.info(f"Conexión exitosa al broker MQTT; suscripto a {filtros}")
+        client.subscribe([(filtro, 0) for filtro in filtros])
     else:
         logging.error(f"Fallo de conexión: código {rc}")
 
+
+def indice_worker(topic, payload):
+    """Worker que atiende el collar del mensaje (mismo hash que las particiones de topic)."""
+    client_id = client_id_de_mensaje(topic, payload, TOPIC)
+    if client_id is None and es_binario(payload):
+        try:
+            client_id = leer_client_id(payload)
+        except ValueError:
+            pass
+    return particion(client_id, len(colas)) if client_id else 0
+
+
 def on_message(client, userdata, msg):
-    payload = msg.payload.decode("utf-8")
-    logging.info(f"Mensaje recibido en '{msg.topic}': {payload}")
-    procesar_y_enviar(payload)
+    # Corre en el hilo de red de paho: solo encola, el reenvío lo hacen los workers
+    estadisticas.sumar("recibidos")
+    encolar(msg.topic, msg.payload)
 
-# =============================
-# CONFIGURAR CLIENTE MQTT
-# =============================
-client = mqtt.Client()
-client.tls_set(
-    ca_certs=CA_CERT,
-    certfile=CLIENT_CERT,
-    keyfile=CLIENT_KEY,
-    tls_version=ssl.PROTOCOL_TLSv1_2
-)
-client.tls_insecure_set(False)
 
-client.on_connect = on_connect
-client.on_message = on_message
+def encolar(topic, payload):
+    try:
+        colas[indice_worker(topic, payload)].put_nowait((topic, payload))
+    except queue.Full:
+        logging.warning(f"Cola de reenvío llena ({MAX_COLA}), mensaje de '{topic}' al spool")
+        a_spool([(topic, payload)], "cola llena")
+
 
 # =============================
-# INICIAR CONEXIÓN
+# WORKERS
 # =============================
-try:
-    client.connect(BROKER, PORT, keepalive=60)
-    logging.info("Esperando mensajes... (Ctrl+C para salir)")
-    client.loop_forever()
-except Exception as e:
-    logging.exception(f"Error de conexión con el broker: {e}")
+def tomar_lote(cola):
+    """Espera el primer mensaje y junta los siguientes hasta completar el lote o el tiempo."""
+    lote = [cola.get()]
+    limite = time.monotonic() + LOTE_MAX_ESPERA_MS / 1000
+    while len(lote) < LOTE_MAX_MENSAJES:
+        restante = limite - time.monotonic()
+        if restante <= 0:
+            break
+        try:
+            lote.append(cola.get(timeout=restante))
+        except queue.Empty:
+            break
+    return lote
+
+
+def worker_lotes(cola):
+    while True:
+        lote = tomar_lote(cola)
+        salida = lote
+        try:
+            if AGREGACION_ACTIVA:
+                salida = agregador.procesar(lote)
+            if salida:
+                reintentar, rechazados = reenviar_lote(salida)
+                a_spool(reintentar, "reenvío fallido")
+                a_dead_letter(rechazados, "rechazado")
+        except Exception as e:
+            logging.exception(f"Error inesperado al reenviar un lote: {e}")
+            a_spool(salida, str(e))
+        finally:
+            for _ in lote:
+                cola.task_done()
+
+
+def worker(cola):
+    while True:
+        topic, payload = cola.get()
+        try:
+            if es_binario(payload):
+                logging.info(f"Trama binaria recibida en '{topic}' ({len(payload)} bytes)")
+                resultado = reenviar_binario(payload)
+            else:
+                texto = payload.decode("utf-8")
+                logging.info(f"Mensaje recibido en '{topic}': {texto}")
+                resultado = procesar_y_enviar(texto)
+
+            if resultado == REINTENTAR:
+                a_spool([(topic, payload)], "reenvío fallido")
+            elif resultado == RECHAZADO:
+                a_dead_letter([(topic, payload)], "rechazado")
+        except Exception as e:
+            logging.exception(f"Error inesperado al reenviar un mensaje: {e}")
+            a_spool([(topic, payload)], str(e))
+        finally:
+            cola.task_done()
+
+
+def reenviar_spool():
+    """
+    Reenvía el spool en orden de llegada, de a LOTE_MAX_MENSAJES y sin superar
+    REPLAY_MENSAJES_POR_SEGUNDO. Mientras la API siga fallando espera cada vez más
+    (hasta REPLAY_ESPERA_MAX), para no sumar una avalancha de reintentos cuando vuelva.
+    """
+    espera_error = 1
+    while True:
+        try:
+            pendientes = spool.tomar(LOTE_MAX_MENSAJES)
+        except Exception as e:
+            logging.exception(f"Error al leer el spool: {e}")
+            time.sleep(REPLAY_ESPERA_MAX)
+            continue
+
+        if not pendientes:
+            time.sleep(1)
+            continue
+
+        inicio = time.monotonic()
+        try:
+            reintentar, rechazados = reenviar_lote(pendientes)
+            fallo = actualizar_spool(pendientes, reintentar, rechazados)
+        except Exception as e:
+            # Sin esto el hilo muere en silencio y el spool solo crece
+            logging.exception(f"Error inesperado al reenviar el spool; se reintenta en {espera_error}s: {e}")
+            fallar_spool(pendientes, e)
+            time.sleep(espera_error)
+            espera_error = min(espera_error * 2, REPLAY_ESPERA_MAX)
+            continue
+        if fallo:
+            logging.warning(f"La API sigue sin responder; {len(reintentar)} mensajes del spool se reintentan en {espera_error}s")
+            time.sleep(espera_error)
+            espera_error = min(espera_error * 2, REPLAY_ESPERA_MAX)
+            continue
+
+        espera_error = 1
+        time.sleep(max(0, espera_replay(len(pendientes)) - (time.monotonic() - inicio)))
+
+
+def actualizar_spool(pendientes, reintentar, rechazados):
+    """
+    Registra en el spool el resultado de reenviar 'pendientes' (mensajes (topic, payload, id)).
+    Devuelve True si alguno falló y hay que esperar antes de seguir.
+    """
+    fallidos = {m[2] for m in reintentar}
+    descartados = {m[2] for m in rechazados}
+    entregados = [m[2] for m in pendientes if m[2] not in fallidos and m[2] not in descartados]
+
+    spool.confirmar(entregados)
+    spool.rechazar(list(descartados), "rechazado")
+    agotados = spool.fallar(list(fallidos), "reenvío fallido")
+    estadisticas.sumar("reenviados_spool", len(entregados))
+    estadisticas.sumar("dead_letter", len(descartados) + agotados)
+    if entregados:
+        logging.info(f"Reenviados {len(entregados)} mensajes del spool")
+    return bool(fallidos)
+
+
+def fallar_spool(pendientes, error):
+    """
+    Cuenta un intento fallido para mensajes del spool cuyo reenvío lanzó una excepción
+    inesperada: siguen pendientes, y si el error se repite terminan en dead_letter.
+    """
+    try:
+        agotados = spool.fallar([m[2] for m in pendientes], str(error))
+        estadisticas.sumar("dead_letter", agotados)
+    except Exception as e:
+        logging.exception(f"No se pudo registrar el fallo en el spool: {e}")
+
+
+def ruta_con_sufijo(ruta, sufijo):
+    """'spool.db' -> 'spool_1.db' (también sin extensión o con otra que no sea .sqlite3)."""
+    raiz, extension = os.path.splitext(ruta)
+    return raiz + sufijo + extension
+
+
+def espera_replay(cantidad):
+    # Ritmo de reenvío del spool: cada lote "ocupa" cantidad/ritmo segundos
+    return cantidad / REPLAY_MENSAJES_POR_SEGUNDO
+
+
+def vaciar_cola_al_spool():
+    """Al cerrar, lo que quedó en las colas en memoria se guarda en el spool."""
+    restantes = []
+    for cola in colas:
+        while True:
+            try:
+                restantes.append(cola.get_nowait())
+            except queue.Empty:
+                break
+    if AGREGACION_ACTIVA:
+        restantes = agregador.procesar(restantes) + agregador.vaciar()
+    if restantes:
+        a_spool(restantes, "cierre del gateway")
+        logging.info(f"{len(restantes)} mensajes sin reenviar guardados en el spool")
+
+
+def cerrar_ventanas_vencidas():
+    """
+    Reenvía los resúmenes de los collares que dejaron de enviar lecturas. Van directo a la
+    API (o al spool): encolarlos los haría pasar otra vez por el agregador, que los sumaría
+    a una ventana nueva en lugar de reenviarlos.
+    """
+    while True:
+        time.sleep(max(1, AGREGACION_VENTANA_S / 4))
+        resumenes = agregador.vencidas()
+        if not resumenes:
+            continue
+        try:
+            reintentar, rechazados = reenviar_lote(resumenes)
+            a_spool(reintentar, "reenvío fallido")
+            a_dead_letter(rechazados, "rechazado")
+        except Exception as e:
+            logging.exception(f"Error inesperado al reenviar resúmenes de ventanas: {e}")
+            a_spool(resumenes, str(e))
+
+
+def invalidar_cache_nodos():
+    """Descarta la cache de nodos del modo directo, para ver altas y bajas hechas desde la API."""
+    from Project.backend.src.Services.cache_nodos import cache_nodos
+    with obtener_app().app_context():
+        cache_nodos.invalidar()
+
+
+def refrescar_cache_nodos():
+    while True:
+        time.sleep(DIRECTO_REFRESCO_CACHE)
+        invalidar_cache_nodos()
+
+
+def reportar_estadisticas():
+    while True:
+        time.sleep(INTERVALO_ESTADISTICAS)
+        logging.info(f"Estadísticas del gateway: {estadisticas.resumen()}")
+
+
+def esperar_colas():
+    """Bloquea hasta que los workers reenviaron todo lo encolado."""
+    for cola in colas:
+        cola.join()
+
+
+def iniciar_workers():
+    objetivo = worker if MODO_REENVIO == "individual" else worker_lotes
+    colas[:] = [queue.Queue(maxsize=max(1, MAX_COLA // NUM_WORKERS)) for _ in range(NUM_WORKERS)]
+    for i, cola in enumerate(colas):
+        threading.Thread(target=objetivo, args=(cola,), name=f"reenvio-{i}", daemon=True).start()
+    if MODO_REENVIO == "directo":
+        threading.Thread(target=refrescar_cache_nodos, name="cache-nodos", daemon=True).start()
+    if AGREGACION_ACTIVA:
+        if MODO_REENVIO == "individual":
+            logging.warning("La pre-agregación no se aplica en modo 'individual'")
+        else:
+            threading.Thread(target=cerrar_ventanas_vencidas, name="agregacion", daemon=True).start()
+    threading.Thread(target=reenviar_spool, name="spool", daemon=True).start()
+    threading.Thread(target=reportar_estadisticas, name="estadisticas", daemon=True).start()
+
+
+if __name__ == "__main__":
+    # Para varias instancias: python mqtt_gateway_server.py --suscripcion particionada --instancia 0 --instancias 3
+    parser = argparse.ArgumentParser(description="Gateway MQTT -> API de ganado")
+    parser.add_argument("--suscripcion", choices=["unica", "compartida", "particionada"], default=MODO_SUSCRIPCION)
+    parser.add_argument("--instancia", type=int, default=INSTANCIA)
+    parser.add_argument("--instancias", type=int, default=NUM_INSTANCIAS)
+    parser.add_argument("--agregar", action="store_true", default=AGREGACION_ACTIVA, help="Pre-agregar por ventanas")
+    parser.add_argument("--reenvio", choices=["lotes", "individual", "directo"], default=MODO_REENVIO)
+    parser.add_argument("--broker", default=BROKER)
+    parser.add_argument("--puerto", type=int, default=PORT)
+    parser.add_argument("--sin-tls", action="store_true", help="Conectar al broker sin TLS (pruebas locales)")
+    parser.add_argument("--api", help="URL base de la API (por defecto la de API_ENDPOINT)")
+    parser.add_argument("--spool", default=SPOOL_RUTA)
+    args = parser.parse_args()
+    MODO_SUSCRIPCION, INSTANCIA, NUM_INSTANCIAS = args.suscripcion, args.instancia, args.instancias
+    AGREGACION_ACTIVA = args.agregar
+    MODO_REENVIO, BROKER, PORT = args.reenvio, args.broker, args.puerto
+    if args.api:
+        API_ENDPOINT = args.api.rstrip("/") + "/api/datos"
+        API_BATCH_ENDPOINT = args.api.rstrip("/") + "/api/datos/batch"
+    SPOOL_RUTA = spool.ruta = args.spool
+
+    if NUM_INSTANCIAS > 1:
+        # Cada instancia con su propio spool, para que no reenvíen los mismos mensajes
+        spool.ruta = ruta_con_sufijo(SPOOL_RUTA, f"_{INSTANCIA}")
+
+    # =============================
+    # CONFIGURAR CLIENTE MQTT
+    # =============================
+    # MQTT v5 para las suscripciones compartidas; el client_id debe ser distinto por instancia
+    client = mqtt.Client(client_id=f"gateway-{INSTANCIA}", protocol=mqtt.MQTTv5)
+    if not args.sin_tls:
+        client.tls_set(
+            ca_certs=CA_CERT,
+            certfile=CLIENT_CERT,
+            keyfile=CLIENT_KEY,
+            tls_version=ssl.PROTOCOL_TLSv1_2
+        )
+        client.tls_insecure_set(False)
+
+    client.on_connect = on_connect
+    client.on_message = on_message
+
+    # =============================
+    # INICIAR CONEXIÓN
+    # =============================
+    iniciar_workers()
+    try:
+        client.connect(BROKER, PORT, keepalive=60)
+        logging.info(
+            f"Instancia {INSTANCIA + 1}/{NUM_INSTANCIAS} ({MODO_SUSCRIPCION}) esperando mensajes con "
+            f"{NUM_WORKERS} workers de reenvío en modo '{MODO_REENVIO}'... (Ctrl+C para salir)"
+        )
+        client.loop_forever()
+    except Exception as e:
+        logging.exception(f"Error de conexión con el broker: {e}")
+    finally:
+        vaciar_cola_al_spool()
+        logging.info(f"Estadísticas finales del gateway: {estadisticas.resumen()}")
+        spool.cerrar()
@@ -0,0 +1,152 @@
+import time
+import sqlite3
+import threading
+
+"""
+Spool durable del gateway MQTT: una cola en un archivo SQLite local.
+
+Guarda los mensajes que no se pudieron reenviar a la API (caída, timeout, 5xx, 429) o que
+no llegaron a reenviarse (cola en memoria llena, cierre del gateway), para reenviarlos
+después en orden de llegada. Los que fallan MAX_INTENTOS veces, o que la API rechaza por
+mal formados, pasan a la tabla dead_letter para revisarlos a mano.
+
+Cada llamada a guardar() es una sola transacción: con synchronous=FULL el fsync se hace una
+vez por lote y no por mensaje.
+"""
+
+
+class Spool:
+    def __init__(self, ruta, max_intentos=10):
+        self.ruta = ruta
+        self.max_intentos = max_intentos
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _conexion(self):
+        # Se abre recién al usarlo, así importar el gateway no crea archivos
+        if self._conn is None:
+            conn = sqlite3.connect(self.ruta, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pendientes ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " recibido REAL NOT NULL,"
+                " topic TEXT NOT NULL,"
+                " payload BLOB NOT NULL,"
+                " intentos INTEGER NOT NULL DEFAULT 0,"
+                " ultimo_error TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letter ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " recibido REAL NOT NULL,"
+                " topic TEXT NOT NULL,"
+                " payload BLOB NOT NULL,"
+                " intentos INTEGER NOT NULL,"
+                " error TEXT,"
+                " movido REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def guardar(self, mensajes, error=None):
+        """Agrega mensajes (topic, payload, ...) al final del spool en una sola transacción."""
+        if not mensajes:
+            return
+        ahora = time.time()
+        filas = [(ahora, m[0], bytes(m[1]), error) for m in mensajes]
+        with self._lock:
+            conn = self._conexion()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO pendientes (recibido, topic, payload, ultimo_error) VALUES (?, ?, ?, ?)",
+                    filas,
+                )
+
+    def tomar(self, limite):
+        """Devuelve hasta 'limite' mensajes pendientes, los más viejos primero, como (topic, payload, id)."""
+        with self._lock:
+            filas = self._conexion().execute(
+                "SELECT topic, payload, id FROM pendientes ORDER BY id LIMIT ?", (limite,)
+            ).fetchall()
+        return [(topic, bytes(payload), id_) for topic, payload, id_ in filas]
+
+    def confirmar(self, ids):
+        """Borra del spool los mensajes ya entregados."""
+        if not ids:
+            return
+        with self._lock:
+            conn = self._conexion()
+            with conn:
+                conn.executemany("DELETE FROM pendientes WHERE id = ?", [(i,) for i in ids])
+
+    def fallar(self, ids, error):
+        """Suma un intento a los mensajes y mueve a dead_letter los que agotaron los intentos."""
+        if not ids:
+            return 0
+        with self._lock:
+            conn = self._conexion()
+            with conn:
+                conn.executemany(
+                    "UPDATE pendientes SET intentos = intentos + 1, ultimo_error = ? WHERE id = ?",
+                    [(error, i) for i in ids],
+                )
+                agotados = [
+                    fila[0] for fila in conn.execute(
+                        "SELECT id FROM pendientes WHERE intentos >= ?", (self.max_intentos,)
+                    )
+                ]
+                self._mover_a_dead_letter(conn, agotados)
+        return len(agotados)
+
+    def rechazar(self, ids, error):
+        """Mueve a dead_letter mensajes del spool que la API no va a aceptar nunca."""
+        if not ids:
+            return
+        with self._lock:
+            conn = self._conexion()
+            with conn:
+                conn.executemany(
+                    "UPDATE pendientes SET intentos = intentos + 1, ultimo_error = ? WHERE id = ?",
+                    [(error, i) for i in ids],
+                )
+                self._mover_a_dead_letter(conn, ids)
+
+    def descartar(self, mensajes, error):
+        """Guarda directamente en dead_letter mensajes que nunca pasaron por el spool."""
+        if not mensajes:
+            return
+        ahora = time.time()
+        with self._lock:
+            conn = self._conexion()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO dead_letter (recibido, topic, payload, intentos, error, movido)"
+                    " VALUES (?, ?, ?, 1, ?, ?)",
+                    [(ahora, m[0], bytes(m[1]), error, ahora) for m in mensajes],
+                )
+
+    @staticmethod
+    def _mover_a_dead_letter(conn, ids):
+        parametros = [(i,) for i in ids]
+        conn.executemany(
+            "INSERT INTO dead_letter (recibido, topic, payload, intentos, error, movido)"
+            " SELECT recibido, topic, payload, intentos, ultimo_error, strftime('%s','now')"
+            " FROM pendientes WHERE id = ?",
+            parametros,
+        )
+        conn.executemany("DELETE FROM pendientes WHERE id = ?", parametros)
+
+    def estadisticas(self):
+        with self._lock:
+            conn = self._conexion()
+            pendientes = conn.execute("SELECT COUNT(*) FROM pendientes").fetchone()[0]
+            dead_letter = conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        return {"spool_pendientes": pendientes, "spool_dead_letter": dead_letter}
+
+    def cerrar(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,370 @@
+import json
+import logging
+import numpy as np
+from datetime import datetime
+
+"""
+Motor de escenarios para simular la telemetría de muchos collares a la vez.
+
+El estado de todos los animales vive en arreglos de NumPy y cada paso (tick) se calcula
+vectorizado, sin bucles por animal:
+
+  - movimiento: caminata aleatoria correlacionada (la velocidad de cada animal es un
+    proceso AR(1): conserva parte del rumbo anterior y suma ruido), dentro del polígono de
+    su parcela (Parcela.perimetro_geojson). Un paso que saldría de la parcela se rechaza y
+    el animal invierte el rumbo.
+  - posiciones iniciales: muestreo por rechazo vectorizado (reemplaza el bucle con shapely
+    de get_random_point_within en tests/cluster_movement.py).
+  - temperatura corporal, ambiente, acelerómetro y batería.
+
+Eventos guionados (ver EVENTOS), que afectan a un subconjunto de animales entre
+inicio_s y inicio_s + duracion_s (segundos desde el comienzo de la simulación):
+
+  - "fuga":        el animal sale de la parcela alejándose del centro; al terminar vuelve
+  - "fiebre":      la temperatura corporal sube hasta 'temperatura' (por defecto 40.5)
+  - "inactividad": el animal no se mueve y el acelerómetro queda en reposo
+  - "bateria":     la batería se descarga a 'tasa_por_hora' (% por hora); en 0 deja de publicar
+  - "silencio":    el collar no publica
+
+Un escenario es un JSON como:
+
+    {
+        "semilla": 42,
+        "paso_s": 60,
+        "eventos": [
+            {"tipo": "fuga", "inicio_s": 600, "duracion_s": 1800, "fraccion": 0.02},
+            {"tipo": "fiebre", "inicio_s": 0, "duracion_s": 7200, "cantidad": 5},
+            {"tipo": "silencio", "inicio_s": 300, "duracion_s": 900, "client_ids": ["nodo-test-001"]}
+        ]
+    }
+
+Los animales de cada evento se eligen por 'client_ids', 'indices', 'cantidad' o
+'fraccion' (al azar, con la semilla del escenario). Con la misma semilla y los mismos
+collares la simulación es reproducible.
+"""
+
+EVENTOS = ("fuga", "fiebre", "inactividad", "bateria", "silencio")
+
+METROS_POR_GRADO = 111320.0
+
+# Centro de la parcela de prueba, para los collares que no tienen una parcela asignada
+CENTRO_POR_DEFECTO = (-60.348737, -35.500422)
+RADIO_POR_DEFECTO_M = 50.0
+
+
+def poligono_de_geojson(geojson):
+    """
+    Anillo exterior [(lon, lat), ...] de un GeoJSON (Feature, Polygon o MultiPolygon,
+    como texto o ya decodificado). De un MultiPolygon se toma el polígono más grande.
+    Devuelve None si no hay geometría.
+    """
+    if not geojson:
+        return None
+    if isinstance(geojson, str):
+        geojson = json.loads(geojson)
+    geometria = geojson.get("geometry", geojson)
+    if geometria.get("type") == "Polygon":
+        return [tuple(p[:2]) for p in geometria["coordinates"][0]]
+    if geometria.get("type") == "MultiPolygon":
+        anillos = [poligono[0] for poligono in geometria["coordinates"]]
+        return [tuple(p[:2]) for p in max(anillos, key=lambda a: abs(_area(np.asarray(a)[:, :2])))]
+    return None
+
+
+def poligono_por_defecto(centro=CENTRO_POR_DEFECTO, radio_m=RADIO_POR_DEFECTO_M):
+    lon, lat = centro
+    dlat = radio_m / METROS_POR_GRADO
+    dlon = radio_m / (METROS_POR_GRADO * np.cos(np.radians(lat)))
+    return [(lon - dlon, lat - dlat), (lon + dlon, lat - dlat), (lon + dlon, lat + dlat), (lon - dlon, lat + dlat)]
+
+
+def _area(anillo):
+    x, y = anillo[:, 0], anillo[:, 1]
+    return 0.5 * (np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))
+
+
+def _centroide(anillo):
+    x, y = anillo[:, 0], anillo[:, 1]
+    cruz = x * np.roll(y, -1) - np.roll(x, -1) * y
+    area = cruz.sum() / 2
+    if abs(area) < 1e-18:
+        return anillo.mean(axis=0)
+    return np.array([
+        ((x + np.roll(x, -1)) * cruz).sum() / (6 * area),
+        ((y + np.roll(y, -1)) * cruz).sum() / (6 * area),
+    ])
+
+
+def dentro_de_poligono(lon, lat, anillo):
+    """Ray casting vectorizado: qué puntos (lon, lat) caen dentro del anillo."""
+    xi, yi = anillo[:, 0], anillo[:, 1]
+    xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+    px, py = lon[:, None], lat[:, None]
+    cruza = (yi > py) != (yj > py)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_corte = (xj - xi) * (py - yi) / (yj - yi) + xi
+    return np.count_nonzero(cruza & (px < x_corte), axis=1) % 2 == 1
+
+
+class Escenario:
+    def __init__(self, collares, eventos=None, semilla=None, paso_s=60,
+                 velocidad_m_s=0.3, correlacion=0.8, temperatura_media=38.3):
+        """
+        collares: lista de (client_id, anillo) donde anillo es [(lon, lat), ...] o None
+        (se usa poligono_por_defecto()).
+        """
+        self.rng = np.random.default_rng(semilla)
+        self.paso_s = paso_s
+        self.velocidad_m_s = velocidad_m_s
+        self.correlacion = correlacion
+        self.t = 0.0
+
+        self.client_ids = [client_id for client_id, _ in collares]
+        self.n = len(self.client_ids)
+        self._indice = {client_id: i for i, client_id in enumerate(self.client_ids)}
+
+        # Parcelas distintas y a cuál pertenece cada animal
+        anillos, claves = [], {}
+        self.parcela = np.empty(self.n, dtype=np.int32)
+        for i, (_, anillo) in enumerate(collares):
+            clave = tuple(anillo) if anillo else None
+            if clave not in claves:
+                claves[clave] = len(anillos)
+                anillos.append(np.asarray(anillo or poligono_por_defecto(), dtype=float))
+            self.parcela[i] = claves[clave]
+        self.anillos = anillos
+        self.centros = np.array([_centroide(a) for a in anillos]).reshape(-1, 2)
+        self._miembros = [np.flatnonzero(self.parcela == p) for p in range(len(anillos))]
+
+        # Estado por animal
+        self.lon, self.lat = self._puntos_iniciales()
+        self.vx = np.zeros(self.n)  # m/s hacia el este
+        self.vy = np.zeros(self.n)  # m/s hacia el norte
+        self.temp_base = self.rng.normal(temperatura_media, 0.25, self.n)
+        self.temp_ruido = np.zeros(self.n)
+        self.bateria = self.rng.uniform(80.0, 100.0, self.n)
+        self.fuera = np.zeros(self.n, dtype=bool)
+        self.inactivos = np.zeros(self.n, dtype=bool)
+        self.fiebre = np.zeros(self.n)  # grados sobre la base por evento de fiebre
+
+        self.eventos = [self._preparar_evento(e) for e in (eventos or [])]
+
+    @classmethod
+    def desde_json(cls, ruta, collares, **kwargs):
+        with open(ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        if kwargs.get("semilla") is None:
+            kwargs["semilla"] = datos.get("semilla")
+        if kwargs.get("paso_s") is None:
+            kwargs["paso_s"] = datos.get("paso_s", 60)
+        return cls(collares, datos.get("eventos", []), **kwargs)
+
+    # ------------------------------------------------------------------
+    # Preparación
+    # ------------------------------------------------------------------
+    def _puntos_iniciales(self):
+        lon = np.empty(self.n)
+        lat = np.empty(self.n)
+        for p, anillo in enumerate(self.anillos):
+            miembros = self._miembros[p]
+            minx, miny = anillo.min(axis=0)
+            maxx, maxy = anillo.max(axis=0)
+            pendientes = miembros
+            # Se sortean puntos para todos los pendientes a la vez y se repite solo con los que cayeron fuera
+            while len(pendientes):
+                x = self.rng.uniform(minx, maxx, len(pendientes))
+                y = self.rng.uniform(miny, maxy, len(pendientes))
+                dentro = dentro_de_poligono(x, y, anillo)
+                lon[pendientes[dentro]] = x[dentro]
+                lat[pendientes[dentro]] = y[dentro]
+                pendientes = pendientes[~dentro]
+        return lon, lat
+
+    def _preparar_evento(self, evento):
+        tipo = evento.get("tipo")
+        if tipo not in EVENTOS:
+            raise ValueError(f"Tipo de evento desconocido: {tipo!r} (válidos: {', '.join(EVENTOS)})")
+
+        if "client_ids" in evento:
+            animales = np.array([self._indice[c] for c in evento["client_ids"] if c in self._indice], dtype=int)
+        elif "indices" in evento:
+            animales = np.array([i for i in evento["indices"] if 0 <= i < self.n], dtype=int)
+        else:
+            cantidad = evento.get("cantidad")
+            if cantidad is None:
+                cantidad = int(round(self.n * evento.get("fraccion", 0.0)))
+            animales = self.rng.choice(self.n, size=min(cantidad, self.n), replace=False)
+
+        mascara = np.zeros(self.n, dtype=bool)
+        mascara[animales] = True
+        inicio = float(evento.get("inicio_s", 0))
+        duracion = evento.get("duracion_s")
+        return {
+            "tipo": tipo,
+            "inicio": inicio,
+            "fin": inicio + float(duracion) if duracion is not None else float("inf"),
+            "mascara": mascara,
+            "temperatura": float(evento.get("temperatura", 40.5)),
+            "tasa_por_hora": float(evento.get("tasa_por_hora", 20.0)),
+        }
+
+    def _activos(self, tipo):
+        """Máscara de los animales con un evento 'tipo' en curso y, para fiebre, la temperatura objetivo."""
+        mascara = np.zeros(self.n, dtype=bool)
+        objetivo = np.zeros(self.n)
+        for evento in self.eventos:
+            if evento["tipo"] == tipo and evento["inicio"] <= self.t < evento["fin"]:
+                mascara |= evento["mascara"]
+                if tipo == "fiebre":
+                    objetivo[evento["mascara"]] = evento["temperatura"]
+                elif tipo == "bateria":
+                    objetivo[evento["mascara"]] = np.maximum(objetivo[evento["mascara"]], evento["tasa_por_hora"])
+        return mascara, objetivo
+
+    # ------------------------------------------------------------------
+    # Simulación
+    # ------------------------------------------------------------------
+    def paso(self, dt=None):
+        """Avanza la simulación 'dt' segundos (por defecto paso_s)."""
+        dt = self.paso_s if dt is None else dt
+        self.t += dt
+
+        fuga, _ = self._activos("fuga")
+        inactivos, _ = self._activos("inactividad")
+        self._mover(dt, fuga, inactivos)
+
+        # Temperatura: ruido AR(1) alrededor de la base; la fiebre lleva la base al objetivo
+        fiebre, objetivo = self._activos("fiebre")
+        self.temp_ruido = 0.9 * self.temp_ruido + self.rng.normal(0, 0.05, self.n)
+        self.fiebre = np.where(fiebre, objetivo - self.temp_base, 0.0)
+
+        # Batería: consumo normal ~0.05 %/h más el del evento
+        descarga, tasa = self._activos("bateria")
+        por_hora = np.where(descarga, tasa, 0.05)
+        self.bateria = np.maximum(self.bateria - por_hora * dt / 3600.0, 0.0)
+
+        self.inactivos = inactivos
+
+    def _metros_a_grados(self):
+        return 1.0 / (METROS_POR_GRADO * np.cos(np.radians(self.lat))), 1.0 / METROS_POR_GRADO
+
+    def _mover(self, dt, fuga, inactivos):
+        rho = self.correlacion
+        sigma = self.velocidad_m_s
+        ruido = np.sqrt(1 - rho ** 2) * sigma
+        self.vx = rho * self.vx + ruido * self.rng.standard_normal(self.n)
+        self.vy = rho * self.vy + ruido * self.rng.standard_normal(self.n)
+
+        # Fuga: rumbo alejándose del centro de la parcela; regreso: hacia el centro
+        centro = self.centros[self.parcela]
+        gx, gy = self._metros_a_grados()
+        hacia_x = (centro[:, 0] - self.lon) / gx
+        hacia_y = (centro[:, 1] - self.lat) / gy
+        distancia = np.hypot(hacia_x, hacia_y) + 1e-9
+        regreso = self.fuera & ~fuga
+        dirigidos = fuga | regreso
+        signo = np.where(fuga, -1.0, 1.0)
+        self.vx = np.where(dirigidos, signo * 2 * sigma * hacia_x / distancia, self.vx)
+        self.vy = np.where(dirigidos, signo * 2 * sigma * hacia_y / distancia, self.vy)
+
+        self.vx[inactivos] = 0.0
+        self.vy[inactivos] = 0.0
+
+        nuevo_lon = self.lon + self.vx * dt * gx
+        nuevo_lat = self.lat + self.vy * dt * gy
+
+        dentro = np.empty(self.n, dtype=bool)
+        for p, anillo in enumerate(self.anillos):
+            miembros = self._miembros[p]
+            dentro[miembros] = dentro_de_poligono(nuevo_lon[miembros], nuevo_lat[miembros], anillo)
+
+        # Los que deben quedarse en la parcela y saldrían: se quedan y dan media vuelta
+        rechazados = ~dentro & ~dirigidos
+        self.vx[rechazados] *= -1
+        self.vy[rechazados] *= -1
+        self.lon = np.where(rechazados, self.lon, nuevo_lon)
+        self.lat = np.where(rechazados, self.lat, nuevo_lat)
+        self.fuera = ~dentro & ~rechazados
+
+    def publicando(self):
+        """Máscara de los collares que publican en este paso (sin silencio y con batería)."""
+        silencio, _ = self._activos("silencio")
+        return ~silencio & (self.bateria > 0)
+
+    def lecturas(self, timestamp=None):
+        """
+        Lecturas del paso actual con la forma del payload JSON del collar, solo de los
+        collares que publican.
+        """
+        timestamp = (timestamp or datetime.now()).strftime("%Y-%m-%dT%H:%M:%S")
+        publican = np.flatnonzero(self.publicando())
+
+        temperatura = self.temp_base + self.fiebre + self.temp_ruido
+        ambiente = self.rng.uniform(25.0, 30.0, self.n)
+
+        # Acelerómetro: en reposo solo la gravedad; en movimiento, proporcional a la velocidad
+        actividad = np.where(self.inactivos, 0.02, 0.3 + np.hypot(self.vx, self.vy))
+        ax = self.rng.normal(0, 1, self.n) * actividad
+        ay = self.rng.normal(0, 1, self.n) * actividad
+        az = 9.81 + self.rng.normal(0, 1, self.n) * actividad * 0.5
+
+        return [
+            {
+                "client_id": self.client_ids[i],
+                "timestamp": timestamp,
+                "lat": round(float(self.lat[i]), 6),
+                "lon": round(float(self.lon[i]), 6),
+                "temperatura": round(float(temperatura[i]), 2),
+                "temperatura_ambiente": round(float(ambiente[i]), 2),
+                "acelerometro": {
+                    "x": round(float(ax[i]), 2),
+                    "y": round(float(ay[i]), 2),
+                    "z": round(float(az[i]), 2),
+                },
+                "bateria": round(float(self.bateria[i]), 1),
+            }
+            for i in publican
+        ]
+
+    def resumen(self):
+        return {
+            "t": self.t,
+            "collares": self.n,
+            "fuera_de_parcela": int(self.fuera.sum()),
+            "silenciosos": int(self.n - self.publicando().sum()),
+            "con_fiebre": int((self.fiebre > 0).sum()),
+            "bateria_media": round(float(self.bateria.mean()), 1) if self.n else None,
+        }
+
+
+def collares_desde_db():
+    """
+    (client_id, anillo) de los nodos autorizados con un animal asignado, usando la parcela
+    del animal. Necesita un app context de Flask.
+    """
+    from Project import db
+    from Project.models import NodoAutorizado, AsignacionCollar, Animal, Parcela
+
+    filas = (
+        db.session.query(NodoAutorizado.client_id, Parcela.perimetro_geojson)
+        .join(
+            AsignacionCollar,
+            (AsignacionCollar.collar_id == NodoAutorizado.collar_id)
+            & (AsignacionCollar.fecha_fin.is_(None)),
+        )
+        .join(Animal, Animal.id == AsignacionCollar.animal_id)
+        .outerjoin(Parcela, Parcela.id == Animal.parcela_id)
+        .filter(NodoAutorizado.esta_autorizado.is_(True))
+        .order_by(NodoAutorizado.client_id)
+        .all()
+    )
+    collares = []
+    for client_id, geojson in filas:
+        try:
+            anillo = poligono_de_geojson(geojson)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            logging.error(f"GeoJSON inválido para {client_id}: {e}")
+            anillo = None
+        collares.append((client_id, anillo))
+    return collares
+
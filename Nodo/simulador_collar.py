@@ -1,3 +1,5 @@
+import os
+import sys
 import ssl
 import time
 import json
@@ -5,7 +7,11 @@ import random
 import logging
 import threading
 import paho.mqtt.client as mqtt
-from datetime import datetime
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from Comun.codec_binario import codificar_payload
+from Comun.particiones import topic_particionado
 
 # =============================
 # CONFIGURACIÓN GENERAL
@@ -21,6 +27,23 @@ CLIENT_KEY = "F:/TESINA/mqtt_certs/client.key"
 NODOS_SIMULADOS = 11  # Puedes ajustar esta variable para simular más nodos
 INTERVALO_SEGUNDOS = 60
 
+# "json": payload legible (por defecto) | "binario": trama compacta de Comun/codec_binario.py
+FORMATO_PAYLOAD = "json"
+
+# True: cada collar publica en TOPIC/<particion>/<client_id>, para repartir la carga entre
+# varias instancias del gateway sin perder el orden por collar (ver Comun/particiones.py)
+TOPIC_PARTICIONADO = False
+
+# Ruta a un JSON de escenario (ver escenarios.py): movimiento dentro de la parcela de cada
+# animal y eventos guionados (fugas, fiebre, inactividad, batería, silencio). None: lecturas
+# al azar alrededor de un punto fijo, como siempre.
+ESCENARIO = None
+# True: los collares y sus parcelas salen de la base (nodos autorizados con animal asignado);
+# False: se simulan NODOS_SIMULADOS collares en una parcela por defecto
+ESCENARIO_DESDE_DB = True
+# Segundos simulados por segundo real (60: un paso de 60 s por segundo)
+ESCENARIO_ACELERACION = 1.0
+
 # =============================
 # LOGGING GLOBAL
 # =============================
@@ -54,7 +77,7 @@ def generar_payload(client_id):
 # =============================
 # FUNCIÓN POR THREAD
 # =============================
-def run_simulador(client_id):
+def conectar(client_id):
     client = mqtt.Client(client_id=client_id)
     client.tls_set(
         ca_certs=CA_CERT,
@@ -71,28 +94,88 @@ def run_simulador(client_id):
             logging.error(f"[{client_id}] Fallo en la conexión MQTT. Código: {rc}")
 
     client.on_connect = on_connect
+    client.connect(BROKER, PORT, keepalive=60)
+    client.loop_start()
+    return client
+
 
+def publicar(client, payload, nivel=logging.INFO):
+    client_id = payload["client_id"]
+    topic = topic_particionado(TOPIC, client_id) if TOPIC_PARTICIONADO else TOPIC
+    if FORMATO_PAYLOAD == "binario":
+        message = codificar_payload(payload)
+        client.publish(topic, message)
+        logging.log(nivel, f"[{client_id}] Publicado ({len(message)} bytes): {payload}")
+    else:
+        message = json.dumps(payload)
+        client.publish(topic, message)
+        logging.log(nivel, f"[{client_id}] Publicado: {message}")
+
+
+def run_simulador(client_id):
+    client = None
     try:
-        client.connect(BROKER, PORT, keepalive=60)
-        client.loop_start()
+        client = conectar(client_id)
 
         while True:
             payload = generar_payload(client_id)
-            message = json.dumps(payload)
-            client.publish(TOPIC, message)
-            logging.info(f"[{client_id}] Publicado: {message}")
+            publicar(client, payload)
             time.sleep(INTERVALO_SEGUNDOS)
 
     except Exception as e:
         logging.exception(f"[{client_id}] Error en el simulador: {e}")
     finally:
-        client.loop_stop()
-        client.disconnect()
+        if client:
+            client.loop_stop()
+            client.disconnect()
+
+# =============================
+# MODO ESCENARIO
+# =============================
+def collares_escenario():
+    if not ESCENARIO_DESDE_DB:
+        return [(f"nodo-test-{i:03d}", None) for i in range(1, NODOS_SIMULADOS + 1)]
+
+    from Project import create_app
+    from escenarios import collares_desde_db
+    with create_app().app_context():
+        return collares_desde_db()
+
+
+def run_escenario():
+    """Un solo hilo calcula el paso de todos los collares; cada collar publica por su conexión."""
+    from escenarios import Escenario
+
+    collares = collares_escenario()
+    escenario = Escenario.desde_json(ESCENARIO, collares)
+    logging.info(f"Escenario '{ESCENARIO}' con {escenario.n} collares (paso {escenario.paso_s} s)")
+
+    clientes = {}
+    try:
+        for client_id, _ in collares:
+            clientes[client_id] = conectar(client_id)
+
+        inicio = datetime.now()
+        while True:
+            time.sleep(escenario.paso_s / ESCENARIO_ACELERACION)
+            escenario.paso()
+            timestamp = inicio + timedelta(seconds=escenario.t)
+            for payload in escenario.lecturas(timestamp):
+                publicar(clientes[payload["client_id"]], payload, logging.DEBUG)
+            logging.info(f"Paso del escenario: {escenario.resumen()}")
+    finally:
+        for client in clientes.values():
+            client.loop_stop()
+            client.disconnect()
 
 # =============================
 # INICIO DE TODOS LOS THREADS
 # =============================
 if __name__ == "__main__":
+    if ESCENARIO:
+        run_escenario()
+        sys.exit(0)
+
     threads = []
 
     for i in range(1, NODOS_SIMULADOS + 1):
@@ -0,0 +1,245 @@
+import os
+import sys
+import ssl
+import time
+import json
+import random
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta
+import aiomqtt
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import simulador_collar as sim
+from escenarios import Escenario, collares_desde_db
+from Comun.codec_binario import codificar_payload
+from Comun.particiones import topic_particionado
+
+"""
+Simulador de flota en un solo proceso (asyncio + aiomqtt) para pruebas de carga.
+
+A diferencia de simulador_collar.py (un hilo y una conexión TLS por nodo), cada collar
+virtual es una corrutina y los collares comparten unas pocas conexiones MQTT, así un solo
+proceso mueve 10.000+ collares. Reutiliza la configuración de simulador_collar.py
+(broker, TLS, topic, formato del payload).
+
+Patrones:
+  - intervalo y jitter: cada collar publica cada --intervalo segundos ± --jitter (fracción)
+  - arranque: desfasado al azar (por defecto) o --sincronizado (todos a la vez)
+  - ráfagas: cada --rafaga-cada segundos una fracción de la flota (--rafaga-fraccion)
+    publica de golpe --rafaga-lecturas lecturas atrasadas, como un collar que recupera
+    cobertura y vacía su buffer
+
+Con --escenario los collares siguen un escenario de escenarios.py (movimiento dentro de
+la parcela y eventos guionados) en lugar de lecturas al azar.
+
+Cada --reporte segundos informa la tasa lograda frente a la esperada.
+
+    python simulador_flota_async.py --collares 10000 --intervalo 10 --conexiones 20
+"""
+
+
+class Contadores:
+    def __init__(self):
+        self.publicados = 0
+        self.errores = 0
+        self.rafagas = 0
+
+
+contadores = Contadores()
+
+
+def serializar(payload, formato):
+    if formato == "binario":
+        return codificar_payload(payload)
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def armar_mensaje(client_id, formato, timestamp=None):
+    payload = sim.generar_payload(client_id)
+    if timestamp is not None:
+        payload["timestamp"] = timestamp.strftime("%Y-%m-%dT%H:%M:%S")
+    return serializar(payload, formato)
+
+
+async def publicar(cliente, topic, mensaje, qos):
+    try:
+        await cliente.publish(topic, mensaje, qos=qos)
+        contadores.publicados += 1
+    except aiomqtt.MqttError as e:
+        contadores.errores += 1
+        logging.debug(f"Error al publicar en '{topic}': {e}")
+
+
+class Rafaga:
+    """Aviso de ráfaga para todos los collares; cada disparo usa un Event nuevo."""
+
+    def __init__(self):
+        self._evento = asyncio.Event()
+
+    async def esperar(self, timeout):
+        """True si hubo una ráfaga antes de 'timeout' segundos."""
+        try:
+            await asyncio.wait_for(self._evento.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def disparar(self):
+        evento, self._evento = self._evento, asyncio.Event()
+        evento.set()
+
+
+async def collar(client_id, cliente, args, rafaga):
+    topic = topic_particionado(sim.TOPIC, client_id) if args.particionado else sim.TOPIC
+    loop = asyncio.get_running_loop()
+
+    siguiente = loop.time() + (0 if args.sincronizado else random.uniform(0, args.intervalo))
+    while True:
+        restante = siguiente - loop.time()
+        if restante > 0:
+            if await rafaga.esperar(restante) and random.random() < args.rafaga_fraccion:
+                ahora = datetime.now()
+                for atraso in range(args.rafaga_lecturas, 0, -1):
+                    timestamp = ahora - timedelta(seconds=atraso * args.intervalo)
+                    await publicar(cliente, topic, armar_mensaje(client_id, args.formato, timestamp), args.qos)
+            continue
+
+        await publicar(cliente, topic, armar_mensaje(client_id, args.formato), args.qos)
+        # El próximo envío se agenda desde el anterior, así la tasa no deriva si publicar demora
+        siguiente += args.intervalo * (1 + random.uniform(-args.jitter, args.jitter))
+
+
+async def disparar_rafagas(args, rafaga):
+    while True:
+        await asyncio.sleep(args.rafaga_cada)
+        contadores.rafagas += 1
+        logging.info(f"Ráfaga #{contadores.rafagas}: ~{int(args.collares * args.rafaga_fraccion)} collares vacían {args.rafaga_lecturas} lecturas")
+        rafaga.disparar()
+
+
+async def simular_escenario(escenario, clientes, args):
+    """Un paso del escenario calcula todos los collares; cada uno publica por su conexión."""
+    indice = {client_id: i for i, client_id in enumerate(escenario.client_ids)}
+    inicio = datetime.now()
+    while True:
+        await asyncio.sleep(escenario.paso_s / args.aceleracion)
+        escenario.paso()
+        timestamp = inicio + timedelta(seconds=escenario.t)
+        for payload in escenario.lecturas(timestamp):
+            client_id = payload["client_id"]
+            topic = topic_particionado(sim.TOPIC, client_id) if args.particionado else sim.TOPIC
+            cliente = clientes[indice[client_id] % len(clientes)]
+            await publicar(cliente, topic, serializar(payload, args.formato), args.qos)
+        logging.info(f"Paso del escenario: {escenario.resumen()}")
+
+
+def cargar_escenario(args):
+    if args.desde_db:
+        from Project import create_app
+        with create_app().app_context():
+            collares = collares_desde_db()
+    else:
+        collares = [(f"{args.prefijo}{i:05d}", None) for i in range(1, args.collares + 1)]
+    return Escenario.desde_json(args.escenario, collares)
+
+
+async def reportar(args, esperada):
+    anterior, t_anterior = 0, time.monotonic()
+    inicio = t_anterior
+    while True:
+        await asyncio.sleep(args.reporte)
+        ahora = time.monotonic()
+        tasa = (contadores.publicados - anterior) / (ahora - t_anterior)
+        promedio = contadores.publicados / (ahora - inicio)
+        logging.info(
+            f"Publicados: {contadores.publicados} | tasa: {tasa:.0f} msg/s (promedio {promedio:.0f}, "
+            f"esperada {esperada:.0f}) | errores: {contadores.errores}"
+        )
+        anterior, t_anterior = contadores.publicados, ahora
+
+
+async def main(args):
+    tls = aiomqtt.TLSParameters(
+        ca_certs=sim.CA_CERT,
+        certfile=sim.CLIENT_CERT,
+        keyfile=sim.CLIENT_KEY,
+        tls_version=ssl.PROTOCOL_TLSv1_2,
+    )
+    escenario = cargar_escenario(args) if args.escenario else None
+    collares = escenario.n if escenario else args.collares
+    conexiones = max(1, min(args.conexiones, collares))
+    clientes = [
+        aiomqtt.Client(
+            hostname=sim.BROKER,
+            port=sim.PORT,
+            identifier=f"simulador-flota-{i}",
+            tls_params=tls,
+            keepalive=60,
+            max_queued_outgoing_messages=args.max_pendientes,
+        )
+        for i in range(conexiones)
+    ]
+
+    for cliente in clientes:
+        await cliente.__aenter__()
+    logging.info(f"{conexiones} conexiones MQTT abiertas; arrancando {collares} collares")
+
+    if escenario:
+        logging.info(f"Escenario '{args.escenario}' (paso {escenario.paso_s} s, aceleración x{args.aceleracion})")
+        tareas = [asyncio.create_task(simular_escenario(escenario, clientes, args))]
+        esperada = collares * args.aceleracion / escenario.paso_s
+    else:
+        rafaga = Rafaga()
+        tareas = [
+            asyncio.create_task(collar(f"{args.prefijo}{i:05d}", clientes[i % conexiones], args, rafaga))
+            for i in range(1, args.collares + 1)
+        ]
+        if args.rafaga_cada:
+            tareas.append(asyncio.create_task(disparar_rafagas(args, rafaga)))
+        esperada = args.collares / args.intervalo
+    tareas.append(asyncio.create_task(reportar(args, esperada)))
+
+    try:
+        if args.duracion:
+            await asyncio.sleep(args.duracion)
+        else:
+            await asyncio.gather(*tareas)
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+        for cliente in clientes:
+            await cliente.__aexit__(None, None, None)
+        logging.info(f"Fin: {contadores.publicados} publicados, {contadores.errores} errores")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulador asyncio de una flota de collares")
+    parser.add_argument("--collares", type=int, default=10000)
+    parser.add_argument("--intervalo", type=float, default=sim.INTERVALO_SEGUNDOS, help="Segundos entre lecturas de cada collar")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Variación del intervalo (0.1 = ±10%%)")
+    parser.add_argument("--sincronizado", action="store_true", help="Todos los collares arrancan a la vez")
+    parser.add_argument("--conexiones", type=int, default=10, help="Conexiones MQTT compartidas entre los collares")
+    parser.add_argument("--formato", choices=["json", "binario"], default=sim.FORMATO_PAYLOAD)
+    parser.add_argument("--particionado", action="store_true", default=sim.TOPIC_PARTICIONADO)
+    parser.add_argument("--qos", type=int, choices=[0, 1], default=0)
+    parser.add_argument("--prefijo", default="nodo-flota-", help="Prefijo de los client_id simulados")
+    parser.add_argument("--rafaga-cada", type=float, default=0, help="Segundos entre ráfagas (0 = sin ráfagas)")
+    parser.add_argument("--rafaga-fraccion", type=float, default=0.1)
+    parser.add_argument("--rafaga-lecturas", type=int, default=10)
+    parser.add_argument("--duracion", type=float, default=0, help="Segundos de simulación (0 = sin límite)")
+    parser.add_argument("--reporte", type=float, default=5)
+    parser.add_argument("--escenario", help="JSON de escenario (ver escenarios.py): reemplaza intervalo, jitter y ráfagas")
+    parser.add_argument("--desde-db", action="store_true", help="Con --escenario: collares y parcelas de la base")
+    parser.add_argument("--aceleracion", type=float, default=1.0, help="Con --escenario: segundos simulados por segundo real")
+    parser.add_argument("--max-pendientes", type=int, default=0, help="Mensajes sin enviar por conexión (0 = sin límite)")
+    args = parser.parse_args()
+
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -2,13 +2,12 @@
 from flask import Blueprint, request, jsonify, make_response
 from flask_login import login_required, current_user
 from sqlalchemy.orm import joinedload
-from sqlalchemy import func
 from Project import db
 from Project.models import (
     Animal,
     Parcela,
     Collar,
-    Temperatura,
+    TemperaturaActual,
     UbicacionActual,
     AsignacionCollar,
     Especie,
@@ -18,9 +17,11 @@ from Project.models import (
     EstadoReproductivo,
     EstadoCollar,
 )
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from Project.backend.src.Routes.collares.routes import get_estado_collar_id
+from Comun.tiempo import parsear_timestamp
+from Project.backend.src.Services.telemetria import historial
 
 from shapely.geometry import shape, Point
 import json
@@ -184,25 +185,10 @@ def api_list_full_animales():
         for u in ubicaciones
     }
 
-    subquery_temp = (
-        db.session.query(
-            Temperatura.collar_id, func.max(Temperatura.timestamp).label("max_ts")
-        )
-        .group_by(Temperatura.collar_id)
-        .subquery()
-    )
-
-    temp_query = (
-        db.session.query(
-            Temperatura.collar_id, Temperatura.timestamp, Temperatura.corporal
-        )
-        .join(
-            subquery_temp,
-            (Temperatura.collar_id == subquery_temp.c.collar_id)
-            & (Temperatura.timestamp == subquery_temp.c.max_ts),
-        )
-        .all()
-    )
+    # Última temperatura de cada collar (se mantiene en la ingesta)
+    temp_query = db.session.query(
+        TemperaturaActual.collar_id, TemperaturaActual.timestamp, TemperaturaActual.corporal
+    ).all()
     temp_dict = {
         t.collar_id: {
             "corporal": t.corporal,
@@ -342,26 +328,15 @@ def api_cluster_animals(campo_id):
         ).all()
     }
 
-    subquery_temp = (
-        db.session.query(
-            Temperatura.collar_id,
-            func.max(Temperatura.timestamp).label("max_ts")
-        ).group_by(Temperatura.collar_id).subquery()
-    )
-
     temp_dict = {
         t.collar_id: {
             "corporal": t.corporal,
             "timestamp": t.timestamp.isoformat() if t.timestamp else None,
         }
         for t in db.session.query(
-            Temperatura.collar_id,
-            Temperatura.timestamp,
-            Temperatura.corporal
-        ).join(
-            subquery_temp,
-            (Temperatura.collar_id == subquery_temp.c.collar_id)
-            & (Temperatura.timestamp == subquery_temp.c.max_ts)
+            TemperaturaActual.collar_id,
+            TemperaturaActual.timestamp,
+            TemperaturaActual.corporal
         ).all()
     }
 
@@ -505,24 +480,7 @@ def api_animals_ficha_simple(animal_id):
 
     temperatura_data = None
     if collar:
-        subquery = (
-            db.session.query(
-                Temperatura.collar_id, func.max(Temperatura.timestamp).label("max_ts")
-            )
-            .filter(Temperatura.collar_id == collar.id)
-            .group_by(Temperatura.collar_id)
-            .subquery()
-        )
-
-        temperatura_data = (
-            db.session.query(Temperatura.corporal, Temperatura.timestamp)
-            .join(
-                subquery,
-                (Temperatura.collar_id == subquery.c.collar_id)
-                & (Temperatura.timestamp == subquery.c.max_ts),
-            )
-            .first()
-        )
+        temperatura_data = TemperaturaActual.query.filter_by(collar_id=collar.id).first()
 
     return jsonify(
         {
@@ -797,3 +755,50 @@ def api_delete_animal(animal_id):
     db.session.delete(animal)
     db.session.commit()
     return jsonify({"status": "ok", "message": "Animal eliminado correctamente"})
+
+
+# -----------------------------
+# 8. Historial de telemetria del animal (panel del animal)
+# -----------------------------
+HISTORIAL_LIMITE_MAX = 50000
+
+
+@animals.route("/<int:animal_id>/history", methods=["GET"])
+@login_required
+def api_animal_historial(animal_id):
+    """
+    Lecturas del animal entre 'desde' y 'hasta' (ISO 8601; por defecto las ultimas 24 h),
+    de todos los collares que tuvo, cada uno dentro del periodo en que estuvo asignado.
+    Cada lectura trae todos los sensores (None si no vinieron en ese mensaje).
+    Si hay mas de 'limite' lecturas se devuelven las mas recientes del rango, en orden
+    cronologico; las anteriores se piden con 'hasta' justo antes de la primera.
+    """
+    animal = Animal.query.get_or_404(animal_id)
+
+    try:
+        hasta = parsear_timestamp(request.args["hasta"]) if request.args.get("hasta") else datetime.now()
+        desde = parsear_timestamp(request.args["desde"]) if request.args.get("desde") else hasta - timedelta(days=1)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Fecha invalida: {e}"}), 400
+    # 0 o un negativo llegarian al LIMIT de SQLite como "sin limite"
+    limite = request.args.get("limite", 5000, type=int)
+    if limite < 1:
+        return jsonify({"status": "error", "message": "El limite debe ser mayor que 0"}), 400
+    limite = min(limite, HISTORIAL_LIMITE_MAX)
+
+    tramos = [
+        (asignacion.collar_id, asignacion.fecha_inicio, asignacion.fecha_fin)
+        for asignacion in AsignacionCollar.query.filter_by(animal_id=animal.id)
+    ]
+    lecturas = historial(tramos, desde, hasta, limite, recientes=True)
+    for lectura in lecturas:
+        lectura["timestamp"] = lectura["timestamp"].isoformat()
+
+    return jsonify(
+        {
+            "animal_id": animal.id,
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "lecturas": lecturas,
+        }
+    )
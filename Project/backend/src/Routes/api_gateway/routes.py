@@ -1,103 +1,259 @@
 # ~/Project/backend/src/Routes/api_gateway/routes.py
-from flask import Blueprint, request, jsonify
+import json
+import zlib
+from flask import Blueprint, request, jsonify, current_app, Response
 from Project import db
-from Project.models import Ubicacion, Temperatura, Acelerometro, NodoAutorizado, Animal, AsignacionCollar, UbicacionActual
-from datetime import datetime
-from sqlalchemy import desc
-from sqlalchemy.orm import joinedload
+from Project.models import NodoAutorizado, Animal, Collar, AsignacionCollar, UbicacionActual, TemperaturaActual, AceleracionActual
+from Project.backend.src.Services.ingesta import parsear_lectura
+from Project.backend.src.Services.procesador_ingesta import (
+    resolver_lecturas,
+    confirmar_lecturas,
+    resultado_error,
+)
+from Project.backend.src.Services.cache_nodos import cache_nodos
+from Project.backend.src.Services.buffer_ingesta import buffer_ingesta
+from Project.backend.src.Services.idempotencia import filtro_duplicados
+from Project.backend.src.Services.limitador import limitador_ingesta
+from Comun.codec_binario import decodificar_lote, TIPO_CONTENIDO as TIPO_BINARIO
+from Project.backend.src.Services.metricas import (
+    registro,
+    Cronometro,
+    INGESTA_ETAPA_SEGUNDOS,
+    INGESTA_RECHAZOS,
+)
 
 api_gateway = Blueprint('api_gateway', __name__, url_prefix="/api")
 
+# Tamaño máximo aceptado por lectura al descomprimir un lote (el JSON típico ronda 250 bytes)
+BYTES_MAX_POR_LECTURA = 2048
+
+
+@api_gateway.record_once
+def configurar_ingesta(state):
+    filtro_duplicados.capacidad = state.app.config.get("INGESTA_DEDUP_CAPACIDAD", filtro_duplicados.capacidad)
+    limitador_ingesta.configurar(
+        state.app.config.get("INGESTA_LIMITE_CLIENTE_TASA", 0),
+        state.app.config.get("INGESTA_LIMITE_CLIENTE_RAFAGA", 0),
+        state.app.config.get("INGESTA_LIMITE_GLOBAL_TASA", 0),
+        state.app.config.get("INGESTA_LIMITE_GLOBAL_RAFAGA", 0),
+    )
+
+
 @api_gateway.route('/datos', methods=['POST'])
 def recibir_datos():
-    data = request.get_json()
-    print(data)
-    print("HEADER:", request.headers)
+    crono = Cronometro(INGESTA_ETAPA_SEGUNDOS)
+
+    # Las tramas binarias (ver Comun/codec_binario.py) llegan ya decodificadas
+    binario = request.mimetype == TIPO_BINARIO
+    if binario:
+        try:
+            client_ids, lecturas = decodificar_lote(request.get_data())
+        except ValueError as e:
+            return _rechazar(400, "trama_invalida", str(e))
+        if len(lecturas) != 1:
+            return _rechazar(400, "trama_invalida", "Se esperaba una sola trama; para lotes usar /api/datos/batch")
+        data = lecturas[0]
+    else:
+        data = request.get_json(silent=True)
 
     if not data:
-        return jsonify({"status": "error", "message": "Datos JSON faltantes"}), 400
+        return _rechazar(400, "datos_faltantes", "Datos JSON faltantes")
 
     # Autenticación basada en client_id (nodo autorizado)
-    client_id = request.headers.get("X-Client-ID")
-    print(client_id)
+    client_id = request.headers.get("X-Client-ID") or (client_ids[0] if binario else None)
 
     if not client_id:
-        return jsonify({"status": "error", "message": "Falta el encabezado 'X-Client-ID'"}), 401
-
-    nodo = NodoAutorizado.query.filter_by(client_id=client_id, esta_autorizado=True).first()
-    print(nodo)
-    if not nodo:
-        return jsonify({"status": "error", "message": "Nodo no autorizado"}), 403
+        return _rechazar(401, "sin_client_id", "Falta el encabezado 'X-Client-ID'")
 
-    collar = nodo.collar
-    if not collar:
-        return jsonify({"status": "error", "message": "Collar no asociado al nodo"}), 404
+    try:
+        lectura = data if binario else parsear_lectura(data)
+    except (ValueError, TypeError) as e:
+        return _rechazar(400, "lectura_invalida", str(e))
+    crono.marcar("parseo")
 
     try:
-        timestamp_str = data.get("timestamp")
-        lat = data.get("lat")
-        lon = data.get("lon")
-        temperatura_corp = data.get("temperatura")
-        temperatura_amb = data.get("temperatura_ambiente")
-        acelerometro = data.get("acelerometro")
-
-        timestamp = datetime.strptime(timestamp_str, "%Y-%m-%dT%H:%M:%S")
-
-        # Ubicación
-        if lat is not None and lon is not None:
-            ubicacion = Ubicacion(
-                timestamp=timestamp,
-                lat=lat,
-                lon=lon,
-                collar_id=collar.id
-            )
-            db.session.add(ubicacion)
-
-            asignacion = AsignacionCollar.query.filter_by(collar_id=collar.id, fecha_fin=None).first()
-            if asignacion and asignacion.animal_id:
-                actual = UbicacionActual.query.filter_by(animal_id=asignacion.animal_id).first()
-                if actual:
-                    actual.lat = lat
-                    actual.lon = lon
-                    actual.timestamp = timestamp
-                else:
-                    nueva = UbicacionActual(
-                        animal_id=asignacion.animal_id,
-                        lat=lat,
-                        lon=lon,
-                        timestamp=timestamp
-                    )
-                    db.session.add(nueva)
-
-                # Temperatura
-                if temperatura_corp is not None:
-                    temperatura = Temperatura(
-                        timestamp=timestamp,
-                        corporal=temperatura_corp,
-                        ambiente=temperatura_amb,
-                        collar_id=collar.id
-                    )
-                    db.session.add(temperatura)
-
-        # Acelerómetro
-        if acelerometro:
-            aceleracion = Acelerometro(
-                timestamp=timestamp,
-                x=acelerometro.get("x"),
-                y=acelerometro.get("y"),
-                z=acelerometro.get("z"),
-                collar_id=collar.id
-            )
-            db.session.add(aceleracion)
-
-        db.session.commit()
+        # Autorización, asignación activa y duplicados: igual que el lote y el gateway directo
+        (resultado,), lecturas = resolver_lecturas([(client_id, lectura)], crono=crono)
+        if resultado["status"] == "error":
+            return jsonify({"status": "error", "message": resultado["message"]}), resultado["code"]
+        if resultado["status"] == "duplicada":
+            return jsonify({"status": "ok", "message": "Lectura duplicada, ignorada"}), 200
+
+        # Límite de tasa por collar y global: solo se cobra una lectura autorizada que se guarda
+        motivo, espera = limitador_ingesta.consumir(client_id)
+        if motivo:
+            return _rechazar(429, motivo, "Demasiadas lecturas, reintente más tarde",
+                             {"Retry-After": limitador_ingesta.retry_after(espera)})
+
+        # Modo write-behind: se encola y el hilo de fondo la escribe junto con otras
+        if current_app.config.get("INGESTA_MODO") == "buffer":
+            buffer_ingesta.iniciar(current_app._get_current_object())
+            if not buffer_ingesta.encolar(lectura):
+                return _rechazar(503, "cola_llena", "Cola de ingesta llena, reintente más tarde")
+            crono.marcar("encolado")
+            return jsonify({"status": "ok", "message": "Datos encolados"}), 202
+
+        confirmar_lecturas(lecturas, "datos", crono=crono)
 
         return jsonify({"status": "ok", "message": "Datos almacenados correctamente"}), 200
 
     except Exception as e:
         db.session.rollback()
-        return jsonify({"status": "error", "message": str(e)}), 500
-    
+        return _error_interno(e)
+
+
+def _rechazar(codigo, motivo, mensaje, encabezados=None):
+    INGESTA_RECHAZOS.inc(str(codigo), motivo)
+    return jsonify({"status": "error", "message": mensaje}), codigo, encabezados or {}
+
+
+def _error_interno(e):
+    # El detalle (SQL y parámetros) va al log, no al cliente
+    print(f"ERROR: Ingesta: {type(e).__name__}: {e}")
+    return _rechazar(500, "error_interno", "Error interno al guardar las lecturas, reintente más tarde")
+
+
+@api_gateway.route('/datos/batch', methods=['POST'])
+def recibir_datos_batch():
+    """
+    Recibe un lote de lecturas de uno o varios collares y las guarda en una sola transacción.
+    Acepta una lista JSON, un objeto {"lecturas": [...]} o tramas binarias concatenadas
+    (application/octet-stream), opcionalmente comprimidos con Content-Encoding: gzip.
+    Cada lectura indica su 'client_id'; si una lectura JSON no lo trae se usa el
+    encabezado 'X-Client-ID'.
+    Devuelve el estado de cada lectura en el mismo orden en que fue enviada.
+    """
+    crono = Cronometro(INGESTA_ETAPA_SEGUNDOS)
+    client_id_header = request.headers.get("X-Client-ID")
+    lote_max = current_app.config.get("INGESTA_LOTE_MAX", 5000)
+
+    try:
+        cuerpo = _cuerpo_descomprimido(lote_max * BYTES_MAX_POR_LECTURA)
+    except ValueError as e:
+        return _rechazar(400, "compresion_invalida", str(e))
+
+    if request.mimetype == TIPO_BINARIO:
+        try:
+            client_ids, lecturas_binarias = decodificar_lote(cuerpo)
+        except ValueError as e:
+            return _rechazar(400, "trama_invalida", str(e))
+        total = len(lecturas_binarias)
+    else:
+        try:
+            data = json.loads(cuerpo)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            data = data.get("lecturas")
+        total = len(data) if isinstance(data, list) else 0
+
+    if not total:
+        return _rechazar(400, "datos_faltantes", "Se esperaba una lista de lecturas")
+
+    if total > lote_max:
+        return _rechazar(413, "lote_excedido", f"El lote supera el máximo de {lote_max} lecturas")
+
+    resultados = [None] * total
+
+    # 1. Validación de todas las lecturas
+    if request.mimetype == TIPO_BINARIO:
+        pendientes = list(zip(range(total), client_ids, lecturas_binarias))
+    else:
+        pendientes = []  # (indice, client_id, lectura)
+        for indice, item in enumerate(data):
+            client_id = (item.get("client_id") if isinstance(item, dict) else None) or client_id_header
+            if not client_id:
+                resultados[indice] = _resultado_error(indice, 401, "sin_client_id", "Falta el 'client_id' de la lectura")
+                continue
+            try:
+                pendientes.append((indice, client_id, parsear_lectura(item)))
+            except (ValueError, TypeError) as e:
+                resultados[indice] = _resultado_error(indice, 400, "lectura_invalida", str(e))
+
+    crono.marcar("lote_parseo")
+
+    # 2. Autorización, asignaciones y duplicados
+    try:
+        resueltos, lecturas = resolver_lecturas(
+            [(client_id, lectura) for _, client_id, lectura in pendientes],
+            set(), crono=crono, prefijo="lote_",
+        )
+    except Exception as e:
+        return _error_interno(e)
+
+    duplicadas = 0
+    aceptadas = []  # (indice, client_id, lectura) autorizadas y nuevas, en el orden de 'lecturas'
+    for (indice, client_id, lectura), resultado in zip(pendientes, resueltos):
+        resultado["indice"] = indice
+        resultados[indice] = resultado
+        if resultado["status"] == "duplicada":
+            duplicadas += 1
+        elif resultado["status"] == "ok":
+            aceptadas.append((indice, client_id, lectura))
+
+    # 3. Límite de tasa: se cobran solo las lecturas que se van a guardar
+    por_cliente = {}
+    for _, client_id, _ in aceptadas:
+        por_cliente[client_id] = por_cliente.get(client_id, 0) + 1
+    limitados, motivo, espera = limitador_ingesta.consumir_lote(por_cliente)
+    if motivo:
+        return _rechazar(429, motivo, "Demasiadas lecturas, reintente más tarde",
+                         {"Retry-After": limitador_ingesta.retry_after(espera)})
+    if limitados:
+        lecturas = []
+        for indice, client_id, lectura in aceptadas:
+            if client_id in limitados:
+                resultados[indice] = _resultado_error(indice, 429, "limite_cliente", "Demasiadas lecturas del collar, reintente más tarde")
+                resultados[indice]["retry_after"] = limitador_ingesta.retry_after(limitados[client_id])
+            else:
+                lecturas.append(lectura)
+
+    # 4. Inserción masiva en una única transacción
+    if lecturas:
+        try:
+            confirmar_lecturas(lecturas, "batch", crono=crono, prefijo="lote_")
+        except Exception as e:
+            return _error_interno(e)
+
+    errores = [r for r in resultados if r["status"] == "error"]
+
+    return jsonify({
+        "status": "ok" if not errores else "partial_success",
+        "message": f"Lote procesado. Guardadas: {len(lecturas)}, Duplicadas: {duplicadas}, Errores: {len(errores)}.",
+        "summary": {
+            "total": total,
+            "guardadas": len(lecturas),
+            "duplicadas": duplicadas,
+            "errores": len(errores)
+        },
+        "resultados": resultados
+    }), 200 if not errores else 207
+
+
+def _cuerpo_descomprimido(limite):
+    """
+    Cuerpo de la petición, descomprimido si viene con Content-Encoding: gzip (lo usa el
+    gateway MQTT al reenviar lotes). 'limite' acota el tamaño descomprimido para que un
+    cuerpo chico no se expanda sin control. Lanza ValueError si no se puede descomprimir.
+    """
+    cuerpo = request.get_data()
+    if request.content_encoding != "gzip":
+        return cuerpo
+
+    descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        datos = descompresor.decompress(cuerpo, limite)
+    except zlib.error as e:
+        raise ValueError(f"Cuerpo gzip inválido: {e}")
+    if descompresor.unconsumed_tail:
+        raise ValueError(f"El lote descomprimido supera el máximo de {limite} bytes")
+    return datos
+
+
+def _resultado_error(indice, codigo, motivo, mensaje):
+    return dict(resultado_error(codigo, motivo, mensaje), indice=indice)
+
+
 @api_gateway.route('/debug/nodo/<client_id>')
 def debug_nodo(client_id):
     nodo = NodoAutorizado.query.filter_by(client_id=client_id).first()
@@ -111,30 +267,45 @@ def debug_nodo(client_id):
         "collar_codigo": nodo.collar.codigo if nodo.collar else None
     }
 
-@api_gateway.route('/collares/estado', methods=['GET'])
-def collares_estado():
-    # Obtener asignaciones activas con JOIN a Animal y Collar
-    asignaciones = db.session.query(AsignacionCollar).options(
-        joinedload(AsignacionCollar.animal),
-        joinedload(AsignacionCollar.usuario_id),
-        joinedload(AsignacionCollar.collar)
-    ).filter(
-        AsignacionCollar.fecha_fin.is_(None)
-    ).all()
+@api_gateway.route('/debug/cache')
+def debug_cache():
+    return {
+        "estado": "ok",
+        "cache_nodos": cache_nodos.estadisticas(),
+        "filtro_duplicados": filtro_duplicados.estadisticas()
+    }
 
-    resultado = []
+@api_gateway.route('/debug/buffer')
+def debug_buffer():
+    return {
+        "estado": "ok",
+        "modo": current_app.config.get("INGESTA_MODO"),
+        "buffer_ingesta": buffer_ingesta.estadisticas()
+    }
 
-    for asignacion in asignaciones:
-        animal = asignacion.animal
-        collar = asignacion.collar
+@api_gateway.route('/metrics', methods=['GET'])
+def metricas():
+    """Métricas de la ingesta en formato de texto de Prometheus."""
+    return Response(registro.exportar(), mimetype="text/plain; version=0.0.4")
 
-        if not animal or not collar:
-            continue
+@api_gateway.route('/collares/estado', methods=['GET'])
+def collares_estado():
+    # Asignaciones activas con su animal, collar y valores actuales, en una sola consulta
+    filas = (
+        db.session.query(Animal, Collar, UbicacionActual, TemperaturaActual, AceleracionActual)
+        .select_from(AsignacionCollar)
+        .join(Animal, AsignacionCollar.animal_id == Animal.id)
+        .join(Collar, AsignacionCollar.collar_id == Collar.id)
+        .outerjoin(UbicacionActual, UbicacionActual.animal_id == Animal.id)
+        .outerjoin(TemperaturaActual, TemperaturaActual.collar_id == Collar.id)
+        .outerjoin(AceleracionActual, AceleracionActual.collar_id == Collar.id)
+        .filter(AsignacionCollar.fecha_fin.is_(None))
+        .all()
+    )
 
-        ubicacion = Ubicacion.query.filter_by(collar_id=collar.id).order_by(desc(Ubicacion.timestamp)).first()
-        temperatura = Temperatura.query.filter_by(collar_id=collar.id).order_by(desc(Temperatura.timestamp)).first()
-        acelerometro = Acelerometro.query.filter_by(collar_id=collar.id).order_by(desc(Acelerometro.timestamp)).first()
+    resultado = []
 
+    for animal, collar, ubicacion, temperatura, acelerometro in filas:
         resultado.append({
             "animal_id": animal.id,
             "nombre": animal.nombre,
@@ -8,6 +8,7 @@ from Project import db
 from Project.models import AsignacionCollar, Collar, Animal, EstadoCollar, Usuario, Parcela, Campo # Importar Parcela y Campo
 from datetime import datetime
 from sqlalchemy.exc import IntegrityError
+from Project.backend.src.Services.cache_nodos import cache_nodos
 
 collares = Blueprint("collares", __name__, url_prefix="/api/collares")
 
@@ -118,6 +119,9 @@ def _end_active_assignment(assignment):
         if old_collar and old_collar.estado_collar_id not in [_estado_sin_bateria_obj.id, _estado_defectuoso_obj.id]:
             old_collar.estado_collar_id = _estado_disponible_obj.id
             db.session.add(old_collar)
+
+        # La ingesta cachea collar -> animal; la asignación dejó de ser válida
+        cache_nodos.invalidar()
     
 def _create_new_assignment_logic(collar_id, animal_id, usuario_id):
     """Crea una nueva asignación de collar y pone el collar en estado 'activo'."""
@@ -165,6 +169,9 @@ def _assign_collar(collar, animal_to_assign, current_user_id):
             collar.estado_collar_id = _estado_disponible_obj.id
             db.session.add(collar)
 
+    # Nueva asignación (o desasignación): la ingesta debe volver a resolver el animal del collar
+    cache_nodos.invalidar()
+
 # -----------------------------
 # 1. Obtener lista completa de collares
 # -----------------------------
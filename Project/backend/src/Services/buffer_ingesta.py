@@ -0,0 +1,183 @@
+# ~/Project/backend/src/Services/buffer_ingesta.py
+import json
+import time
+import queue
+import atexit
+import threading
+from Project import db
+from Project.backend.src.Services.procesador_ingesta import confirmar_lecturas
+from Project.backend.src.Services.metricas import registro, INGESTA_ETAPA_SEGUNDOS
+
+"""
+Buffer de escritura diferida (write-behind) para la ingesta.
+Con INGESTA_MODO = "buffer", /api/datos valida la lectura, la encola y responde 202.
+Un hilo de fondo vacía la cola cada INGESTA_BUFFER_INTERVALO_MS o cada INGESTA_BUFFER_MAX_FILAS
+lecturas y escribe todo en una sola transacción, así el lock de escritura de SQLite se toma
+una vez por lote en lugar de una vez por petición.
+
+Las lecturas encoladas y aún no escritas se pierden si el proceso muere de forma abrupta;
+al cerrar normalmente se vacía la cola antes de salir.
+
+Si la transacción de un lote falla, el lote se reintenta de a una lectura: las válidas se
+guardan igual y solo las que vuelven a fallar van al archivo de dead letter
+(INGESTA_BUFFER_DEAD_LETTER, una lectura JSON por línea con el error), ya que a quien las
+envió se le respondió 202 y no las va a reenviar.
+"""
+
+
+class BufferIngesta:
+    def __init__(self):
+        self._cola = None
+        self._hilo = None
+        self._app = None
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+
+        self.max_filas = 500
+        self.intervalo = 0.2
+        self.max_cola = 20000
+        self.dead_letter = None
+
+        self.encoladas = 0
+        self.rechazadas = 0
+        self.lotes_escritos = 0
+        self.filas_escritas = 0
+        self.errores = 0
+        self.filas_perdidas = 0
+        self.filas_dead_letter = 0
+        self.ultimo_lote_filas = 0
+        self.ultimo_lote_ms = None
+
+    def iniciar(self, app):
+        """Crea la cola y arranca el hilo de vaciado (una sola vez por proceso)."""
+        if self._hilo is not None:
+            return
+
+        with self._lock:
+            if self._hilo is not None:
+                return
+
+            self._app = app
+            self.max_filas = app.config.get("INGESTA_BUFFER_MAX_FILAS", self.max_filas)
+            self.intervalo = app.config.get("INGESTA_BUFFER_INTERVALO_MS", 200) / 1000.0
+            self.max_cola = app.config.get("INGESTA_BUFFER_MAX_COLA", self.max_cola)
+            self.dead_letter = app.config.get("INGESTA_BUFFER_DEAD_LETTER")
+
+            self._cola = queue.Queue(maxsize=self.max_cola)
+            self._hilo = threading.Thread(target=self._bucle, name="BufferIngesta", daemon=True)
+            self._hilo.start()
+            atexit.register(self.detener)
+
+    def encolar(self, lectura):
+        """Encola una lectura ya resuelta. Devuelve False si la cola está llena."""
+        try:
+            self._cola.put_nowait(lectura)
+        except queue.Full:
+            self.rechazadas += 1
+            return False
+        self.encoladas += 1
+        return True
+
+    def detener(self, timeout=5):
+        """Pide al hilo que escriba lo pendiente y termine."""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+
+    def _bucle(self):
+        while True:
+            lote = self._tomar_lote()
+            if lote:
+                self._escribir(lote)
+            elif self._detener.is_set():
+                return
+
+    def _tomar_lote(self):
+        """Espera la primera lectura y junta más hasta llenar el lote o cumplir el intervalo."""
+        try:
+            lote = [self._cola.get(timeout=self.intervalo)]
+        except queue.Empty:
+            return []
+
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.max_filas:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir(self, lote):
+        inicio = time.perf_counter()
+        with self._app.app_context():
+            try:
+                confirmar_lecturas(lote, "buffer")
+                self.lotes_escritos += 1
+                self.filas_escritas += len(lote)
+            except Exception as e:
+                self.errores += 1
+                print(f"ERROR: No se pudo escribir el lote de {len(lote)} lecturas, se reintenta de a una: {e}")
+                self._escribir_de_a_una(lote)
+            finally:
+                db.session.remove()
+
+        duracion = time.perf_counter() - inicio
+        INGESTA_ETAPA_SEGUNDOS.observar(duracion, "buffer_escritura")
+        self.ultimo_lote_filas = len(lote)
+        self.ultimo_lote_ms = round(duracion * 1000, 2)
+
+    def _escribir_de_a_una(self, lote):
+        """Aísla las lecturas que hacen fallar el lote; las demás se guardan."""
+        fallidas = []
+        for lectura in lote:
+            try:
+                confirmar_lecturas([lectura], "buffer")
+                self.filas_escritas += 1
+            except Exception as e:
+                fallidas.append((lectura, e))
+        if fallidas:
+            print(f"ERROR: {len(fallidas)} de {len(lote)} lecturas del lote no se pudieron guardar")
+            self._guardar_dead_letter(fallidas)
+
+    def _guardar_dead_letter(self, fallidas):
+        if self.dead_letter:
+            try:
+                with open(self.dead_letter, "a", encoding="utf-8") as archivo:
+                    for lectura, error in fallidas:
+                        archivo.write(json.dumps({"lectura": lectura, "error": str(error)}, default=str) + "\n")
+                self.filas_dead_letter += len(fallidas)
+                return
+            except OSError as e:
+                print(f"ERROR: No se pudo escribir el dead letter {self.dead_letter}: {e}")
+        self.filas_perdidas += len(fallidas)
+
+    def estadisticas(self):
+        return {
+            "activo": self._hilo is not None and self._hilo.is_alive(),
+            "cola_actual": self._cola.qsize() if self._cola is not None else 0,
+            "cola_maxima": self.max_cola,
+            "max_filas_por_lote": self.max_filas,
+            "intervalo_ms": int(self.intervalo * 1000),
+            "encoladas": self.encoladas,
+            "rechazadas_cola_llena": self.rechazadas,
+            "lotes_escritos": self.lotes_escritos,
+            "filas_escritas": self.filas_escritas,
+            "errores": self.errores,
+            "filas_perdidas": self.filas_perdidas,
+            "filas_dead_letter": self.filas_dead_letter,
+            "ultimo_lote_filas": self.ultimo_lote_filas,
+            "ultimo_lote_ms": self.ultimo_lote_ms,
+        }
+
+
+buffer_ingesta = BufferIngesta()
+
+registro.medidor(
+    "ingesta_buffer",
+    "Estado del buffer de escritura diferida",
+    lambda: {k: v for k, v in buffer_ingesta.estadisticas().items() if not isinstance(v, bool)},
+    etiqueta="dato",
+)
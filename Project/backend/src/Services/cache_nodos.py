@@ -0,0 +1,111 @@
+# ~/Project/backend/src/Services/cache_nodos.py
+import threading
+from sqlalchemy import event
+from Project import db
+from Project.models import NodoAutorizado, Collar, AsignacionCollar
+from Project.backend.src.Services.ingesta import resolver_nodos
+from Project.backend.src.Services.metricas import registro
+
+"""
+Cache en memoria del proceso para el camino caliente de la ingesta.
+Mapea client_id -> (collar_id, animal_id) para que /api/datos no tenga que consultar
+NodoAutorizado, Collar y AsignacionCollar en cada lectura.
+
+También se guardan los client_id no autorizados (valor None), de modo que un nodo
+rechazado que insiste tampoco genera lecturas a la base.
+
+La cache se invalida completa cuando cambia una asignación de collar (ver collares/routes.py)
+o cuando se insertan, modifican o eliminan filas de NodoAutorizado, y al borrar collares o asignaciones. Los cambios son
+poco frecuentes frente al volumen de lecturas, así que no vale la pena invalidar por clave.
+"""
+
+
+class CacheNodos:
+    def __init__(self):
+        self._datos = {}
+        self._lock = threading.Lock()
+        self._generacion = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+
+    def resolver(self, client_ids):
+        """
+        Devuelve {client_id: (collar_id, animal_id) | None} para todos los client_ids pedidos.
+        Los que no están en cache se resuelven juntos en una sola consulta.
+        """
+        resultado = {}
+        faltantes = []
+
+        with self._lock:
+            for client_id in client_ids:
+                if client_id in self._datos:
+                    resultado[client_id] = self._datos[client_id]
+                    self.hits += 1
+                else:
+                    faltantes.append(client_id)
+                    self.misses += 1
+            generacion = self._generacion
+
+        if faltantes:
+            encontrados = resolver_nodos(faltantes)
+            nuevos = {client_id: encontrados.get(client_id) for client_id in faltantes}
+            resultado.update(nuevos)
+
+            with self._lock:
+                # Si hubo una invalidación mientras consultábamos, no guardamos datos viejos
+                if generacion == self._generacion:
+                    self._datos.update(nuevos)
+
+        return resultado
+
+    def invalidar(self):
+        self._limpiar()
+        self.invalidaciones += 1
+
+        # Se vuelve a invalidar al confirmar la transacción, por si otra petición
+        # recargó la cache con el estado previo antes del commit.
+        db.session.info["invalidar_cache_nodos"] = True
+
+    def _limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._generacion += 1
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._datos),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "invalidaciones": self.invalidaciones,
+            }
+
+
+cache_nodos = CacheNodos()
+
+registro.medidor(
+    "ingesta_cache_nodos",
+    "Estado de la cache client_id -> (collar, animal)",
+    lambda: {k: v for k, v in cache_nodos.estadisticas().items() if k != "hit_ratio"},
+    etiqueta="dato",
+)
+
+
+def _invalidar_por_cambio(mapper, connection, target):
+    cache_nodos.invalidar()
+
+
+for _evento in ("after_insert", "after_update", "after_delete"):
+    event.listen(NodoAutorizado, _evento, _invalidar_por_cambio)
+event.listen(Collar, "after_delete", _invalidar_por_cambio)
+# Al borrar un collar o un animal sus asignaciones se eliminan en cascada
+event.listen(AsignacionCollar, "after_delete", _invalidar_por_cambio)
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidar_al_confirmar(session):
+    if session.info.pop("invalidar_cache_nodos", False):
+        cache_nodos._limpiar()
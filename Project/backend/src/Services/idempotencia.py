@@ -0,0 +1,109 @@
+# ~/Project/backend/src/Services/idempotencia.py
+import threading
+from collections import OrderedDict
+from sqlalchemy import text
+from Project import db
+from Project.backend.src.Services.metricas import registro
+
+"""
+Supresión de lecturas duplicadas.
+Con QoS >= 1 y los reintentos del gateway una misma lectura puede llegar varias veces.
+Una lectura se identifica por (collar_id, timestamp del dispositivo), la misma clave de los
+índices únicos: dos lecturas del mismo collar en el mismo instante son la misma, y la segunda
+se informa como duplicada en vez de aceptarse y perderse en el INSERT OR IGNORE.
+
+Hay dos barreras:
+  1. FiltroDuplicados: las claves de las lecturas guardadas recientemente se recuerdan en
+     memoria, así un reenvío se descarta antes de tocar la base.
+  2. Índices únicos (collar_id, timestamp) en ubicaciones, temperaturas y aceleraciones,
+     con INSERT OR IGNORE, para lo que el filtro no alcance a ver (reinicios, peticiones
+     concurrentes con la misma lectura, procesos distintos).
+"""
+
+# Tabla -> nombre del índice único que garantiza la idempotencia
+INDICES_UNICOS = {
+    "ubicaciones": "uq_ubicacion_collar_timestamp",
+    "temperaturas": "uq_temperatura_collar_timestamp",
+    "aceleraciones": "uq_aceleracion_collar_timestamp",
+}
+
+
+class FiltroDuplicados:
+    def __init__(self, capacidad=200000):
+        self.capacidad = capacidad
+        self._claves = OrderedDict()  # orden de inserción: la primera es la más vieja
+        self._lock = threading.Lock()
+        self.descartadas = 0
+
+    @staticmethod
+    def clave(lectura):
+        return (lectura["collar_id"], lectura["timestamp"])
+
+    def es_duplicada(self, lectura, vistas=None):
+        """
+        Indica si la lectura ya fue guardada recientemente.
+        'vistas' es un set opcional con las claves ya aceptadas en el mismo lote; la clave
+        de la lectura se agrega si no es duplicada.
+        """
+        clave = self.clave(lectura)
+        if clave in self._claves or (vistas is not None and clave in vistas):
+            self.descartadas += 1
+            return True
+        if vistas is not None:
+            vistas.add(clave)
+        return False
+
+    def registrar(self, lecturas):
+        """Recuerda las claves de lecturas ya confirmadas en la base."""
+        with self._lock:
+            for lectura in lecturas:
+                self._claves[self.clave(lectura)] = None
+            # popitem(last=False) descarta la más vieja en O(1), sin recorrer las demás
+            while len(self._claves) > self.capacidad:
+                self._claves.popitem(last=False)
+
+    def estadisticas(self):
+        return {
+            "claves": len(self._claves),
+            "capacidad": self.capacidad,
+            "descartadas": self.descartadas,
+        }
+
+
+filtro_duplicados = FiltroDuplicados()
+
+registro.medidor(
+    "ingesta_filtro_duplicados",
+    "Claves recordadas y lecturas descartadas por el filtro de duplicados",
+    filtro_duplicados.estadisticas,
+    etiqueta="dato",
+)
+
+
+def asegurar_indices_unicos():
+    """
+    Crea los índices únicos de idempotencia en bases existentes (create_all no agrega
+    índices a tablas que ya existen). Antes de crearlos elimina los duplicados que se
+    hayan acumulado, conservando la primera fila de cada (collar_id, timestamp).
+    """
+    existentes = {
+        fila[0]
+        for fila in db.session.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index'")
+        )
+    }
+
+    for tabla, indice in INDICES_UNICOS.items():
+        if indice in existentes:
+            continue
+
+        db.session.execute(text(
+            f"DELETE FROM {tabla} WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM {tabla} GROUP BY collar_id, timestamp)"
+        ))
+        db.session.execute(text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {indice} ON {tabla} (collar_id, timestamp)"
+        ))
+        print(f"INFO: Índice único {indice} creado en {tabla}.")
+
+    db.session.commit()
@@ -0,0 +1,200 @@
+# ~/Project/backend/src/Services/ingesta.py
+import math
+from Project import db
+from Project.models import (
+    Lectura,
+    Ubicacion,
+    Temperatura,
+    Acelerometro,
+    NodoAutorizado,
+    AsignacionCollar,
+    Collar,
+)
+from Project.backend.src.Services.ubicacion_actual import (
+    upsert_ubicaciones_actuales,
+    upsert_temperaturas_actuales,
+    upsert_aceleraciones_actuales,
+)
+from Project.backend.src.Services.telemetria import esquema_telemetria, COLUMNAS_LECTURA
+from Project.backend.src.Services.particiones_telemetria import insertar_particionado
+from Comun.tiempo import parsear_timestamp
+
+"""
+Lógica compartida de ingesta de lecturas de collares.
+La usan tanto POST /api/datos (una lectura) como POST /api/datos/batch (lote).
+"""
+
+
+def _numero(valor, campo):
+    """
+    Valor numérico de un campo opcional de la lectura (None si no vino).
+    Lanza ValueError si no es un número finito: así la lectura se rechaza sola, en lugar de
+    hacer fallar el INSERT del lote entero.
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, bool):
+        raise ValueError(f"El campo '{campo}' debe ser numérico")
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"El campo '{campo}' debe ser numérico") from None
+    if not math.isfinite(numero):
+        raise ValueError(f"El campo '{campo}' debe ser un número finito")
+    return numero
+
+
+def parsear_lectura(data):
+    """
+    Valida y normaliza una lectura JSON del collar.
+    Lanza ValueError con un mensaje legible si la lectura es inválida.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("La lectura debe ser un objeto JSON")
+
+    timestamp_str = data.get("timestamp")
+    if not timestamp_str:
+        raise ValueError("Falta el campo 'timestamp'")
+
+    acelerometro = data.get("acelerometro")
+    if acelerometro is not None and not isinstance(acelerometro, dict):
+        raise ValueError("El campo 'acelerometro' debe ser un objeto con x, y, z")
+    if acelerometro:
+        acelerometro = {eje: _numero(acelerometro.get(eje), f"acelerometro.{eje}") for eje in ("x", "y", "z")}
+
+    return {
+        "timestamp": parsear_timestamp(timestamp_str),
+        "lat": _numero(data.get("lat"), "lat"),
+        "lon": _numero(data.get("lon"), "lon"),
+        "temperatura": _numero(data.get("temperatura"), "temperatura"),
+        "temperatura_ambiente": _numero(data.get("temperatura_ambiente"), "temperatura_ambiente"),
+        "acelerometro": acelerometro,
+    }
+
+
+def resolver_nodos(client_ids):
+    """
+    Resuelve en una sola consulta los client_id autorizados a (collar_id, animal_id).
+    Devuelve {client_id: (collar_id, animal_id)}; collar_id es None si el collar no existe
+    y animal_id es None si el collar no tiene asignación activa.
+    """
+    if not client_ids:
+        return {}
+
+    filas = (
+        db.session.query(
+            NodoAutorizado.client_id,
+            Collar.id,
+            AsignacionCollar.animal_id,
+        )
+        .outerjoin(Collar, NodoAutorizado.collar_id == Collar.id)
+        .outerjoin(
+            AsignacionCollar,
+            (AsignacionCollar.collar_id == Collar.id)
+            & (AsignacionCollar.fecha_fin.is_(None)),
+        )
+        .filter(
+            NodoAutorizado.client_id.in_(list(client_ids)),
+            NodoAutorizado.esta_autorizado.is_(True),
+        )
+        .all()
+    )
+    return {client_id: (collar_id, animal_id) for client_id, collar_id, animal_id in filas}
+
+
+def guardar_lecturas(lecturas):
+    """
+    Inserta un conjunto de lecturas ya resueltas (con collar_id y animal_id) usando
+    inserciones masivas. No hace commit: la transacción la maneja quien llama.
+
+    Mantiene la misma semántica que /api/datos:
+      - La ubicación se guarda si vienen lat y lon.
+      - La temperatura y la UbicacionActual solo si el collar tiene un animal asignado.
+      - El acelerómetro se guarda siempre que venga informado.
+      - TemperaturaActual y AceleracionActual se actualizan con lo que se guarda.
+
+    Según TELEMETRIA_ESQUEMA escribe en las tablas separadas, en lecturas (una fila por
+    mensaje con los mismos datos), en ambas o en la partición mensual de cada lectura.
+    """
+    ubicaciones = []
+    temperaturas = []
+    aceleraciones = []
+    ultimas = []
+    unificadas = []
+
+    for lectura in lecturas:
+        collar_id = lectura["collar_id"]
+        animal_id = lectura.get("animal_id")
+        timestamp = lectura["timestamp"]
+        lat = lectura.get("lat")
+        lon = lectura.get("lon")
+        # Misma lectura en el esquema unificado: solo los sensores que se guardan.
+        # Todas las filas llevan todas las columnas (executemany usa una sola sentencia)
+        unificada = dict.fromkeys(COLUMNAS_LECTURA, None)
+        unificada["collar_id"] = collar_id
+        unificada["timestamp"] = timestamp
+
+        if lat is not None and lon is not None:
+            ubicaciones.append(
+                {"timestamp": timestamp, "lat": lat, "lon": lon, "collar_id": collar_id}
+            )
+            unificada["lat"] = lat
+            unificada["lon"] = lon
+
+            if animal_id:
+                ultimas.append(
+                    {"animal_id": animal_id, "timestamp": timestamp, "lat": lat, "lon": lon}
+                )
+
+                if lectura.get("temperatura") is not None:
+                    temperaturas.append(
+                        {
+                            "timestamp": timestamp,
+                            "corporal": lectura["temperatura"],
+                            "ambiente": lectura.get("temperatura_ambiente"),
+                            "collar_id": collar_id,
+                        }
+                    )
+                    unificada["temperatura_corporal"] = lectura["temperatura"]
+                    unificada["temperatura_ambiente"] = lectura.get("temperatura_ambiente")
+
+        acelerometro = lectura.get("acelerometro")
+        if acelerometro:
+            aceleraciones.append(
+                {
+                    "timestamp": timestamp,
+                    "x": acelerometro.get("x"),
+                    "y": acelerometro.get("y"),
+                    "z": acelerometro.get("z"),
+                    "collar_id": collar_id,
+                }
+            )
+            unificada["acel_x"] = acelerometro.get("x")
+            unificada["acel_y"] = acelerometro.get("y")
+            unificada["acel_z"] = acelerometro.get("z")
+
+        if unificada["lat"] is not None or acelerometro:
+            unificadas.append(unificada)
+
+    esquema = esquema_telemetria()
+
+    # OR IGNORE: los índices únicos (collar_id, timestamp) descartan lecturas reenviadas
+    if esquema == "particionado":
+        if unificadas:
+            insertar_particionado(unificadas)
+    elif esquema != "unificado":
+        if ubicaciones:
+            db.session.execute(Ubicacion.__table__.insert().prefix_with("OR IGNORE"), ubicaciones)
+        if temperaturas:
+            db.session.execute(Temperatura.__table__.insert().prefix_with("OR IGNORE"), temperaturas)
+        if aceleraciones:
+            db.session.execute(Acelerometro.__table__.insert().prefix_with("OR IGNORE"), aceleraciones)
+    if esquema in ("unificado", "ambos") and unificadas:
+        db.session.execute(Lectura.__table__.insert().prefix_with("OR IGNORE"), unificadas)
+
+    if ultimas:
+        upsert_ubicaciones_actuales(ultimas)
+    if temperaturas:
+        upsert_temperaturas_actuales(temperaturas)
+    if aceleraciones:
+        upsert_aceleraciones_actuales(aceleraciones)
@@ -0,0 +1,182 @@
+# ~/Project/backend/src/Services/limitador.py
+import math
+import time
+import threading
+from collections import OrderedDict
+from Project.backend.src.Services.metricas import registro
+
+"""
+Limitación de tasa de la ingesta con cubetas de tokens (token bucket), en memoria del proceso.
+
+Hay una cubeta por client_id y una global. Cada cubeta se rellena a 'tasa' tokens por
+segundo hasta 'rafaga' tokens; cada lectura consume un token. Si no alcanzan, la petición
+se rechaza con 429 y el tiempo de espera sugerido (Retry-After).
+
+Así un collar mal configurado, o un gateway reenviando su atraso, no satura la ingesta ni
+deja sin respuesta al mapa. Cada verificación es un lock y un par de cuentas, sin tocar la base.
+Una tasa 0 desactiva el límite correspondiente.
+
+Se aplica después de autorizar el nodo (no se crean cubetas para client_id inventados) y
+solo se cobran las lecturas que se aceptan. Las cubetas se guardan en orden de uso: si se
+llega a MAX_CUBETAS y purgar las inactivas no alcanza, se descartan las usadas hace más tiempo.
+"""
+
+
+class LimitadorIngesta:
+    # Cubetas por client_id que se conservan como máximo
+    MAX_CUBETAS = 100000
+
+    def __init__(self, tasa_cliente=0, rafaga_cliente=0, tasa_global=0, rafaga_global=0):
+        self._lock = threading.Lock()
+        self._cubetas = OrderedDict()  # client_id -> [tokens, último relleno], la menos usada primero
+        self.configurar(tasa_cliente, rafaga_cliente, tasa_global, rafaga_global)
+        self.aceptadas = 0
+        self.rechazadas_cliente = 0
+        self.rechazadas_global = 0
+
+    def configurar(self, tasa_cliente, rafaga_cliente, tasa_global, rafaga_global):
+        with self._lock:
+            self.tasa_cliente = float(tasa_cliente)
+            self.rafaga_cliente = float(rafaga_cliente or tasa_cliente)
+            self.tasa_global = float(tasa_global)
+            self.rafaga_global = float(rafaga_global or tasa_global)
+            self._global = [self.rafaga_global, time.monotonic()]
+            self._cubetas.clear()
+
+    @staticmethod
+    def _rellenar(cubeta, tasa, rafaga, ahora):
+        cubeta[0] = min(rafaga, cubeta[0] + (ahora - cubeta[1]) * tasa)
+        cubeta[1] = ahora
+
+    @staticmethod
+    def _espera(cubeta, costo, tasa, rafaga):
+        """
+        Segundos hasta poder consumir 'costo' tokens (0 si ya se puede).
+        Un costo mayor que la ráfaga (un lote grande) se acepta con la cubeta llena y la deja
+        en negativo: la deuda se paga antes de aceptar lo siguiente.
+        """
+        necesarios = min(costo, rafaga)
+        if cubeta[0] >= necesarios:
+            return 0.0
+        return (necesarios - cubeta[0]) / tasa
+
+    def _cubeta(self, client_id, ahora):
+        """Cubeta de client_id ya rellenada (la crea llena si no existe). Requiere el lock."""
+        cubeta = self._cubetas.get(client_id)
+        if cubeta is None:
+            if len(self._cubetas) >= self.MAX_CUBETAS:
+                self._purgar(ahora)
+            cubeta = self._cubetas[client_id] = [self.rafaga_cliente, ahora]
+        else:
+            self._rellenar(cubeta, self.tasa_cliente, self.rafaga_cliente, ahora)
+            self._cubetas.move_to_end(client_id)
+        return cubeta
+
+    def consumir(self, client_id=None, costo=1, incluir_global=True):
+        """
+        Intenta consumir 'costo' tokens de la cubeta global (salvo incluir_global=False) y de
+        la de client_id (si se indica).
+        Devuelve (None, 0) si se acepta, o (motivo, segundos) si se rechaza, con motivo
+        "limite_cliente" o "limite_global". Si se rechaza no se consume nada.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            cubeta = None
+            if client_id is not None and self.tasa_cliente > 0:
+                cubeta = self._cubeta(client_id, ahora)
+                espera = self._espera(cubeta, costo, self.tasa_cliente, self.rafaga_cliente)
+                if espera:
+                    self.rechazadas_cliente += costo
+                    return "limite_cliente", espera
+
+            if incluir_global and self.tasa_global > 0:
+                self._rellenar(self._global, self.tasa_global, self.rafaga_global, ahora)
+                espera = self._espera(self._global, costo, self.tasa_global, self.rafaga_global)
+                if espera:
+                    self.rechazadas_global += costo
+                    return "limite_global", espera
+                self._global[0] -= costo
+
+            if cubeta is not None:
+                cubeta[0] -= costo
+            self.aceptadas += costo
+            return None, 0
+
+    def consumir_lote(self, costos):
+        """
+        Límite de un lote con lecturas de varios collares: costos = {client_id: lecturas}.
+        Primero decide qué collares superan su límite y después cobra a la cubeta global
+        solo las lecturas de los demás.
+        Devuelve (limitados, motivo, segundos): limitados = {client_id: segundos} con los
+        collares rechazados, y motivo "limite_global" (con su espera) si el lote entero se
+        rechaza; en ese caso no se consume nada de ninguna cubeta.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            limitados = {}
+            aceptados = []
+            for client_id, costo in costos.items():
+                if self.tasa_cliente > 0:
+                    cubeta = self._cubeta(client_id, ahora)
+                    espera = self._espera(cubeta, costo, self.tasa_cliente, self.rafaga_cliente)
+                    if espera:
+                        limitados[client_id] = espera
+                        continue
+                else:
+                    cubeta = None
+                aceptados.append((cubeta, costo))
+
+            total = sum(costo for _, costo in aceptados)
+            if total and self.tasa_global > 0:
+                self._rellenar(self._global, self.tasa_global, self.rafaga_global, ahora)
+                espera = self._espera(self._global, total, self.tasa_global, self.rafaga_global)
+                if espera:
+                    self.rechazadas_global += sum(costos.values())
+                    return {}, "limite_global", espera
+                self._global[0] -= total
+
+            for cubeta, costo in aceptados:
+                if cubeta is not None:
+                    cubeta[0] -= costo
+            self.rechazadas_cliente += sum(costos[client_id] for client_id in limitados)
+            self.aceptadas += total
+            return limitados, None, 0
+
+    def _purgar(self, ahora):
+        # Una cubeta que ya se habría rellenado por completo equivale a una nueva
+        llenas = [
+            client_id for client_id, (tokens, ultimo) in self._cubetas.items()
+            if tokens + (ahora - ultimo) * self.tasa_cliente >= self.rafaga_cliente
+        ]
+        for client_id in llenas:
+            del self._cubetas[client_id]
+        # Si todas están activas, se descartan las usadas hace más tiempo (vuelven llenas)
+        while len(self._cubetas) >= self.MAX_CUBETAS:
+            self._cubetas.popitem(last=False)
+
+    @staticmethod
+    def retry_after(segundos):
+        """Valor del encabezado Retry-After: segundos enteros, al menos 1."""
+        return str(max(1, math.ceil(segundos)))
+
+    def estadisticas(self):
+        return {
+            "tasa_cliente": self.tasa_cliente,
+            "rafaga_cliente": self.rafaga_cliente,
+            "tasa_global": self.tasa_global,
+            "rafaga_global": self.rafaga_global,
+            "cubetas": len(self._cubetas),
+            "aceptadas": self.aceptadas,
+            "rechazadas_cliente": self.rechazadas_cliente,
+            "rechazadas_global": self.rechazadas_global,
+        }
+
+
+limitador_ingesta = LimitadorIngesta()
+
+registro.medidor(
+    "ingesta_limitador",
+    "Configuración y decisiones del limitador de tasa de la ingesta",
+    limitador_ingesta.estadisticas,
+    etiqueta="dato",
+)
@@ -0,0 +1,188 @@
+# ~/Project/backend/src/Services/metricas.py
+import time
+import bisect
+import threading
+
+"""
+Métricas en memoria del proceso, exportadas en formato de texto de Prometheus (/api/metrics).
+Implementación mínima y sin dependencias: contadores y histogramas con etiquetas, más
+medidores calculados al momento de exportar (por ejemplo, el tamaño de la cola del buffer).
+
+Registrar una observación cuesta un lock y una búsqueda binaria, del orden de un microsegundo.
+"""
+
+# Límites en segundos, pensados para las etapas de la ingesta y el commit en SQLite
+BUCKETS_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _formatear_etiquetas(nombres, valores, extra=None):
+    pares = list(zip(nombres, valores))
+    if extra:
+        pares.append(extra)
+    if not pares:
+        return ""
+    contenido = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pares
+    )
+    return "{" + contenido + "}"
+
+
+def _formatear_valor(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *etiquetas, valor=1):
+        with self._lock:
+            self._valores[etiquetas] = self._valores.get(etiquetas, 0) + valor
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        with self._lock:
+            for etiquetas, valor in sorted(self._valores.items()):
+                lineas.append(f"{self.nombre}{_formatear_etiquetas(self.etiquetas, etiquetas)} {_formatear_valor(valor)}")
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.buckets = tuple(buckets)
+        self._series = {}  # etiquetas -> [conteos por bucket..., +Inf, suma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        posicion = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(etiquetas)
+            if serie is None:
+                serie = self._series[etiquetas] = [0] * (len(self.buckets) + 2)
+            serie[posicion] += 1
+            serie[-1] += valor
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+
+        for etiquetas, serie in series:
+            acumulado = 0
+            for limite, conteo in zip(self.buckets + (float("inf"),), serie[:-1]):
+                acumulado += conteo
+                le = _formatear_etiquetas(self.etiquetas, etiquetas, ("le", _formatear_valor(limite)))
+                lineas.append(f"{self.nombre}_bucket{le} {acumulado}")
+            base = _formatear_etiquetas(self.etiquetas, etiquetas)
+            lineas.append(f"{self.nombre}_sum{base} {_formatear_valor(serie[-1])}")
+            lineas.append(f"{self.nombre}_count{base} {acumulado}")
+        return lineas
+
+
+class Medidor:
+    """Valor instantáneo calculado al exportar. 'funcion' devuelve un número o {etiqueta: número}."""
+
+    def __init__(self, nombre, ayuda, funcion, etiqueta=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+        self.etiqueta = etiqueta
+
+    def exportar(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} gauge"]
+        valor = self.funcion()
+        if isinstance(valor, dict):
+            for clave, v in sorted(valor.items()):
+                if v is not None:
+                    lineas.append(f"{self.nombre}{_formatear_etiquetas((self.etiqueta,), (clave,))} {_formatear_valor(v)}")
+        elif valor is not None:
+            lineas.append(f"{self.nombre} {_formatear_valor(valor)}")
+        return lineas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self.registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_LATENCIA):
+        return self.registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def medidor(self, nombre, ayuda, funcion, etiqueta=None):
+        return self.registrar(Medidor(nombre, ayuda, funcion, etiqueta))
+
+    def exportar(self):
+        lineas = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.exportar())
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+
+class Cronometro:
+    """
+    Mide etapas consecutivas de una petición con una sola llamada a perf_counter por etapa:
+
+        crono = Cronometro(INGESTA_ETAPA_SEGUNDOS)
+        ...parseo...
+        crono.marcar("parseo")
+        ...insercion...
+        crono.marcar("insercion")
+    """
+
+    __slots__ = ("histograma", "_ultimo")
+
+    def __init__(self, histograma):
+        self.histograma = histograma
+        self._ultimo = time.perf_counter()
+
+    def marcar(self, etapa):
+        ahora = time.perf_counter()
+        self.histograma.observar(ahora - self._ultimo, etapa)
+        self._ultimo = ahora
+
+
+# --- Métricas de la ingesta de telemetría ---
+INGESTA_ETAPA_SEGUNDOS = registro.histograma(
+    "ingesta_etapa_segundos",
+    "Duración de cada etapa de la ingesta (parseo, nodo, insercion, commit, encolado)",
+    ("etapa",),
+)
+INGESTA_MENSAJES = registro.contador(
+    "ingesta_mensajes_total",
+    "Lecturas recibidas por collar (solo nodos autorizados)",
+    ("client_id",),
+)
+INGESTA_RECHAZOS = registro.contador(
+    "ingesta_rechazos_total",
+    "Lecturas rechazadas por código de respuesta y motivo",
+    ("codigo", "motivo"),
+)
+INGESTA_GUARDADAS = registro.contador(
+    "ingesta_lecturas_guardadas_total",
+    "Lecturas escritas en la base por endpoint",
+    ("endpoint",),
+)
+INGESTA_LOTE_TAMANIO = registro.histograma(
+    "ingesta_lote_lecturas",
+    "Lecturas por transacción escrita",
+    ("origen",),
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000),
+)
@@ -0,0 +1,130 @@
+# ~/Project/backend/src/Services/particiones_telemetria.py
+import re
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Index, text
+from sqlalchemy.schema import CreateTable, CreateIndex
+from Project import db
+from Project.models import Lectura
+
+"""
+Particionado mensual del historial de telemetría (TELEMETRIA_ESQUEMA = "particionado").
+
+Cada mes va a su propia tabla lecturas_AAAAMM, con las columnas de Lectura y su índice
+único (collar_id, timestamp). Así:
+
+  - La ingesta escribe en la partición del mes de cada lectura (se crea sola la primera vez).
+  - Una consulta por rango solo lee las particiones de los meses que abarca; el resto ni se
+    abre, por grande que sea el historial.
+  - Un mes viejo se archiva a su propio archivo .sqlite o se elimina con un DROP TABLE, sin
+    DELETE fila por fila ni mantenimiento de índices (database/scripts/telemetry_partitions.py).
+
+(No confundir con Comun/particiones.py, que reparte los topics MQTT entre gateways.)
+
+Las particiones son tablas de la misma base y no archivos adjuntos: SQLite no permite
+ATTACH dentro de una transacción y admite 10 bases adjuntas por conexión, así que la
+ingesta no podría escribir varios meses en una misma transacción.
+"""
+
+PREFIJO = "lecturas_"
+PATRON_PARTICION = re.compile(r"^lecturas_(\d{4})(\d{2})$")
+
+# Las particiones no están en db.metadata: create_all no las crea ni las conoce
+_metadata = MetaData()
+# DDL ya compilado de cada partición (CREATE TABLE / INDEX IF NOT EXISTS)
+_ddl = {}
+
+
+def nombre_particion(anio, mes):
+    return f"{PREFIJO}{anio:04d}{mes:02d}"
+
+
+def mes_de(timestamp):
+    return timestamp.year, timestamp.month
+
+
+def limites_mes(anio, mes):
+    """[inicio, fin) del mes."""
+    fin = datetime(anio + 1, 1, 1) if mes == 12 else datetime(anio, mes + 1, 1)
+    return datetime(anio, mes, 1), fin
+
+
+def tabla_particion(anio, mes):
+    """Table de SQLAlchemy de la partición del mes (no la crea en la base)."""
+    nombre = nombre_particion(anio, mes)
+    tabla = _metadata.tables.get(nombre)
+    if tabla is None:
+        tabla = Table(
+            nombre,
+            _metadata,
+            # Mismas columnas que Lectura, sin la clave foránea
+            *[
+                Column(columna.name, columna.type, primary_key=columna.primary_key, nullable=columna.nullable)
+                for columna in Lectura.__table__.columns
+            ],
+            Index(f"uq_{nombre}_collar_timestamp", "collar_id", "timestamp", unique=True),
+        )
+    return tabla
+
+
+def asegurar_particion(anio, mes, session=None):
+    """
+    Crea la partición del mes si no existe, dentro de la transacción en curso.
+    Con IF NOT EXISTS, si ya existe SQLite lo resuelve con el esquema en memoria, así que
+    se puede llamar en cada lote sin costo apreciable.
+    """
+    tabla = tabla_particion(anio, mes)
+    conexion = (session or db.session).connection()
+    sentencias = _ddl.get(tabla.name)
+    if sentencias is None:
+        sentencias = _ddl[tabla.name] = [
+            str(ddl.compile(dialect=conexion.dialect))
+            for ddl in (
+                CreateTable(tabla, if_not_exists=True),
+                *[CreateIndex(indice, if_not_exists=True) for indice in tabla.indexes],
+            )
+        ]
+    for sentencia in sentencias:
+        conexion.exec_driver_sql(sentencia)
+    return tabla
+
+
+def particiones(session=None):
+    """Meses con partición en la base, ordenados: lista de (anio, mes)."""
+    nombres = (session or db.session).execute(
+        text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'lecturas\\_%' ESCAPE '\\'")
+    ).scalars()
+    meses = []
+    for nombre in nombres:
+        coincidencia = PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            meses.append((int(coincidencia.group(1)), int(coincidencia.group(2))))
+    return sorted(meses)
+
+
+def particiones_en_rango(inicio=None, fin=None, session=None):
+    """Poda: solo los meses existentes que se superponen con [inicio, fin] (None = sin límite)."""
+    elegidas = []
+    for anio, mes in particiones(session):
+        desde_mes, hasta_mes = limites_mes(anio, mes)
+        if inicio is not None and inicio >= hasta_mes:
+            continue
+        if fin is not None and fin < desde_mes:
+            continue
+        elegidas.append((anio, mes))
+    return elegidas
+
+
+def insertar_particionado(filas, session=None):
+    """
+    Inserta filas con el formato de Lectura (collar_id, timestamp y las columnas de datos) en la
+    partición de su mes, con OR IGNORE como el resto de la ingesta. No hace commit.
+    """
+    por_mes = {}
+    for fila in filas:
+        por_mes.setdefault(mes_de(fila["timestamp"]), []).append(fila)
+
+    session = session or db.session
+    for (anio, mes), filas_mes in por_mes.items():
+        tabla = asegurar_particion(anio, mes, session)
+        session.execute(tabla.insert().prefix_with("OR IGNORE"), filas_mes)
+    return len(por_mes)
@@ -0,0 +1,103 @@
+# ~/Project/backend/src/Services/procesador_ingesta.py
+from Project import db
+from Project.backend.src.Services.ingesta import guardar_lecturas
+from Project.backend.src.Services.cache_nodos import cache_nodos
+from Project.backend.src.Services.idempotencia import filtro_duplicados
+from Project.backend.src.Services.metricas import (
+    INGESTA_MENSAJES,
+    INGESTA_RECHAZOS,
+    INGESTA_GUARDADAS,
+    INGESTA_LOTE_TAMANIO,
+)
+
+"""
+Flujo completo de la ingesta de lecturas ya parseadas, independiente de HTTP:
+nodo autorizado -> collar -> asignación activa -> duplicados -> inserción y UbicacionActual.
+
+Lo usan POST /api/datos, POST /api/datos/batch, el buffer de escritura diferida y el modo
+"directo" del gateway MQTT (que escribe en la base sin pasar por la API), así todos los
+caminos aplican las mismas reglas.
+
+Las funciones reciben opcionalmente un Cronometro (Services/metricas.py) para medir las
+etapas; 'prefijo' distingue las etapas de cada camino (por ejemplo "lote_").
+"""
+
+
+def resultado_error(codigo, motivo, mensaje):
+    INGESTA_RECHAZOS.inc(str(codigo), motivo)
+    return {"status": "error", "code": codigo, "message": mensaje}
+
+
+def resolver_lecturas(entradas, vistas=None, crono=None, prefijo=""):
+    """
+    Autoriza y resuelve una lista de (client_id, lectura).
+    Devuelve (resultados, lecturas): un resultado por entrada, en el mismo orden, con
+    status "ok", "duplicada" o "error" (con code y message), y las lecturas a guardar ya
+    completadas con collar_id y animal_id.
+    'vistas' es el set de claves del mismo lote para descartar duplicados internos.
+    """
+    # Nodo y asignación activa se resuelven juntos (y casi siempre desde la cache)
+    nodos = cache_nodos.resolver({client_id for client_id, _ in entradas})
+    if crono:
+        crono.marcar(prefijo + "nodo")
+
+    resultados = []
+    lecturas = []
+    for client_id, lectura in entradas:
+        nodo = nodos[client_id]
+        if not nodo:
+            resultados.append(resultado_error(403, "nodo_no_autorizado", "Nodo no autorizado"))
+            continue
+
+        collar_id, animal_id = nodo
+        if not collar_id:
+            resultados.append(resultado_error(404, "collar_no_asociado", "Collar no asociado al nodo"))
+            continue
+
+        # Solo se cuentan nodos autorizados: el client_id viene del cliente y cada valor
+        # distinto sería una serie nueva de la métrica
+        INGESTA_MENSAJES.inc(client_id)
+
+        lectura["collar_id"] = collar_id
+        lectura["animal_id"] = animal_id
+
+        # Reenvío de una lectura ya guardada: se confirma sin volver a escribirla
+        if filtro_duplicados.es_duplicada(lectura, vistas):
+            resultados.append({"status": "duplicada"})
+            continue
+
+        lecturas.append(lectura)
+        resultados.append({"status": "ok"})
+
+    if crono:
+        crono.marcar(prefijo + "validacion")
+    return resultados, lecturas
+
+
+def confirmar_lecturas(lecturas, origen, crono=None, prefijo=""):
+    """
+    Guarda lecturas ya resueltas en una sola transacción y hace commit.
+    Si falla hace rollback y relanza la excepción.
+    """
+    try:
+        guardar_lecturas(lecturas)
+        if crono:
+            crono.marcar(prefijo + "insercion")
+        db.session.commit()
+        if crono:
+            crono.marcar(prefijo + "commit")
+    except Exception:
+        db.session.rollback()
+        raise
+
+    filtro_duplicados.registrar(lecturas)
+    INGESTA_GUARDADAS.inc(origen, valor=len(lecturas))
+    INGESTA_LOTE_TAMANIO.observar(len(lecturas), origen)
+
+
+def procesar_lecturas(entradas, origen, crono=None, prefijo=""):
+    """Resuelve y guarda un lote de (client_id, lectura). Devuelve (resultados, lecturas guardadas)."""
+    resultados, lecturas = resolver_lecturas(entradas, set(), crono, prefijo)
+    if lecturas:
+        confirmar_lecturas(lecturas, origen, crono, prefijo)
+    return resultados, lecturas
@@ -0,0 +1,164 @@
+# ~/Project/backend/src/Services/telemetria.py
+from flask import current_app
+from sqlalchemy import and_, or_
+from Project import db
+from Project.models import Lectura, Ubicacion, Temperatura, Acelerometro
+from Project.backend.src.Services.particiones_telemetria import particiones_en_rango, tabla_particion, limites_mes
+
+"""
+Acceso al historial de telemetría independiente del esquema (Config.TELEMETRIA_ESQUEMA):
+
+  - "separado": ubicaciones, temperaturas y aceleraciones, una fila por sensor y mensaje,
+    cada tabla con su índice (collar_id, timestamp).
+  - "unificado": lecturas, una fila por mensaje con todos los sensores y un solo índice.
+    Escribir un mensaje es un INSERT y una actualización de índice en vez de tres, y el
+    historial de un collar es un solo recorrido por rango del índice.
+  - "ambos": la ingesta escribe en los dos (para migrar con la ingesta andando, ver
+    database/scripts/migrate_telemetry.py) y las consultas ya leen de lecturas.
+  - "particionado": como lecturas, pero una tabla por mes (lecturas_AAAAMM, ver
+    Services/particiones_telemetria.py). Las consultas solo leen los meses del rango pedido.
+
+Las consultas de historial devuelven siempre el formato unificado (columnas de Lectura),
+así los endpoints no dependen del esquema activo.
+"""
+
+ESQUEMAS = ("separado", "unificado", "ambos", "particionado")
+
+# Columnas de cada tabla separada -> columna equivalente de lecturas
+COLUMNAS_SEPARADAS = (
+    (Ubicacion, {"lat": "lat", "lon": "lon"}),
+    (Temperatura, {"corporal": "temperatura_corporal", "ambiente": "temperatura_ambiente"}),
+    (Acelerometro, {"x": "acel_x", "y": "acel_y", "z": "acel_z"}),
+)
+
+COLUMNAS_LECTURA = (
+    "lat", "lon", "temperatura_corporal", "temperatura_ambiente", "acel_x", "acel_y", "acel_z",
+)
+
+
+def esquema_telemetria():
+    esquema = current_app.config.get("TELEMETRIA_ESQUEMA", "separado")
+    if esquema not in ESQUEMAS:
+        raise ValueError(f"TELEMETRIA_ESQUEMA inválido: {esquema!r} (opciones: {', '.join(ESQUEMAS)})")
+    return esquema
+
+
+def _recortar_tramos(tramos, desde, hasta):
+    """Rangos (collar_id, inicio, fin) recortados a [desde, hasta]; descarta los vacíos."""
+    recortados = []
+    for collar_id, inicio, fin in tramos:
+        inicio = max(filter(None, (inicio, desde)), default=None)
+        fin = min(filter(None, (fin, hasta)), default=None)
+        if inicio and fin and inicio > fin:
+            continue
+        recortados.append((collar_id, inicio, fin))
+    return recortados
+
+
+def _filtro_tramos(columnas, tramos):
+    """OR de los rangos (collar_id, [inicio, fin]) ya recortados."""
+    condiciones = []
+    for collar_id, inicio, fin in tramos:
+        condicion = [columnas.collar_id == collar_id]
+        if inicio:
+            condicion.append(columnas.timestamp >= inicio)
+        if fin:
+            condicion.append(columnas.timestamp <= fin)
+        condiciones.append(and_(*condicion))
+    return or_(*condiciones) if condiciones else None
+
+
+def _orden(columnas, recientes):
+    if recientes:
+        return columnas.timestamp.desc(), columnas.collar_id.desc()
+    return columnas.timestamp, columnas.collar_id
+
+
+def _consultar_unificada(columnas, tramos, limite, recientes=False):
+    filtro = _filtro_tramos(columnas, tramos)
+    if filtro is None:
+        return []
+    consulta = (
+        db.session.query(columnas.collar_id, columnas.timestamp, *[getattr(columnas, c) for c in COLUMNAS_LECTURA])
+        .filter(filtro)
+        .order_by(*_orden(columnas, recientes))
+    )
+    if limite:
+        consulta = consulta.limit(limite)
+    return [fila._asdict() for fila in consulta]
+
+
+def _consultar_particiones(tramos, limite, recientes=False):
+    """
+    Recorre en orden (del último mes hacia atrás si 'recientes') solo las particiones que
+    se superponen con algún tramo, y en cada una filtra por los tramos de ese mes. Con
+    límite corta apenas lo completa.
+    """
+    inicios = [inicio for _, inicio, _ in tramos]
+    fines = [fin for _, _, fin in tramos]
+    inicio = None if None in inicios else min(inicios)
+    fin = None if None in fines else max(fines)
+
+    meses = particiones_en_rango(inicio, fin)
+    if recientes:
+        meses = list(meses)[::-1]
+
+    lecturas = []
+    for anio, mes in meses:
+        desde_mes, hasta_mes = limites_mes(anio, mes)
+        tramos_mes = [
+            tramo for tramo in tramos
+            if (tramo[1] is None or tramo[1] < hasta_mes) and (tramo[2] is None or tramo[2] >= desde_mes)
+        ]
+        restantes = limite - len(lecturas) if limite else None
+        lecturas.extend(_consultar_unificada(tabla_particion(anio, mes).c, tramos_mes, restantes, recientes))
+        if limite and len(lecturas) >= limite:
+            break
+    return lecturas
+
+
+def historial(tramos, desde=None, hasta=None, limite=None, recientes=False):
+    """
+    Lecturas ordenadas por timestamp de uno o varios collares.
+    tramos: lista de (collar_id, inicio, fin), por ejemplo las asignaciones de un animal
+    (inicio o fin None = sin límite). desde/hasta recortan todos los tramos.
+    Devuelve dicts con collar_id, timestamp y las columnas de Lectura (None si el sensor
+    no vino en ese mensaje). Como mucho 'limite' lecturas: las más antiguas del rango, o
+    las más recientes con recientes=True (siempre en orden cronológico).
+    """
+    tramos = _recortar_tramos(tramos, desde, hasta)
+    if not tramos:
+        return []
+
+    esquema = esquema_telemetria()
+    if esquema == "particionado":
+        lecturas = _consultar_particiones(tramos, limite, recientes)
+        return lecturas[::-1] if recientes else lecturas
+    if esquema != "separado":
+        lecturas = _consultar_unificada(Lectura.__table__.c, tramos, limite, recientes)
+        return lecturas[::-1] if recientes else lecturas
+
+    # Esquema separado: una consulta por tabla y se combinan por (collar_id, timestamp).
+    # Con límite alcanza con las primeras (o últimas) 'limite' filas de cada tabla.
+    combinadas = {}
+    for modelo, columnas in COLUMNAS_SEPARADAS:
+        filtro = _filtro_tramos(modelo, tramos)
+        consulta = (
+            db.session.query(modelo.collar_id, modelo.timestamp, *[getattr(modelo, c) for c in columnas])
+            .filter(filtro)
+            .order_by(*_orden(modelo, recientes))
+        )
+        if limite:
+            consulta = consulta.limit(limite)
+        for collar_id, timestamp, *valores in consulta:
+            lectura = combinadas.get((collar_id, timestamp))
+            if lectura is None:
+                lectura = combinadas[(collar_id, timestamp)] = dict.fromkeys(COLUMNAS_LECTURA)
+                lectura["collar_id"] = collar_id
+                lectura["timestamp"] = timestamp
+            lectura.update(zip(columnas.values(), valores))
+
+    lecturas = sorted(combinadas.values(), key=lambda l: (l["timestamp"], l["collar_id"]))
+    if not limite:
+        return lecturas
+    return lecturas[-limite:] if recientes else lecturas[:limite]
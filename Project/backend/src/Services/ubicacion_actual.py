@@ -0,0 +1,113 @@
+# ~/Project/backend/src/Services/ubicacion_actual.py
+from sqlalchemy import select, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from Project import db
+from Project.models import (
+    UbicacionActual,
+    Temperatura,
+    TemperaturaActual,
+    Acelerometro,
+    AceleracionActual,
+)
+
+"""
+Mantenimiento de los valores actuales: la última posición conocida de cada animal
+(ubicacion_actual) y la última temperatura y aceleración de cada collar
+(temperatura_actual, aceleracion_actual). Usa el UPSERT de SQLite:
+
+    INSERT INTO ubicacion_actual (animal_id, timestamp, lat, lon) VALUES (...)
+    ON CONFLICT(animal_id) DO UPDATE SET ...
+    WHERE excluded.timestamp > ubicacion_actual.timestamp
+
+de modo que muchos valores se actualizan con una sola sentencia preparada (executemany)
+y un mensaje que llega tarde nunca hace retroceder el valor actual.
+
+Los listados leen estas tablas en lugar de buscar el máximo por collar en el historial,
+así su costo no crece con la cantidad de lecturas guardadas.
+"""
+
+
+def _sentencia_upsert(tabla, clave, columnas):
+    stmt = sqlite_insert(tabla)
+    return stmt.on_conflict_do_update(
+        index_elements=[tabla.c[clave]],
+        set_={columna: stmt.excluded[columna] for columna in columnas},
+        where=(tabla.c.timestamp.is_(None)) | (stmt.excluded.timestamp > tabla.c.timestamp),
+    )
+
+
+def _upsert_ultimos(modelo, clave, columnas, filas, session=None):
+    """Upsert de la fila más reciente por 'clave'; 'columnas' incluye timestamp."""
+    ultimas = {}
+    for fila in filas:
+        valor_clave = fila[clave]
+        previa = ultimas.get(valor_clave)
+        if previa is None or fila["timestamp"] >= previa["timestamp"]:
+            ultimas[valor_clave] = {clave: valor_clave, **{columna: fila.get(columna) for columna in columnas}}
+
+    if ultimas:
+        (session or db.session).execute(
+            _sentencia_upsert(modelo.__table__, clave, columnas), list(ultimas.values())
+        )
+    return len(ultimas)
+
+
+def upsert_ubicaciones_actuales(posiciones, session=None):
+    """
+    Actualiza la ubicación actual de varios animales a la vez.
+    posiciones: iterable de dicts con animal_id, timestamp, lat y lon.
+    Si un mismo animal aparece varias veces se conserva la posición más reciente.
+    No hace commit. Devuelve la cantidad de animales enviados al upsert.
+    """
+    return _upsert_ultimos(UbicacionActual, "animal_id", ("timestamp", "lat", "lon"), posiciones, session)
+
+
+def upsert_temperaturas_actuales(temperaturas, session=None):
+    """Como upsert_ubicaciones_actuales, por collar: dicts con collar_id, timestamp, corporal y ambiente."""
+    return _upsert_ultimos(TemperaturaActual, "collar_id", ("timestamp", "corporal", "ambiente"), temperaturas, session)
+
+
+def upsert_aceleraciones_actuales(aceleraciones, session=None):
+    """Como upsert_ubicaciones_actuales, por collar: dicts con collar_id, timestamp, x, y y z."""
+    return _upsert_ultimos(AceleracionActual, "collar_id", ("timestamp", "x", "y", "z"), aceleraciones, session)
+
+
+# Historial -> tabla de valores actuales, para reconstruirla
+TABLAS_ACTUALES = (
+    (Temperatura, TemperaturaActual, ("timestamp", "corporal", "ambiente")),
+    (Acelerometro, AceleracionActual, ("timestamp", "x", "y", "z")),
+)
+
+
+def reconstruir_valores_actuales(session=None):
+    """
+    Recalcula temperatura_actual y aceleracion_actual desde el historial (la lectura más
+    reciente de cada collar), con un INSERT ... SELECT por tabla. No hace commit.
+    """
+    session = session or db.session
+    for historial, actual, columnas in TABLAS_ACTUALES:
+        ultimos = (
+            select(historial.collar_id, func.max(historial.timestamp).label("max_ts"))
+            .group_by(historial.collar_id)
+            .subquery()
+        )
+        filas = select(historial.collar_id, *[getattr(historial, columna) for columna in columnas]).join(
+            ultimos,
+            (historial.collar_id == ultimos.c.collar_id) & (historial.timestamp == ultimos.c.max_ts),
+        )
+        session.execute(
+            actual.__table__.insert().prefix_with("OR REPLACE").from_select(["collar_id", *columnas], filas)
+        )
+
+
+def asegurar_valores_actuales():
+    """
+    Bases creadas antes de temperatura_actual y aceleracion_actual: si están vacías y hay
+    historial, las completa una vez. Se llama al iniciar la aplicación.
+    """
+    vacias = all(db.session.query(actual.id).first() is None for _, actual, _ in TABLAS_ACTUALES)
+    con_historial = any(db.session.query(historial.id).first() is not None for historial, _, _ in TABLAS_ACTUALES)
+    if vacias and con_historial:
+        print("INFO: completando temperatura_actual y aceleracion_actual desde el historial...")
+        reconstruir_valores_actuales()
+        db.session.commit()
@@ -17,4 +17,41 @@ class Config:
 
     SESSION_COOKIE_SAMESITE = "Lax"
     SESSION_COOKIE_SECURE = False  # True si usás HTTPS
-    SESSION_COOKIE_DOMAIN = "127.0.0.1"
\ No newline at end of file
+    SESSION_COOKIE_DOMAIN = "127.0.0.1"
+
+    # Ingesta de telemetría
+    INGESTA_LOTE_MAX = 5000  # Máximo de lecturas aceptadas por POST /api/datos/batch
+
+    # Modo de escritura de /api/datos:
+    #   "sincrono": cada petición escribe y hace commit de su lectura
+    #   "buffer": la lectura se encola, se responde 202 y un hilo escribe por lotes
+    INGESTA_MODO = "sincrono"
+    INGESTA_BUFFER_MAX_FILAS = 500      # Lecturas por transacción como máximo
+    INGESTA_BUFFER_INTERVALO_MS = 200   # Espera máxima antes de escribir un lote incompleto
+    INGESTA_BUFFER_MAX_COLA = 20000     # Lecturas en memoria antes de responder 503
+    # Lecturas del buffer que no se pudieron guardar ni reintentándolas de a una (JSONL)
+    INGESTA_BUFFER_DEAD_LETTER = os.path.join(ROOT_DIR, 'database', 'ingesta_dead_letter.jsonl')
+
+    # Dónde se guarda el historial de telemetría:
+    #   "separado": ubicaciones, temperaturas y aceleraciones (una fila por sensor)
+    #   "unificado": lecturas (una fila por mensaje, un solo índice)
+    #   "ambos": escribe en los dos, para migrar sin cortar la ingesta
+    #   "particionado": como lecturas, pero una tabla por mes (lecturas_AAAAMM)
+    # Las consultas de historial leen de lecturas (o de las particiones) salvo en "separado".
+    TELEMETRIA_ESQUEMA = "separado"
+    # Dónde se guardan los meses archivados (database/scripts/telemetry_partitions.py)
+    TELEMETRIA_ARCHIVO_DIR = os.path.join(ROOT_DIR, 'database', 'archivo')
+
+    # Claves (collar_id, timestamp) recientes que se recuerdan para descartar reenvíos
+    INGESTA_DEDUP_CAPACIDAD = 200000
+
+    # Límite de tasa de la ingesta (token bucket), en lecturas por segundo. 0 = sin límite.
+    # La ráfaga es cuántas lecturas se aceptan de golpe; si es 0 se usa la tasa.
+    # Desactivado por defecto: al activarlo, los nodos que lo superen reciben 429. Valores
+    # de referencia: 5 por client_id con ráfaga 600 (un collar normal envía 1 cada pocos
+    # segundos y la ráfaga permite vaciar el atraso de un gateway de a lotes), y 5000
+    # globales con ráfaga 10000.
+    INGESTA_LIMITE_CLIENTE_TASA = 0        # Por client_id
+    INGESTA_LIMITE_CLIENTE_RAFAGA = 0
+    INGESTA_LIMITE_GLOBAL_TASA = 0         # Todas las lecturas del proceso
+    INGESTA_LIMITE_GLOBAL_RAFAGA = 0
@@ -191,8 +191,9 @@ class NodoAutorizado(db.Model):
 class Ubicacion(db.Model):
     __tablename__ = 'ubicaciones'
 
+    # Único: una lectura reenviada (mismo collar y timestamp) no genera otra fila
     __table_args__ = (
-        db.Index('idx_collar_timestamp', 'collar_id', 'timestamp'),
+        db.Index('uq_ubicacion_collar_timestamp', 'collar_id', 'timestamp', unique=True),
     )
 
     id = Column(Integer, primary_key=True)
@@ -214,6 +215,11 @@ class UbicacionActual(db.Model):
 
 class Temperatura(db.Model):
     __tablename__ = 'temperaturas'
+
+    __table_args__ = (
+        db.Index('uq_temperatura_collar_timestamp', 'collar_id', 'timestamp', unique=True),
+    )
+
     id = Column(Integer, primary_key=True)
     timestamp = Column(DateTime)
     corporal = Column(Float)
@@ -222,8 +228,24 @@ class Temperatura(db.Model):
     collar_id = Column(Integer, ForeignKey('collares.id'))
     collar = relationship("Collar", backref="temperaturas")
 
+class TemperaturaActual(db.Model):
+    """Última temperatura de cada collar, mantenida en la ingesta como UbicacionActual."""
+    __tablename__ = 'temperatura_actual'
+    id = Column(Integer, primary_key=True)
+    collar_id = Column(Integer, ForeignKey('collares.id'), unique=True)
+    timestamp = Column(DateTime)
+    corporal = Column(Float)
+    ambiente = Column(Float)
+
+    collar = relationship("Collar", backref="temperatura_actual", uselist=False)
+
 class Acelerometro(db.Model):
     __tablename__ = 'aceleraciones'
+
+    __table_args__ = (
+        db.Index('uq_aceleracion_collar_timestamp', 'collar_id', 'timestamp', unique=True),
+    )
+
     id = Column(Integer, primary_key=True)
     timestamp = Column(DateTime)
     x = Column(Float)
@@ -233,6 +255,42 @@ class Acelerometro(db.Model):
     collar_id = Column(Integer, ForeignKey('collares.id'))
     collar = relationship("Collar", backref="aceleraciones")
 
+class AceleracionActual(db.Model):
+    """Última lectura del acelerómetro de cada collar, mantenida en la ingesta."""
+    __tablename__ = 'aceleracion_actual'
+    id = Column(Integer, primary_key=True)
+    collar_id = Column(Integer, ForeignKey('collares.id'), unique=True)
+    timestamp = Column(DateTime)
+    x = Column(Float)
+    y = Column(Float)
+    z = Column(Float)
+
+    collar = relationship("Collar", backref="aceleracion_actual", uselist=False)
+
+class Lectura(db.Model):
+    """
+    Esquema unificado de telemetría: una fila por mensaje del collar con todos los sensores
+    (los que no vinieron quedan en NULL). Reemplaza a ubicaciones, temperaturas y
+    aceleraciones cuando TELEMETRIA_ESQUEMA es "unificado" (ver Services/telemetria.py).
+    """
+    __tablename__ = 'lecturas'
+
+    # Un solo índice: idempotencia y lecturas por rango de un collar
+    __table_args__ = (
+        db.Index('uq_lectura_collar_timestamp', 'collar_id', 'timestamp', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    collar_id = Column(Integer, ForeignKey('collares.id'), nullable=False)
+    timestamp = Column(DateTime, nullable=False)
+    lat = Column(Float)
+    lon = Column(Float)
+    temperatura_corporal = Column(Float)
+    temperatura_ambiente = Column(Float)
+    acel_x = Column(Float)
+    acel_y = Column(Float)
+    acel_z = Column(Float)
+
 class Parcela(db.Model):
     __tablename__ = 'parcelas'
     id = Column(Integer, primary_key=True)
@@ -0,0 +1,313 @@
+from Project import db
+from Project.models import (
+    Lectura,
+    Collar,
+    NodoAutorizado,
+    AsignacionCollar,
+    Ubicacion,
+    Temperatura,
+    Acelerometro,
+)
+from Project.backend.src.Services.ingesta import parsear_lectura
+from Project.backend.src.Services.ubicacion_actual import (
+    upsert_ubicaciones_actuales,
+    upsert_temperaturas_actuales,
+    upsert_aceleraciones_actuales,
+)
+from Project.backend.src.Services.telemetria import esquema_telemetria, COLUMNAS_LECTURA
+from Project.backend.src.Services.particiones_telemetria import insertar_particionado
+from itertools import islice
+import csv
+import gzip
+import json
+import os
+import time
+
+"""
+Importación masiva de historial de telemetría desde archivos exportados (CSV o JSONL,
+opcionalmente .gz), sin pasar por /api/datos.
+
+Cada línea es una lectura con el mismo formato que publica el collar más la columna del
+collar, que puede traer el código del collar o el client_id del nodo:
+
+    JSONL: {"collar": "COL-001", "timestamp": "2025-03-01T10:00:00", "lat": -35.5, "lon": -60.3,
+            "temperatura": 38.6, "temperatura_ambiente": 21.0, "acelerometro": {"x": 0.1, "y": 0.0, "z": 9.8}}
+    CSV:   collar,timestamp,lat,lon,temperatura,temperatura_ambiente,x,y,z
+
+  - Los códigos se resuelven a collar_id (y animal asignado) una sola vez, con un mapa
+    armado en dos consultas al empezar.
+  - Las lecturas se insertan por bloques (--bloque lecturas por transacción) con inserciones
+    masivas e INSERT OR IGNORE: reimportar un archivo o un tramo no duplica filas.
+  - A diferencia de la ingesta en vivo, la temperatura se guarda aunque la lectura no traiga
+    posición o el collar no tenga animal: es historial del collar.
+  - Se escribe en el esquema de telemetría configurado (TELEMETRIA_ESQUEMA): tablas
+    separadas, lecturas, ambos o particiones mensuales.
+  - UbicacionActual, TemperaturaActual y AceleracionActual se actualizan con los mismos
+    upserts de la ingesta, que nunca retroceden.
+  - Después de cada bloque confirmado se escribe un checkpoint (<archivo>.checkpoint.json)
+    con las líneas procesadas; si la importación se corta, al volver a correrla retoma desde
+    ahí. Un archivo completo queda marcado y se saltea.
+
+    python -m database.scripts.insert.historical_telemetry export_marzo.csv.gz export_abril.jsonl
+"""
+
+TAMANIO_BLOQUE = 50000
+MAX_ERRORES_MOSTRADOS = 10
+
+
+def mapa_collares():
+    """{código de collar o client_id del nodo: (collar_id, animal_id asignado o None)}."""
+    filas = (
+        db.session.query(Collar.codigo, Collar.id, AsignacionCollar.animal_id)
+        .outerjoin(
+            AsignacionCollar,
+            (AsignacionCollar.collar_id == Collar.id) & (AsignacionCollar.fecha_fin.is_(None)),
+        )
+        .all()
+    )
+    mapa = {codigo: (collar_id, animal_id) for codigo, collar_id, animal_id in filas}
+    por_collar = {collar_id: animal_id for _, collar_id, animal_id in filas}
+    for client_id, collar_id in db.session.query(NodoAutorizado.client_id, NodoAutorizado.collar_id):
+        mapa.setdefault(client_id, (collar_id, por_collar.get(collar_id)))
+    return mapa
+
+
+def _abrir(ruta):
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, "rt", encoding="utf-8", newline="")
+    return open(ruta, encoding="utf-8", newline="")
+
+
+def _formato(ruta):
+    nombre = ruta[:-3] if ruta.endswith(".gz") else ruta
+    return "csv" if nombre.lower().endswith(".csv") else "jsonl"
+
+
+def _celda(valor):
+    # Una celda vacía es un campo que no vino; los números los convierte y valida
+    # parsear_lectura, así una celda inválida descarta solo su línea
+    return valor if valor not in (None, "") else None
+
+
+def _desde_csv(fila):
+    """Convierte una fila CSV (todo texto, aplanada) al formato de lectura del collar."""
+    lectura = {
+        "timestamp": fila.get("timestamp"),
+        "lat": _celda(fila.get("lat")),
+        "lon": _celda(fila.get("lon")),
+        "temperatura": _celda(fila.get("temperatura")),
+        "temperatura_ambiente": _celda(fila.get("temperatura_ambiente")),
+    }
+    if any(fila.get(eje) not in (None, "") for eje in ("x", "y", "z")):
+        lectura["acelerometro"] = {eje: _celda(fila.get(eje)) for eje in ("x", "y", "z")}
+    return lectura
+
+
+def _lineas(archivo, formato, columna_collar):
+    """Genera (código de collar, dict crudo de la lectura) por línea; None si la línea no se puede leer."""
+    if formato == "csv":
+        for fila in csv.DictReader(archivo):
+            yield fila.get(columna_collar), _desde_csv(fila)
+    else:
+        for linea in archivo:
+            if not linea.strip():
+                yield None, None
+                continue
+            try:
+                dato = json.loads(linea)
+            except ValueError:
+                yield None, None
+                continue
+            yield (dato.get(columna_collar) if isinstance(dato, dict) else None), dato
+
+
+def _guardar_bloque(lecturas, esquema):
+    ubicaciones, temperaturas, aceleraciones, posiciones, unificadas = [], [], [], [], []
+    for collar_id, animal_id, lectura in lecturas:
+        timestamp = lectura["timestamp"]
+        acelerometro = lectura["acelerometro"] or {}
+        unificada = {
+            "collar_id": collar_id,
+            "timestamp": timestamp,
+            **dict.fromkeys(COLUMNAS_LECTURA),
+            "lat": lectura["lat"] if lectura["lon"] is not None else None,
+            "lon": lectura["lon"] if lectura["lat"] is not None else None,
+            "temperatura_corporal": lectura["temperatura"],
+            "temperatura_ambiente": lectura["temperatura_ambiente"] if lectura["temperatura"] is not None else None,
+            "acel_x": acelerometro.get("x"),
+            "acel_y": acelerometro.get("y"),
+            "acel_z": acelerometro.get("z"),
+        }
+        if any(unificada[columna] is not None for columna in COLUMNAS_LECTURA):
+            unificadas.append(unificada)
+        if lectura["lat"] is not None and lectura["lon"] is not None:
+            ubicaciones.append({"timestamp": timestamp, "lat": lectura["lat"], "lon": lectura["lon"], "collar_id": collar_id})
+            if animal_id:
+                posiciones.append({"animal_id": animal_id, "timestamp": timestamp, "lat": lectura["lat"], "lon": lectura["lon"]})
+        if lectura["temperatura"] is not None:
+            temperaturas.append({
+                "timestamp": timestamp,
+                "corporal": lectura["temperatura"],
+                "ambiente": lectura["temperatura_ambiente"],
+                "collar_id": collar_id,
+            })
+        if acelerometro:
+            aceleraciones.append({
+                "timestamp": timestamp,
+                "x": acelerometro.get("x"),
+                "y": acelerometro.get("y"),
+                "z": acelerometro.get("z"),
+                "collar_id": collar_id,
+            })
+
+    destinos = []
+    if esquema in ("separado", "ambos"):
+        destinos += [(Ubicacion, ubicaciones), (Temperatura, temperaturas), (Acelerometro, aceleraciones)]
+    if esquema in ("unificado", "ambos"):
+        destinos.append((Lectura, unificadas))
+    if esquema == "particionado" and unificadas:
+        insertar_particionado(unificadas)
+    for modelo, filas in destinos:
+        if filas:
+            db.session.execute(modelo.__table__.insert().prefix_with("OR IGNORE"), filas)
+    if posiciones:
+        upsert_ubicaciones_actuales(posiciones)
+    if temperaturas:
+        upsert_temperaturas_actuales(temperaturas)
+    if aceleraciones:
+        upsert_aceleraciones_actuales(aceleraciones)
+    return len(ubicaciones), len(temperaturas), len(aceleraciones)
+
+
+class Checkpoint:
+    """Líneas ya confirmadas de un archivo, guardadas junto a él. Se invalida si el archivo cambia de tamaño."""
+
+    def __init__(self, ruta_archivo):
+        self.ruta = ruta_archivo + ".checkpoint.json"
+        self.tamanio = os.path.getsize(ruta_archivo)
+        self.lineas = 0
+        self.completo = False
+
+    def cargar(self):
+        if not os.path.exists(self.ruta):
+            return
+        with open(self.ruta, encoding="utf-8") as f:
+            datos = json.load(f)
+        if datos.get("tamanio") != self.tamanio:
+            print(f"INFO: {self.ruta} corresponde a otra versión del archivo; se importa desde el principio")
+            return
+        self.lineas = datos.get("lineas", 0)
+        self.completo = datos.get("completo", False)
+
+    def guardar(self):
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"tamanio": self.tamanio, "lineas": self.lineas, "completo": self.completo}, f)
+        os.replace(temporal, self.ruta)
+
+
+def importar_archivo(ruta, mapa, tamanio_bloque=TAMANIO_BLOQUE, columna_collar="collar", reiniciar=False):
+    """
+    Importa un archivo de telemetría. Devuelve un dict con las líneas leídas, las filas
+    enviadas a cada tabla (las repetidas las descarta OR IGNORE) y las lecturas descartadas
+    (inválidas o de collares desconocidos).
+    """
+    checkpoint = Checkpoint(ruta)
+    if not reiniciar:
+        checkpoint.cargar()
+    resumen = {"lineas": 0, "ubicaciones": 0, "temperaturas": 0, "aceleraciones": 0, "invalidas": 0, "desconocidas": 0}
+    if checkpoint.completo:
+        print(f"INFO: {ruta} ya fue importado (borrar {checkpoint.ruta} o usar --reiniciar para repetirlo)")
+        return resumen
+    if checkpoint.lineas:
+        print(f"INFO: retomando {ruta} desde la línea {checkpoint.lineas}")
+
+    esquema = esquema_telemetria()
+    desconocidos = set()
+    errores_mostrados = 0
+    inicio = time.perf_counter()
+    bloque = []
+
+    def confirmar():
+        ub, temp, acel = _guardar_bloque(bloque, esquema)
+        db.session.commit()
+        checkpoint.guardar()
+        resumen["ubicaciones"] += ub
+        resumen["temperaturas"] += temp
+        resumen["aceleraciones"] += acel
+        bloque.clear()
+
+    with _abrir(ruta) as archivo:
+        for codigo, dato in islice(_lineas(archivo, _formato(ruta), columna_collar), checkpoint.lineas, None):
+            checkpoint.lineas += 1
+            resumen["lineas"] += 1
+            resuelto = mapa.get(codigo)
+            if dato is None:
+                resumen["invalidas"] += 1
+                continue
+            if resuelto is None:
+                resumen["desconocidas"] += 1
+                desconocidos.add(codigo)
+                continue
+            try:
+                lectura = parsear_lectura(dato)
+            except (ValueError, TypeError) as e:
+                resumen["invalidas"] += 1
+                if errores_mostrados < MAX_ERRORES_MOSTRADOS:
+                    errores_mostrados += 1
+                    print(f"ERROR: {ruta}, línea {checkpoint.lineas}: {e}")
+                continue
+
+            bloque.append((resuelto[0], resuelto[1], lectura))
+            if len(bloque) >= tamanio_bloque:
+                confirmar()
+                print(
+                    f"INFO: {ruta}: {checkpoint.lineas} líneas "
+                    f"({resumen['lineas'] / (time.perf_counter() - inicio):.0f} líneas/s)"
+                )
+
+        confirmar()
+        checkpoint.completo = True
+        checkpoint.guardar()
+
+    if desconocidos:
+        print(f"ERROR: {ruta}: {len(desconocidos)} collares desconocidos, por ejemplo {sorted(map(str, desconocidos))[:5]}")
+    return resumen
+
+
+def import_telemetry(rutas, tamanio_bloque=TAMANIO_BLOQUE, columna_collar="collar", reiniciar=False):
+    """Importa varios archivos en orden; devuelve el resumen de cada uno."""
+    mapa = mapa_collares()
+    sqlite = db.engine.dialect.name == "sqlite"
+    if sqlite:
+        # Un fsync por transacción en vez de dos; los bloques grandes hacen el resto
+        db.session.connection().exec_driver_sql("PRAGMA synchronous=NORMAL")
+        db.session.connection().exec_driver_sql("PRAGMA cache_size=-262144")
+    resumenes = {}
+    try:
+        for ruta in rutas:
+            inicio = time.perf_counter()
+            resumenes[ruta] = importar_archivo(ruta, mapa, tamanio_bloque, columna_collar, reiniciar)
+            print(f"INFO: {ruta} importado en {time.perf_counter() - inicio:.1f} s: {resumenes[ruta]}")
+    finally:
+        db.session.rollback()
+        if sqlite:
+            db.session.connection().exec_driver_sql("PRAGMA synchronous=FULL")
+            db.session.commit()
+    return resumenes
+
+
+if __name__ == "__main__":
+    import argparse
+    from Project import create_app
+
+    parser = argparse.ArgumentParser(description="Importa historial de telemetría desde CSV o JSONL")
+    parser.add_argument("archivos", nargs="+", help="Archivos .csv o .jsonl (también .csv.gz / .jsonl.gz)")
+    parser.add_argument("--bloque", type=int, default=TAMANIO_BLOQUE, help="Lecturas por transacción")
+    parser.add_argument("--columna-collar", default="collar", help="Campo con el código del collar o el client_id")
+    parser.add_argument("--reiniciar", action="store_true", help="Ignorar los checkpoints y empezar de cero")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        import_telemetry(args.archivos, args.bloque, args.columna_collar, args.reiniciar)
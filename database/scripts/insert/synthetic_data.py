@@ -0,0 +1,427 @@
+from Project import db
+from Project.models import (
+    Campo,
+    Parcela,
+    Animal,
+    Raza,
+    Sexo,
+    EstadoReproductivo,
+    Collar,
+    AsignacionCollar,
+    NodoAutorizado,
+    UbicacionActual,
+    TemperaturaActual,
+    AceleracionActual,
+    Ubicacion,
+    Temperatura,
+    Acelerometro,
+)
+from database.scripts.insert.insert import insert_data
+from datetime import datetime, timedelta
+import numpy as np
+import json
+import time
+
+"""
+Generador de datos sintéticos a escala para benchmarks y pruebas de capacidad.
+
+A diferencia de populate_static_data (que arma dos campos fijos objeto por objeto), acá
+todo es parametrizable y se inserta en bloques con executemany:
+
+  - campos y parcelas por campo (parcelas cuadradas en grilla, con su GeoJSON)
+  - animales repartidos entre las parcelas, con raza, sexo y estado reproductivo válidos
+  - collares: los primeros se asignan a los animales (activos, con nodo autorizado) y el
+    resto queda disponible
+  - historial de 'dias' días, una lectura cada 'intervalo_s' segundos por collar asignado:
+    una fila en ubicaciones, temperaturas y aceleraciones por lectura, y los valores
+    actuales (UbicacionActual, TemperaturaActual, AceleracionActual) del último paso
+
+Los valores se generan con NumPy por paso de tiempo (todos los collares a la vez) y se
+insertan como tuplas con la sentencia compilada para el dialecto, sin armar un dict ni
+convertir un datetime por fila. Si las tablas de telemetría están vacías se borran sus
+índices antes de la carga y se recrean al final, que es mucho más rápido que mantenerlos
+fila a fila; en SQLite además se desactiva la sincronización del journal durante la carga.
+
+    python -m database.scripts.insert.synthetic_data --animales 50000 --dias 7 --intervalo 300
+"""
+
+# Centro de los campos generados (zona de los campos de ejemplo)
+LAT_BASE = -35.55
+LON_BASE = -60.2
+
+LADO_PARCELA = 0.005  # grados (~500 m)
+SEPARACION_PARCELAS = 0.001
+SEPARACION_CAMPOS = 0.05
+
+TAMANIO_BLOQUE = 50000
+TABLAS_TELEMETRIA = (Ubicacion, Temperatura, Acelerometro)
+
+
+def populate_synthetic_data(
+    campos=2,
+    parcelas_por_campo=3,
+    animales=1000,
+    collares=None,
+    dias=7,
+    intervalo_s=300,
+    prefijo="SIM",
+    semilla=0,
+    fin=None,
+    tamanio_bloque=TAMANIO_BLOQUE,
+    progreso=True,
+):
+    """
+    Agrega al modelo un conjunto sintético con los tamaños pedidos y devuelve un resumen con
+    los ids de los campos y la cantidad de filas insertadas por tabla.
+
+    collares: cantidad de collares (por defecto uno por animal); solo los asignados tienen
+    historial. 'fin' es el timestamp de la última lectura (por defecto ahora). 'dias' puede
+    ser fraccionario. Los catálogos (sexos, razas, estados) salen de insert_data, que se
+    ejecuta si hace falta. 'prefijo' distingue los códigos de collar, nodo y caravana de
+    distintas corridas sobre la misma base.
+    """
+    insert_data()
+
+    rng = np.random.default_rng(semilla)
+    collares = animales if collares is None else collares
+    fin = fin or datetime.now().replace(microsecond=0)
+    inicio_carga = time.perf_counter()
+    resumen = {}
+
+    campo_ids, parcelas = _crear_campos(campos, parcelas_por_campo, prefijo)
+    resumen["campos"] = len(campo_ids)
+    resumen["parcelas"] = len(parcelas)
+    resumen["campo_ids"] = campo_ids
+
+    animal_ids, parcela_de_animal = _crear_animales(animales, parcelas, prefijo, rng, tamanio_bloque)
+    resumen["animales"] = len(animal_ids)
+
+    asignados = min(collares, len(animal_ids))
+    collar_ids = _crear_collares(collares, asignados, animal_ids, prefijo, fin, dias, tamanio_bloque)
+    resumen["collares"] = len(collar_ids)
+    db.session.commit()
+    _informar(progreso, f"catálogo sintético creado: {resumen['campos']} campos, {resumen['parcelas']} parcelas, "
+                        f"{resumen['animales']} animales, {resumen['collares']} collares")
+
+    # Posición inicial uniforme dentro de la parcela de cada animal con collar
+    esquinas = np.array([parcelas[p] for p in parcela_de_animal[:asignados]], dtype=float).reshape(-1, 2)
+    posiciones = esquinas + rng.uniform(0.0, LADO_PARCELA, size=(asignados, 2))
+
+    lecturas, ultimas = _crear_telemetria(
+        collar_ids[:asignados], esquinas, posiciones, dias, intervalo_s, fin, rng, tamanio_bloque, progreso
+    )
+    resumen["lecturas"] = lecturas
+
+    if ultimas is not None:
+        # Valores actuales: los del último paso, como los dejaría la ingesta
+        for modelo, clave, ids, columnas in (
+            (UbicacionActual, "animal_id", animal_ids, ("timestamp", "lat", "lon")),
+            (TemperaturaActual, "collar_id", collar_ids, ("timestamp", "corporal", "ambiente")),
+            (AceleracionActual, "collar_id", collar_ids, ("timestamp", "x", "y", "z")),
+        ):
+            _insertar(modelo.__table__, [
+                {clave: id_, **dict(zip(columnas, valores))}
+                for id_, *valores in zip(ids[:asignados], *(ultimas[c] for c in columnas))
+            ], tamanio_bloque)
+    db.session.commit()
+
+    resumen["segundos"] = round(time.perf_counter() - inicio_carga, 1)
+    _informar(progreso, f"datos sintéticos generados en {resumen['segundos']} s ({lecturas} lecturas)")
+    return resumen
+
+
+def _informar(progreso, mensaje):
+    if progreso:
+        print(f"INFO: {mensaje}")
+
+
+def _siguiente_id(modelo):
+    return (db.session.query(db.func.max(modelo.id)).scalar() or 0) + 1
+
+
+def _insertar(tabla, filas, tamanio_bloque):
+    sentencia = tabla.insert()
+    for inicio in range(0, len(filas), tamanio_bloque):
+        db.session.execute(sentencia, filas[inicio:inicio + tamanio_bloque])
+
+
+def _crear_campos(campos, parcelas_por_campo, prefijo):
+    """Campos en fila de este a oeste, cada uno con sus parcelas en grilla. Devuelve (ids, {parcela_id: (lon, lat) esquina})."""
+    por_fila = max(1, int(np.ceil(np.sqrt(parcelas_por_campo))))
+    paso = LADO_PARCELA + SEPARACION_PARCELAS
+    lado_m = LADO_PARCELA * 111_320 * np.cos(np.radians(LAT_BASE))
+
+    primer_campo = _siguiente_id(Campo)
+    primera_parcela = _siguiente_id(Parcela)
+    filas_campos, filas_parcelas, parcelas = [], [], {}
+    for c in range(campos):
+        campo_id = primer_campo + c
+        lon0 = LON_BASE + c * SEPARACION_CAMPOS
+        lat0 = LAT_BASE
+        filas_campos.append({
+            "id": campo_id,
+            "nombre": f"Campo {prefijo} {c + 1}",
+            "descripcion": "Campo sintético",
+            "lat": lat0 + por_fila * paso / 2,
+            "lon": lon0 + por_fila * paso / 2,
+            "is_preferred": False,
+            "usuario_id": 1,
+        })
+        for p in range(parcelas_por_campo):
+            parcela_id = primera_parcela + len(filas_parcelas)
+            lon = lon0 + (p % por_fila) * paso
+            lat = lat0 + (p // por_fila) * paso
+            anillo = [
+                [lon, lat],
+                [lon + LADO_PARCELA, lat],
+                [lon + LADO_PARCELA, lat + LADO_PARCELA],
+                [lon, lat + LADO_PARCELA],
+                [lon, lat],
+            ]
+            filas_parcelas.append({
+                "id": parcela_id,
+                "nombre": f"Lote {p + 1}",
+                "descripcion": f"Lote {p + 1} {prefijo} {c + 1}",
+                "perimetro_geojson": json.dumps({
+                    "type": "Feature",
+                    "properties": {},
+                    "geometry": {"type": "Polygon", "coordinates": [anillo]},
+                }),
+                "area": round(lado_m * LADO_PARCELA * 110_574, 1),
+                "campo_id": campo_id,
+            })
+            parcelas[parcela_id] = (lon, lat)
+
+    _insertar(Campo.__table__, filas_campos, TAMANIO_BLOQUE)
+    _insertar(Parcela.__table__, filas_parcelas, TAMANIO_BLOQUE)
+    return [f["id"] for f in filas_campos], parcelas
+
+
+def _crear_animales(animales, parcelas, prefijo, rng, tamanio_bloque):
+    """Animales repartidos uniformemente entre las parcelas, con combinaciones raza/sexo/estado válidas."""
+    estados = {}
+    for estado in EstadoReproductivo.query.all():
+        estados.setdefault((estado.sexo_id, estado.especie_id), []).append(estado.id)
+    sexos = [s.id for s in Sexo.query.all()]
+    combinaciones = [
+        (raza.id, sexo_id, estados[(sexo_id, raza.especie_id)])
+        for raza in Raza.query.all()
+        for sexo_id in sexos
+        if (sexo_id, raza.especie_id) in estados
+    ]
+    if not combinaciones or not parcelas:
+        return [], []
+
+    ids_parcelas = list(parcelas)
+    primer_animal = _siguiente_id(Animal)
+    elegidas = rng.integers(0, len(combinaciones), size=animales).tolist()
+    de_parcela = [ids_parcelas[i % len(ids_parcelas)] for i in range(animales)]
+    pesos = np.round(rng.uniform(300, 700, size=animales), 1).tolist()
+    nacimientos = (rng.integers(0, 5 * 365, size=animales)).tolist()
+    hoy = datetime.now().date()
+
+    filas = []
+    for i in range(animales):
+        raza_id, sexo_id, estados_validos = combinaciones[elegidas[i]]
+        animal_id = primer_animal + i
+        filas.append({
+            "id": animal_id,
+            "nombre": f"Animal {animal_id}",
+            "numero_identificacion": f"{prefijo}-A{animal_id:07d}",
+            "fecha_nacimiento": hoy - timedelta(days=365 + nacimientos[i]),
+            "peso": pesos[i],
+            "estado_reproductivo_id": estados_validos[i % len(estados_validos)],
+            "ubicacion_sensor": "cuello",
+            "parcela_id": de_parcela[i],
+            "raza_id": raza_id,
+            "sexo_id": sexo_id,
+        })
+    _insertar(Animal.__table__, filas, tamanio_bloque)
+    return [f["id"] for f in filas], de_parcela
+
+
+def _crear_collares(collares, asignados, animal_ids, prefijo, fin, dias, tamanio_bloque):
+    """Collares (activos los asignados, disponibles el resto), con su asignación y nodo autorizado."""
+    primer_collar = _siguiente_id(Collar)
+    collar_ids = list(range(primer_collar, primer_collar + collares))
+    _insertar(Collar.__table__, [
+        {
+            "id": collar_id,
+            "codigo": f"{prefijo}-{collar_id:07d}",
+            "bateria": 100.0,
+            "ultima_actividad": fin if i < asignados else None,
+            "estado_collar_id": 1 if i < asignados else 2,
+        }
+        for i, collar_id in enumerate(collar_ids)
+    ], tamanio_bloque)
+    _insertar(NodoAutorizado.__table__, [
+        {
+            "collar_id": collar_id,
+            "client_id": f"nodo-{prefijo.lower()}-{collar_id:07d}",
+            "esta_autorizado": True,
+            "fecha_autorizacion": fin,
+            "usuario_id": 1,
+        }
+        for collar_id in collar_ids
+    ], tamanio_bloque)
+    _insertar(AsignacionCollar.__table__, [
+        {"collar_id": collar_id, "animal_id": animal_id, "usuario_id": 1, "fecha_inicio": fin - timedelta(days=dias + 1)}
+        for collar_id, animal_id in zip(collar_ids[:asignados], animal_ids)
+    ], tamanio_bloque)
+    return collar_ids
+
+
+def _crear_telemetria(collar_ids, esquinas, posiciones, dias, intervalo_s, fin, rng, tamanio_bloque, progreso):
+    """
+    Inserta el historial paso a paso (todos los collares por paso, como llegaría del
+    gateway). Devuelve (lecturas, {columna: valores del último paso por collar}) o (0, None)
+    si no hay nada que generar.
+    """
+    n = len(collar_ids)
+    pasos = int(dias * 86400 // intervalo_s)
+    if not n or not pasos:
+        return 0, None
+
+    conexion = db.session.connection()
+    dialecto = conexion.dialect
+    vacias = all(db.session.query(tabla.id).first() is None for tabla in TABLAS_TELEMETRIA)
+    indices = [indice for tabla in TABLAS_TELEMETRIA for indice in tabla.__table__.indexes] if vacias else []
+
+    if dialecto.name == "sqlite":
+        conexion.exec_driver_sql("PRAGMA synchronous=OFF")
+        conexion.exec_driver_sql("PRAGMA cache_size=-262144")
+    for indice in indices:
+        indice.drop(conexion)
+
+    # Sentencias compiladas para el dialecto; las columnas se pasan en el orden posicional que espera cada una
+    sentencias = {}
+    for tabla in TABLAS_TELEMETRIA:
+        sentencia = tabla.__table__.insert()
+        if not vacias:
+            sentencia = sentencia.prefix_with("OR IGNORE")
+        columnas = [c.name for c in tabla.__table__.columns if c.name != "id"]
+        compilada = sentencia.compile(dialect=dialecto, column_keys=columnas)
+        sentencias[tabla] = (str(compilada), compilada.positiontup)
+
+    # Cada collar reporta con un desfasaje fijo dentro del intervalo: por paso hay a lo sumo
+    # intervalo_s timestamps distintos, que se convierten una sola vez
+    tipo_timestamp = Ubicacion.__table__.c.timestamp.type.dialect_impl(dialecto)
+    convertir = tipo_timestamp.bind_processor(dialecto) or (lambda valor: valor)
+    desfasajes = rng.integers(0, intervalo_s, size=n)
+    desfasaje_final = int(desfasajes.max())
+    primero = fin - timedelta(seconds=(pasos - 1) * intervalo_s + desfasaje_final)
+    columna_collar = collar_ids
+
+    lon, lat = posiciones[:, 0].copy(), posiciones[:, 1].copy()
+    rumbo = rng.uniform(0, 2 * np.pi, size=n)
+    fiebre = rng.random(n) < 0.02
+    pendientes = {tabla: [] for tabla in TABLAS_TELEMETRIA}
+    inicio = time.perf_counter()
+    total = pasos * n
+    siguiente_informe = total // 10
+
+    def volcar():
+        for tabla, filas in pendientes.items():
+            if filas:
+                sql, _ = sentencias[tabla]
+                conexion.exec_driver_sql(sql, filas)
+                filas.clear()
+
+    try:
+        for paso in range(pasos):
+            base = primero + timedelta(seconds=paso * intervalo_s)
+            timestamps = np.array(
+                [convertir(base + timedelta(seconds=s)) for s in range(intervalo_s)], dtype=object
+            )[desfasajes].tolist()
+
+            # Caminata correlacionada acotada a la parcela
+            rumbo += rng.normal(0, 0.6, size=n)
+            distancia = rng.exponential(0.3 * intervalo_s, size=n) / 111_320
+            lon = np.clip(lon + np.cos(rumbo) * distancia, esquinas[:, 0], esquinas[:, 0] + LADO_PARCELA)
+            lat = np.clip(lat + np.sin(rumbo) * distancia, esquinas[:, 1], esquinas[:, 1] + LADO_PARCELA)
+
+            hora = (base.hour + base.minute / 60) / 24
+            ambiente = 18 + 8 * np.sin(2 * np.pi * (hora - 0.375))
+            corporal = 38.4 + rng.normal(0, 0.25, size=n) + fiebre * 1.8
+            x, y, z = rng.normal(0, 0.4, size=(3, n))
+
+            valores = {
+                Ubicacion: {"timestamp": timestamps, "lat": lat.tolist(), "lon": lon.tolist(), "collar_id": columna_collar},
+                Temperatura: {
+                    "timestamp": timestamps,
+                    "corporal": np.round(corporal, 2).tolist(),
+                    "ambiente": [round(float(ambiente), 1)] * n,
+                    "collar_id": columna_collar,
+                },
+                Acelerometro: {
+                    "timestamp": timestamps,
+                    "x": np.round(x, 3).tolist(),
+                    "y": np.round(y, 3).tolist(),
+                    "z": np.round(z + 9.81, 3).tolist(),
+                    "collar_id": columna_collar,
+                },
+            }
+            for tabla, columnas in valores.items():
+                _, orden = sentencias[tabla]
+                pendientes[tabla].extend(zip(*(columnas[c] for c in orden)))
+
+            if len(pendientes[Ubicacion]) >= tamanio_bloque:
+                volcar()
+                db.session.commit()
+                conexion = db.session.connection()
+                hechas = (paso + 1) * n
+                if hechas >= siguiente_informe:
+                    siguiente_informe += total // 10
+                    _informar(progreso, f"{hechas}/{total} lecturas ({hechas / (time.perf_counter() - inicio):.0f}/s)")
+        volcar()
+        db.session.commit()
+    finally:
+        if indices:
+            _informar(progreso, "recreando índices de telemetría...")
+            conexion = db.session.connection()
+            for indice in indices:
+                indice.create(conexion)
+            db.session.commit()
+        if dialecto.name == "sqlite":
+            db.session.connection().exec_driver_sql("PRAGMA synchronous=FULL")
+
+    # Batería: descarga lineal a lo largo del historial, distinta por collar
+    ultimo_paso = primero + timedelta(seconds=(pasos - 1) * intervalo_s)
+    bateria = np.clip(100 - rng.uniform(5, 60, size=n) * min(1.0, dias / 30), 1, 100)
+    db.session.bulk_update_mappings(Collar, [
+        {"id": collar_id, "bateria": round(float(b), 1), "ultima_actividad": ultimo_paso + timedelta(seconds=int(s))}
+        for collar_id, b, s in zip(collar_ids, bateria, desfasajes)
+    ])
+    ultimos = {c: v for columnas in valores.values() for c, v in columnas.items() if c != "collar_id"}
+    ultimos["timestamp"] = [ultimo_paso + timedelta(seconds=int(s)) for s in desfasajes]
+    return pasos * n, ultimos
+
+
+if __name__ == "__main__":
+    import argparse
+    from Project import create_app
+
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos a escala")
+    parser.add_argument("--campos", type=int, default=2)
+    parser.add_argument("--parcelas", type=int, default=3, help="Parcelas por campo")
+    parser.add_argument("--animales", type=int, default=1000)
+    parser.add_argument("--collares", type=int, help="Cantidad de collares (por defecto uno por animal)")
+    parser.add_argument("--dias", type=float, default=7, help="Días de historial")
+    parser.add_argument("--intervalo", type=int, default=300, help="Segundos entre lecturas de un collar")
+    parser.add_argument("--prefijo", default="SIM")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        print(populate_synthetic_data(
+            campos=args.campos,
+            parcelas_por_campo=args.parcelas,
+            animales=args.animales,
+            collares=args.collares,
+            dias=args.dias,
+            intervalo_s=args.intervalo,
+            prefijo=args.prefijo,
+            semilla=args.semilla,
+        ))
@@ -0,0 +1,117 @@
+import time
+import argparse
+from sqlalchemy import select, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from Project import create_app, db
+from Project.models import Lectura
+from Project.backend.src.Services.telemetria import COLUMNAS_SEPARADAS, COLUMNAS_LECTURA
+from Project.backend.src.Services.particiones_telemetria import asegurar_particion, limites_mes
+
+"""
+Migra el historial de las tablas separadas (ubicaciones, temperaturas, aceleraciones) a la
+tabla unificada lecturas.
+
+Cada tabla se copia por rangos de id con INSERT ... SELECT ... ON CONFLICT DO UPDATE: la
+primera que trae un (collar_id, timestamp) crea la fila y las siguientes completan sus
+columnas, así un mensaje vuelve a ser una sola fila. Cada rango es una transacción, y como
+el upsert es idempotente la migración se puede cortar y repetir sin duplicar nada.
+
+Para migrar sin detener la ingesta:
+  1. TELEMETRIA_ESQUEMA = "ambos" y reiniciar la API/gateway (escriben en las dos).
+  2. python -m database.scripts.migrate_telemetry
+  3. TELEMETRIA_ESQUEMA = "unificado" y reiniciar. Las tablas separadas quedan intactas;
+     se pueden vaciar cuando ya no se necesiten (--vaciar-separadas).
+
+Con --particionado el destino son las particiones mensuales (lecturas_AAAAMM) y también se
+copia lo que haya en lecturas; después se usa TELEMETRIA_ESQUEMA = "particionado". Cada rango
+de ids se reparte por mes con un INSERT ... SELECT por partición.
+"""
+
+TAMANIO_RANGO = 500000
+
+
+def _copiar(modelo, columnas, tabla, condiciones):
+    """INSERT ... SELECT de 'modelo' a 'tabla' (columnas origen -> destino) con upsert."""
+    origen = select(modelo.collar_id, modelo.timestamp, *[getattr(modelo, c) for c in columnas]).where(
+        modelo.collar_id.isnot(None),
+        modelo.timestamp.isnot(None),
+        *condiciones,
+    )
+    sentencia = sqlite_insert(tabla).from_select(["collar_id", "timestamp", *columnas.values()], origen)
+    sentencia = sentencia.on_conflict_do_update(
+        index_elements=[tabla.c.collar_id, tabla.c.timestamp],
+        set_={destino: sentencia.excluded[destino] for destino in columnas.values()},
+    )
+    return max(db.session.execute(sentencia).rowcount, 0)
+
+
+def _meses_del_rango(modelo, condiciones):
+    # Los timestamps se guardan como 'AAAA-MM-DD HH:MM:SS.ffffff'
+    meses = db.session.query(func.substr(modelo.timestamp, 1, 7)).filter(*condiciones).distinct()
+    return sorted((int(mes[:4]), int(mes[5:7])) for mes, in meses if mes)
+
+
+def migrar_a_lecturas(tamanio_rango=TAMANIO_RANGO, progreso=True, particionado=False):
+    """
+    Copia las tres tablas separadas a lecturas, o con 'particionado' las tablas separadas y
+    lecturas a las particiones mensuales. Devuelve las filas copiadas de cada tabla.
+    """
+    origenes = list(COLUMNAS_SEPARADAS)
+    if particionado:
+        origenes.insert(0, (Lectura, {columna: columna for columna in COLUMNAS_LECTURA}))
+
+    resumen = {}
+    for modelo, columnas in origenes:
+        nombre = modelo.__tablename__
+        min_id, max_id = db.session.query(func.min(modelo.id), func.max(modelo.id)).one()
+        resumen[nombre] = 0
+        if min_id is None:
+            continue
+
+        inicio = time.perf_counter()
+        for desde in range(min_id, max_id + 1, tamanio_rango):
+            rango = (modelo.id >= desde, modelo.id < desde + tamanio_rango)
+            if not particionado:
+                resumen[nombre] += _copiar(modelo, columnas, Lectura.__table__, rango)
+            else:
+                for anio, mes in _meses_del_rango(modelo, rango):
+                    desde_mes, hasta_mes = limites_mes(anio, mes)
+                    tabla = asegurar_particion(anio, mes)
+                    resumen[nombre] += _copiar(
+                        modelo, columnas, tabla, (*rango, modelo.timestamp >= desde_mes, modelo.timestamp < hasta_mes)
+                    )
+            db.session.commit()
+            if progreso:
+                hecho = min(desde + tamanio_rango - 1, max_id)
+                print(
+                    f"INFO: {nombre}: hasta id {hecho}/{max_id} "
+                    f"({resumen[nombre] / (time.perf_counter() - inicio):.0f} filas/s)"
+                )
+    return resumen
+
+
+def vaciar_separadas():
+    for modelo, _ in COLUMNAS_SEPARADAS:
+        db.session.execute(modelo.__table__.delete())
+        print(f"INFO: {modelo.__tablename__} vaciada")
+    db.session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra ubicaciones/temperaturas/aceleraciones a lecturas")
+    parser.add_argument("--rango", type=int, default=TAMANIO_RANGO, help="Ids por transacción")
+    parser.add_argument("--particionado", action="store_true",
+                        help="Copiar a las particiones mensuales (incluye lo que haya en lecturas)")
+    parser.add_argument("--vaciar-separadas", action="store_true",
+                        help="Después de migrar, vaciar las tablas separadas")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        inicio = time.perf_counter()
+        resumen = migrar_a_lecturas(args.rango, particionado=args.particionado)
+        print(f"INFO: migración terminada en {time.perf_counter() - inicio:.1f} s: {resumen}")
+        if args.vaciar_separadas:
+            vaciar_separadas()
@@ -0,0 +1,174 @@
+import os
+import re
+import time
+import argparse
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import create_engine, select, func
+
+from Project import create_app, db
+from Project.backend.src.Services.particiones_telemetria import particiones, tabla_particion, nombre_particion
+
+"""
+Mantenimiento de las particiones mensuales de telemetría (TELEMETRIA_ESQUEMA = "particionado").
+
+    python -m database.scripts.telemetry_partitions listar
+    python -m database.scripts.telemetry_partitions archivar --hasta 2025-12 [--compactar]
+    python -m database.scripts.telemetry_partitions eliminar --hasta 2025-12 [--compactar]
+    python -m database.scripts.telemetry_partitions restaurar database/archivo/lecturas_202511.sqlite
+
+archivar copia cada mes hasta --hasta (inclusive) a su propio archivo
+TELEMETRIA_ARCHIVO_DIR/lecturas_AAAAMM.sqlite, verifica que esté todo y recién entonces hace
+DROP TABLE de la partición. eliminar hace solo el DROP TABLE. Ninguno borra fila por fila:
+el costo es copiar el mes (archivar) o liberar sus páginas (eliminar).
+
+Las páginas liberadas quedan en la base para los meses nuevos; --compactar ejecuta VACUUM
+al final para achicar el archivo (reescribe la base entera, conviene con la ingesta parada).
+El mes en curso nunca se archiva ni se elimina. restaurar vuelve a cargar un archivo
+archivado en su partición, por si hace falta consultarlo.
+"""
+
+PATRON_MES = re.compile(r"^(\d{4})-(\d{2})$")
+
+
+def _mes(valor):
+    coincidencia = PATRON_MES.match(valor)
+    if not coincidencia or not 1 <= int(coincidencia.group(2)) <= 12:
+        raise argparse.ArgumentTypeError(f"Mes inválido: {valor!r} (formato AAAA-MM)")
+    return int(coincidencia.group(1)), int(coincidencia.group(2))
+
+
+def _meses_hasta(hasta):
+    actual = (datetime.now().year, datetime.now().month)
+    meses = []
+    for mes in particiones():
+        if mes > hasta:
+            continue
+        if mes >= actual:
+            print(f"INFO: {nombre_particion(*mes)} es del mes en curso, se conserva")
+            continue
+        meses.append(mes)
+    return meses
+
+
+def listar():
+    for anio, mes in particiones():
+        tabla = tabla_particion(anio, mes)
+        cantidad, primera, ultima = db.session.execute(
+            select(func.count(), func.min(tabla.c.timestamp), func.max(tabla.c.timestamp)).select_from(tabla)
+        ).one()
+        print(f"{tabla.name}: {cantidad} lecturas ({primera} .. {ultima})")
+    directorio = current_app.config["TELEMETRIA_ARCHIVO_DIR"]
+    if os.path.isdir(directorio):
+        for archivo in sorted(os.listdir(directorio)):
+            if archivo.endswith(".sqlite"):
+                tamanio = os.path.getsize(os.path.join(directorio, archivo)) / 1e6
+                print(f"archivado: {archivo} ({tamanio:.1f} MB)")
+
+
+def archivar_particion(anio, mes, directorio):
+    """Copia la partición a su archivo y la elimina de la base. Devuelve las filas copiadas."""
+    tabla = tabla_particion(anio, mes)
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f"{tabla.name}.sqlite")
+
+    # El archivo tiene la misma tabla e índice; si ya existía (el mes se archivó antes y
+    # llegaron lecturas atrasadas) se le agregan las filas nuevas.
+    motor_archivo = create_engine(f"sqlite:///{ruta}")
+    tabla.create(motor_archivo, checkfirst=True)
+    motor_archivo.dispose()
+
+    columnas = ", ".join(columna.name for columna in tabla.columns if columna.name != "id")
+    db.session.commit()  # ATTACH no se puede hacer dentro de una transacción
+    with db.engine.connect() as conexion:
+        conexion.exec_driver_sql("ATTACH DATABASE ? AS archivo", (ruta,))
+        try:
+            copiadas = conexion.exec_driver_sql(
+                f"INSERT OR IGNORE INTO archivo.{tabla.name} ({columnas}) SELECT {columnas} FROM main.{tabla.name}"
+            ).rowcount
+            faltantes = conexion.exec_driver_sql(
+                f"SELECT COUNT(*) FROM main.{tabla.name} AS t WHERE NOT EXISTS ("
+                f"SELECT 1 FROM archivo.{tabla.name} AS a "
+                f"WHERE a.collar_id = t.collar_id AND a.timestamp = t.timestamp)"
+            ).scalar()
+            if faltantes:
+                conexion.rollback()
+                raise RuntimeError(f"{faltantes} lecturas de {tabla.name} no quedaron en {ruta}")
+            conexion.exec_driver_sql(f"DROP TABLE main.{tabla.name}")
+            conexion.commit()
+        finally:
+            conexion.exec_driver_sql("DETACH DATABASE archivo")
+    return copiadas
+
+
+def eliminar_particion(anio, mes):
+    db.session.commit()
+    tabla = tabla_particion(anio, mes)
+    tabla.drop(db.session.connection(), checkfirst=True)
+    db.session.commit()
+
+
+def restaurar_archivo(ruta):
+    """Carga las particiones de un archivo archivado en la base. Devuelve {tabla: filas}."""
+    db.session.commit()
+    resumen = {}
+    with db.engine.connect() as conexion:
+        conexion.exec_driver_sql("ATTACH DATABASE ? AS archivo", (ruta,))
+        try:
+            nombres = conexion.exec_driver_sql(
+                "SELECT name FROM archivo.sqlite_master WHERE type = 'table' AND name LIKE 'lecturas\\_%' ESCAPE '\\'"
+            ).scalars().all()
+            for nombre in nombres:
+                anio, mes = int(nombre[-6:-2]), int(nombre[-2:])
+                tabla = tabla_particion(anio, mes)
+                if tabla.name != nombre:
+                    continue
+                tabla.create(conexion, checkfirst=True)
+                columnas = ", ".join(columna.name for columna in tabla.columns if columna.name != "id")
+                resumen[nombre] = conexion.exec_driver_sql(
+                    f"INSERT OR IGNORE INTO main.{nombre} ({columnas}) SELECT {columnas} FROM archivo.{nombre}"
+                ).rowcount
+            conexion.commit()
+        finally:
+            conexion.exec_driver_sql("DETACH DATABASE archivo")
+    return resumen
+
+
+def compactar():
+    print("INFO: VACUUM de la base...")
+    db.session.commit()
+    with db.engine.connect() as conexion:
+        conexion.exec_driver_sql("VACUUM")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Particiones mensuales de telemetría")
+    acciones = parser.add_subparsers(dest="accion", required=True)
+    acciones.add_parser("listar", help="Particiones y archivos archivados")
+    for nombre, ayuda in (("archivar", "Copiar a archivos y eliminar"), ("eliminar", "Eliminar sin copiar")):
+        accion = acciones.add_parser(nombre, help=ayuda)
+        accion.add_argument("--hasta", type=_mes, required=True, help="Último mes incluido (AAAA-MM)")
+        accion.add_argument("--compactar", action="store_true", help="VACUUM al terminar")
+    accion = acciones.add_parser("restaurar", help="Volver a cargar archivos archivados")
+    accion.add_argument("archivos", nargs="+")
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.accion == "listar":
+            listar()
+        elif args.accion == "restaurar":
+            for ruta in args.archivos:
+                print(f"INFO: {ruta}: {restaurar_archivo(ruta)}")
+        else:
+            for anio, mes in _meses_hasta(args.hasta):
+                inicio = time.perf_counter()
+                if args.accion == "archivar":
+                    filas = archivar_particion(anio, mes, app.config["TELEMETRIA_ARCHIVO_DIR"])
+                    detalle = f"archivada ({filas} lecturas)"
+                else:
+                    eliminar_particion(anio, mes)
+                    detalle = "eliminada"
+                print(f"INFO: {nombre_particion(anio, mes)} {detalle} en {time.perf_counter() - inicio:.2f} s")
+            if args.compactar:
+                compactar()
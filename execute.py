@@ -1,17 +1,111 @@
-import subprocess
 import os
+import sys
+import time
+import shutil
+import argparse
+import subprocess
+
+"""
+Levanta todo el sistema en un solo comando: broker MQTT (opcional), gateway, simulador
+y API. Funciona en Windows, Linux y macOS: usa el mismo intérprete con el que se ejecuta
+y rutas relativas al repositorio.
+
+En Windows cada proceso abre su propia consola (como antes); en el resto comparten la
+terminal y Ctrl+C los cierra a todos.
+
+    python execute.py                      # gateway + simulador + API
+    python execute.py --broker mosquitto.conf --gateway async
+"""
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCRIPTS = {
+    "gateway": os.path.join(BASE_DIR, "Mqtt", "mqtt_gateway_server.py"),
+    "gateway-async": os.path.join(BASE_DIR, "Mqtt", "mqtt_gateway_async.py"),
+    "simulador": os.path.join(BASE_DIR, "Nodo", "simulador_collar.py"),
+    "simulador-flota": os.path.join(BASE_DIR, "Nodo", "simulador_flota_async.py"),
+    "api": os.path.join(BASE_DIR, "run.py"),
+}
+
+
+def comando_python(script, *argumentos):
+    return [sys.executable, SCRIPTS.get(script, script), *argumentos]
+
+
+def lanzar(nombre, comando, cwd=None, salida=None, consola_propia=None):
+    """
+    Inicia un proceso. 'salida' es un archivo donde volcar stdout y stderr (None: la
+    terminal). Con consola_propia (por defecto en Windows) abre una consola nueva.
+    """
+    if consola_propia is None:
+        consola_propia = os.name == "nt" and salida is None
+    if cwd is None:
+        # Los scripts escriben sus logs y el spool en el directorio actual: el suyo
+        cwd = os.path.dirname(comando[1]) if len(comando) > 1 and comando[1].endswith(".py") else BASE_DIR
+    opciones = {"cwd": cwd}
+    if consola_propia and os.name == "nt":
+        opciones["creationflags"] = subprocess.CREATE_NEW_CONSOLE
+    if salida is not None:
+        opciones["stdout"] = salida
+        opciones["stderr"] = subprocess.STDOUT
+    proceso = subprocess.Popen(comando, **opciones)
+    print(f"INFO: {nombre} iniciado (pid {proceso.pid}): {' '.join(comando)}")
+    return proceso
+
+
+def lanzar_broker(config=None, puerto=None, cwd=None, salida=None):
+    """Inicia mosquitto si está instalado; devuelve None si no se encuentra."""
+    ejecutable = shutil.which("mosquitto")
+    if not ejecutable:
+        print("ERROR: no se encontró 'mosquitto' en el PATH")
+        return None
+    comando = [ejecutable]
+    if config:
+        comando += ["-c", config]
+    elif puerto:
+        comando += ["-p", str(puerto)]
+    return lanzar("broker", comando, cwd=cwd or BASE_DIR, salida=salida)
+
+
+def terminar(procesos, espera=10):
+    """Cierra los procesos en orden inverso (primero los que dependen de los demás)."""
+    for proceso in reversed(procesos):
+        if proceso and proceso.poll() is None:
+            proceso.terminate()
+    limite = time.monotonic() + espera
+    for proceso in reversed(procesos):
+        if not proceso:
+            continue
+        try:
+            proceso.wait(timeout=max(0.1, limite - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
 
-# Asegurate de que esta ruta sea absoluta y esté bien formateada
-python_exe = "python"  # o el path completo, por ejemplo: "C:\\Python39\\python.exe"
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inicia broker, gateway, simulador y API")
+    parser.add_argument("--broker", nargs="?", const="", default=None,
+                        help="Iniciar mosquitto (opcionalmente con este archivo de configuración)")
+    parser.add_argument("--gateway", choices=["hilos", "async", "ninguno"], default="hilos")
+    parser.add_argument("--simulador", choices=["hilos", "flota", "ninguno"], default="hilos")
+    parser.add_argument("--sin-api", action="store_true")
+    args = parser.parse_args()
 
-scripts = [
-    "F:\\TESINA\\PROYECTO\\tesina\\Mqtt\\mqtt_gateway_server.py",
-    "F:\\TESINA\\PROYECTO\\tesina\\Nodo\\simulador_collar.py",
-    "F:\\TESINA\\PROYECTO\\tesina\\run.py"
-]
+    procesos = []
+    if args.broker is not None:
+        procesos.append(lanzar_broker(args.broker or None))
+    if not args.sin_api:
+        procesos.append(lanzar("api", comando_python("api")))
+    if args.gateway != "ninguno":
+        procesos.append(lanzar("gateway", comando_python("gateway-async" if args.gateway == "async" else "gateway")))
+    if args.simulador != "ninguno":
+        procesos.append(lanzar("simulador", comando_python("simulador-flota" if args.simulador == "flota" else "simulador")))
 
-for script in scripts:
-    subprocess.Popen(
-        f'start cmd /k "{python_exe} \"{script}\""',
-        shell=True
-    )
+    try:
+        while all(p is None or p.poll() is None for p in procesos):
+            time.sleep(1)
+        print("ERROR: uno de los procesos terminó; cerrando el resto")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        terminar(procesos)
@@ -1,6 +1,8 @@
 # run.py
 from Project import create_app, db
 from database.scripts.function import load_data
+from Project.backend.src.Services.idempotencia import asegurar_indices_unicos
+from Project.backend.src.Services.ubicacion_actual import asegurar_valores_actuales
 import os
 
 # Resolve the base directory of the script
@@ -17,6 +19,10 @@ with app.app_context():
     if db_uri.startswith("sqlite:///"):
         # Crea todas las tablas definidas en los modelos
         db.create_all()
+        # Bases creadas antes de los índices únicos de telemetría
+        asegurar_indices_unicos()
+        # Bases creadas antes de temperatura_actual / aceleracion_actual
+        asegurar_valores_actuales()
         if boolean:
             load_data()
     else:
@@ -0,0 +1,222 @@
+# ~/tests/benchmark_lectura.py
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+from datetime import datetime
+from sqlalchemy import event
+
+"""
+Benchmark de los endpoints de lectura pesados sobre bases sintéticas grandes.
+
+Para cada dataset (--datasets, "animales:lecturas", por ejemplo 1000:1000000) genera una
+base SQLite con database/scripts/insert/synthetic_data.py (o reutiliza la que ya está en
+--datos) y mide con el test client de Flask, sin servidor HTTP ni login:
+
+  - tiempo de pared: mediana y mínimo de --repeticiones llamadas, después de una de
+    calentamiento
+  - cantidad de sentencias SQL por llamada (evento before_cursor_execute del engine)
+  - pico de memoria de Python por llamada (tracemalloc, en una llamada aparte porque
+    tracemalloc hace más lento todo lo demás)
+
+Con --baseline compara contra un JSON anterior y marca como regresión lo que empeore más
+que --tolerancia (tiempo y memoria) o haga más consultas; en ese caso sale con código 1.
+Con --guardar-baseline el resultado pasa a ser la nueva referencia.
+
+    python tests/benchmark_lectura.py --datasets 1000:1000000,10000:1000000 --salida lectura.json
+    python tests/benchmark_lectura.py --datasets 1000:1000000 --baseline lectura_base.json
+"""
+
+ENDPOINTS = [
+    ("animals.api_list_full_animales", "/api/animals/"),
+    ("animals.api_cluster_animals", "/api/animals/{campo_id}/entities"),
+    ("collares.api_collares_list_full", "/api/collares/"),
+    ("api_gateway.collares_estado", "/api/collares/estado"),
+    ("parcelas.api_parcela_animals", "/api/parcelas/animales/resumen"),
+]
+
+INTERVALO_S = 300
+PREFIJO = "SIM"
+
+
+# =============================
+# DATOS SINTÉTICOS
+# =============================
+def preparar_dataset(directorio, animales, lecturas, intervalo_s=INTERVALO_S):
+    """
+    Ruta a la base del dataset; si no existe la genera con populate_synthetic_data: un
+    collar por animal y el historial necesario para llegar a 'lecturas' lecturas.
+    """
+    ruta = os.path.join(directorio, f"lectura_{animales}a_{lecturas}l.sqlite")
+    if os.path.exists(ruta):
+        return ruta
+
+    print(f"INFO: generando dataset de {animales} animales y {lecturas} lecturas en {ruta}...")
+    app = crear_app(ruta + ".tmp")
+    from Project import db
+    from database.scripts.insert.synthetic_data import populate_synthetic_data
+    with app.app_context():
+        db.create_all()
+        populate_synthetic_data(
+            animales=animales,
+            dias=max(1, lecturas // animales) * intervalo_s / 86400,
+            intervalo_s=intervalo_s,
+            prefijo=PREFIJO,
+        )
+        db.session.remove()
+        db.engine.dispose()
+    os.replace(ruta + ".tmp", ruta)
+    return ruta
+
+
+# =============================
+# MEDICIÓN
+# =============================
+def crear_app(ruta):
+    from Project.config import Config
+    Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{ruta}"
+    from Project import create_app
+    app = create_app()
+    app.config["LOGIN_DISABLED"] = True
+    app.config["PROPAGATE_EXCEPTIONS"] = False  # un endpoint roto queda como 500 en el informe
+    return app
+
+
+class ContadorConsultas:
+    def __init__(self, engine):
+        self.cantidad = 0
+        event.listen(engine, "before_cursor_execute", self._contar)
+
+    def _contar(self, *args, **kwargs):
+        self.cantidad += 1
+
+
+def medir_endpoint(app, cliente, contador, url, repeticiones):
+    from Project import db
+
+    def llamar():
+        respuesta = cliente.get(url)
+        db.session.remove()  # cada llamada empieza con la sesión vacía, como una petición nueva
+        return respuesta
+
+    respuesta = llamar()  # calentamiento (y caches del proceso)
+
+    tiempos = []
+    consultas = []
+    for _ in range(repeticiones):
+        contador.cantidad = 0
+        inicio = time.perf_counter()
+        respuesta = llamar()
+        tiempos.append(time.perf_counter() - inicio)
+        consultas.append(contador.cantidad)
+
+    tracemalloc.start()
+    llamar()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "status": respuesta.status_code,
+        "bytes_respuesta": len(respuesta.get_data()),
+        "tiempo_mediana_ms": round(statistics.median(tiempos) * 1000, 2),
+        "tiempo_min_ms": round(min(tiempos) * 1000, 2),
+        "consultas": max(consultas),
+        "memoria_pico_mb": round(pico / 2 ** 20, 2),
+    }
+
+
+def medir_dataset(ruta, repeticiones):
+    app = crear_app(ruta)
+    from Project import db
+    from Project.models import Campo
+    resultados = {}
+    with app.app_context():
+        # El clúster se mide sobre el primer campo generado (los de ejemplo casi no tienen animales)
+        campo = Campo.query.filter_by(nombre=f"Campo {PREFIJO} 1").first()
+        contador = ContadorConsultas(db.engine)
+        cliente = app.test_client()
+        for nombre, url in ENDPOINTS:
+            url = url.format(campo_id=campo.id if campo else 1)
+            resultado = medir_endpoint(app, cliente, contador, url, repeticiones)
+            resultados[nombre] = resultado
+            print(
+                f"  {nombre:36} {resultado['status']}  {resultado['tiempo_mediana_ms']:>10} ms  "
+                f"{resultado['consultas']:>6} consultas  {resultado['memoria_pico_mb']:>8} MB"
+            )
+        db.session.remove()
+        db.engine.dispose()
+    return resultados
+
+
+# =============================
+# COMPARACIÓN CON LA BASELINE
+# =============================
+def comparar(actual, baseline, tolerancia):
+    """Lista de regresiones (dataset, endpoint, métrica, antes, ahora) respecto de la baseline."""
+    regresiones = []
+    for dataset, endpoints in actual["datasets"].items():
+        previos = baseline.get("datasets", {}).get(dataset, {})
+        for nombre, r in endpoints.items():
+            p = previos.get(nombre)
+            if not p:
+                continue
+            if r["status"] != p["status"]:
+                regresiones.append((dataset, nombre, "status", p["status"], r["status"]))
+            if r["consultas"] > p["consultas"]:
+                regresiones.append((dataset, nombre, "consultas", p["consultas"], r["consultas"]))
+            for metrica in ("tiempo_mediana_ms", "memoria_pico_mb"):
+                if p[metrica] and r[metrica] > p[metrica] * (1 + tolerancia):
+                    regresiones.append((dataset, nombre, metrica, p[metrica], r[metrica]))
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los endpoints de lectura")
+    parser.add_argument("--datasets", default="1000:1000000,10000:1000000,50000:1000000",
+                        help="Pares animales:lecturas separados por comas (ej. 1000:1000000,10000:10000000)")
+    parser.add_argument("--datos", default=os.path.join(tempfile.gettempdir(), "benchmark_lectura"),
+                        help="Directorio donde se guardan (y reutilizan) las bases generadas")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--baseline", help="JSON de referencia para detectar regresiones")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento admitido en tiempo y memoria (0.2 = 20%%)")
+    parser.add_argument("--guardar-baseline", action="store_true", help="Guardar el resultado como nueva baseline")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    os.makedirs(args.datos, exist_ok=True)
+    resultado = {"fecha": datetime.now().isoformat(timespec="seconds"), "repeticiones": args.repeticiones, "datasets": {}}
+    for dataset in [d.strip() for d in args.datasets.split(",") if d.strip()]:
+        animales, lecturas = (int(x) for x in dataset.split(":"))
+        ruta = preparar_dataset(args.datos, animales, lecturas)
+        print(f"\n== {animales} animales, {lecturas} lecturas ==")
+        resultado["datasets"][dataset] = medir_dataset(ruta, args.repeticiones)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
+
+    regresiones = []
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regresiones = comparar(resultado, json.load(f), args.tolerancia)
+        if regresiones:
+            print(f"\nRegresiones respecto de {args.baseline}:")
+            for dataset, nombre, metrica, antes, ahora in regresiones:
+                print(f"  [{dataset}] {nombre}: {metrica} {antes} -> {ahora}")
+        else:
+            print(f"\nSin regresiones respecto de {args.baseline}")
+
+    if args.guardar_baseline and args.baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"Baseline actualizada en {args.baseline}")
+
+    sys.exit(1 if regresiones else 0)
@@ -0,0 +1,392 @@
+# ~/tests/benchmark_pipeline.py
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+import requests
+import paho.mqtt.client as mqtt
+
+import execute
+from carga_ingesta import resumen_latencias
+
+"""
+Benchmark de punta a punta: simulador -> broker MQTT -> gateway -> API -> base.
+
+Levanta con los lanzadores de execute.py un broker mosquitto local (o usa uno existente),
+la API sobre una base SQLite nueva y el gateway, y publica lecturas a tasas crecientes
+(--tasas). Para cada tasa informa:
+
+  - latencia de punta a punta: desde el timestamp del dispositivo en el payload (la hora
+    de publicación, con microsegundos) hasta que la fila está confirmada en la base. Las
+    filas se detectan consultando la base cada --sondeo segundos, que es la resolución.
+  - throughput sostenido: filas confirmadas por segundo durante el paso.
+  - pérdida: lecturas publicadas que no llegaron a la base al terminar la espera final.
+
+La primera tasa en la que se pierden lecturas o la base no sigue el ritmo marca el límite.
+Los resultados se guardan en JSON con --salida.
+
+El broker y el gateway se conectan sin TLS; la API corre sin límite de tasa.
+
+    python tests/benchmark_pipeline.py --tasas 50,100,200,400 --duracion-paso 20 --salida e2e.json
+    python tests/benchmark_pipeline.py --broker localhost --puerto 1883 --gateway async
+"""
+
+TOPIC = "ganado/sensor"
+
+
+# =============================
+# BASE Y API
+# =============================
+def configurar_base(ruta):
+    """Apunta la configuración a 'ruta' antes de crear la app (también en el proceso de la API)."""
+    from Project.config import Config
+    Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{ruta}"
+    Config.INGESTA_LIMITE_CLIENTE_TASA = 0
+    Config.INGESTA_LIMITE_GLOBAL_TASA = 0
+
+
+def preparar_base(ruta, collares):
+    """Crea la base con 'collares' collares autorizados y asignados. Devuelve {client_id: collar_id}."""
+    configurar_base(ruta)
+    from Project import create_app, db
+    from Project.models import Animal, Collar, NodoAutorizado, AsignacionCollar
+    from database.scripts.function import load_data
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        load_data()
+        ids = {}
+        for i in range(1, collares + 1):
+            client_id = f"nodo-bench-{i:05d}"
+            animal = Animal(nombre=f"Bench {i}")
+            collar = Collar(codigo=f"BENCH-{i:05d}", estado_collar_id=1, bateria=100)
+            db.session.add_all([animal, collar])
+            db.session.flush()
+            db.session.add(NodoAutorizado(collar_id=collar.id, client_id=client_id, esta_autorizado=True))
+            db.session.add(AsignacionCollar(collar_id=collar.id, animal_id=animal.id))
+            ids[client_id] = collar.id
+        db.session.commit()
+    return ids
+
+
+def servir_api(ruta, puerto, modo):
+    configurar_base(ruta)
+    from Project.config import Config
+    Config.INGESTA_MODO = modo
+    from Project import create_app
+    app = create_app()
+    app.run(host="127.0.0.1", port=puerto, threaded=True, debug=False, use_reloader=False)
+
+
+def esperar_api(url, limite=30):
+    fin = time.monotonic() + limite
+    while time.monotonic() < fin:
+        try:
+            if requests.get(url + "/api/metrics", timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+# =============================
+# PUBLICACIÓN Y OBSERVACIÓN
+# =============================
+class Medicion:
+    def __init__(self, client_ids):
+        self.client_ids = client_ids
+        self._lock = threading.Lock()
+        self.publicadas = {}  # (collar_id, timestamp) -> paso
+        self.por_paso = {}    # paso -> {"publicadas", "latencias", "observadas_en_ventana"}
+        self.observadas = 0
+
+    def nuevo_paso(self, paso):
+        self.por_paso[paso] = {"publicadas": 0, "latencias": [], "observadas_en_ventana": 0}
+
+    def publicada(self, paso, collar_id, timestamp):
+        with self._lock:
+            self.publicadas[(collar_id, timestamp)] = paso
+            self.por_paso[paso]["publicadas"] += 1
+
+    def observada(self, collar_id, timestamp, ahora, paso_actual):
+        with self._lock:
+            self.observadas += 1
+            if paso_actual is not None:
+                self.por_paso[paso_actual]["observadas_en_ventana"] += 1
+            paso = self.publicadas.pop((collar_id, timestamp), None)
+            if paso is not None:
+                self.por_paso[paso]["latencias"].append((ahora - timestamp).total_seconds())
+
+    def descartar_pendientes(self):
+        with self._lock:
+            self.publicadas.clear()
+
+    def pendientes(self):
+        with self._lock:
+            return len(self.publicadas)
+
+
+def armar_payload(client_id, timestamp):
+    return json.dumps({
+        "client_id": client_id,
+        "timestamp": timestamp.isoformat(timespec="microseconds"),
+        "lat": round(-35.500422 + random.uniform(-0.0005, 0.0005), 6),
+        "lon": round(-60.348737 + random.uniform(-0.0005, 0.0005), 6),
+        "temperatura": round(random.uniform(37.0, 39.5), 2),
+        "temperatura_ambiente": round(random.uniform(25.0, 30.0), 2),
+        "acelerometro": {"x": round(random.uniform(-1.0, 1.0), 2), "y": round(random.uniform(-1.0, 1.0), 2), "z": 9.81},
+    }, separators=(",", ":"))
+
+
+def publicar_paso(cliente, medicion, ids, paso, tasa, duracion, qos, contador):
+    """Publica a 'tasa' mensajes por segundo durante 'duracion' segundos, a intervalos regulares."""
+    medicion.nuevo_paso(paso)
+    intervalo = 1.0 / tasa
+    siguiente = time.perf_counter()
+    fin = siguiente + duracion
+    while siguiente < fin:
+        espera = siguiente - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        client_id = medicion.client_ids[contador % len(medicion.client_ids)]
+        timestamp = datetime.now()
+        medicion.publicada(paso, ids[client_id], timestamp)
+        cliente.publish(TOPIC, armar_payload(client_id, timestamp), qos=qos)
+        contador += 1
+        siguiente += intervalo
+    return contador
+
+
+class Observador(threading.Thread):
+    """Consulta la base cada 'sondeo' segundos y registra las ubicaciones nuevas."""
+
+    def __init__(self, ruta, medicion, sondeo):
+        super().__init__(name="observador", daemon=True)
+        self.ruta = ruta
+        self.medicion = medicion
+        self.sondeo = sondeo
+        self.paso_actual = None
+        self.detener = threading.Event()
+
+    def run(self):
+        from Project.config import Config
+        # Con el esquema unificado las ubicaciones son las lecturas con lat; particionado,
+        # las de la partición del mes en curso (los payloads llevan la hora actual)
+        if Config.TELEMETRIA_ESQUEMA == "unificado":
+            tabla, filtro = "lecturas", "AND lat IS NOT NULL"
+        elif Config.TELEMETRIA_ESQUEMA == "particionado":
+            tabla, filtro = f"lecturas_{datetime.now():%Y%m}", "AND lat IS NOT NULL"
+        else:
+            tabla, filtro = "ubicaciones", ""
+        conexion = sqlite3.connect(f"file:{self.ruta}?mode=ro", uri=True, timeout=5)
+        try:
+            ultimo_id = conexion.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}").fetchone()[0]
+        except sqlite3.OperationalError:
+            ultimo_id = 0  # la partición del mes todavía no existe: la crea la primera escritura
+        while not self.detener.is_set():
+            try:
+                filas = conexion.execute(
+                    f"SELECT id, collar_id, timestamp FROM {tabla} WHERE id > ? {filtro} ORDER BY id", (ultimo_id,)
+                ).fetchall()
+            except sqlite3.OperationalError:
+                filas = []  # base bloqueada por una escritura: se reintenta en el próximo sondeo
+            ahora = datetime.now()
+            for id_, collar_id, timestamp in filas:
+                self.medicion.observada(collar_id, datetime.fromisoformat(timestamp), ahora, self.paso_actual)
+                ultimo_id = id_
+            self.detener.wait(self.sondeo)
+        conexion.close()
+
+
+# =============================
+# INFORME
+# =============================
+def informe(args, medicion, pasos):
+    resultados = []
+    limite = None
+    for paso, (tasa, duracion) in enumerate(pasos):
+        datos = medicion.por_paso[paso]
+        publicadas = datos["publicadas"]
+        confirmadas = len(datos["latencias"])
+        perdidas = publicadas - confirmadas
+        sostenido = datos["observadas_en_ventana"] / duracion
+        resultado = {
+            "tasa_objetivo": tasa,
+            "publicadas": publicadas,
+            "confirmadas": confirmadas,
+            "perdidas": perdidas,
+            "perdida_pct": round(100.0 * perdidas / publicadas, 3) if publicadas else 0.0,
+            "filas_por_s": round(sostenido, 1),
+            "latencia": resumen_latencias(datos["latencias"]),
+        }
+        resultados.append(resultado)
+        if limite is None and (perdidas or sostenido < 0.95 * tasa):
+            limite = tasa
+
+    return {
+        "etiqueta": args.etiqueta,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "configuracion": {
+            "gateway": args.gateway,
+            "reenvio": args.reenvio,
+            "ingesta_modo": args.ingesta_modo,
+            "collares": args.collares,
+            "qos": args.qos,
+            "duracion_paso_s": args.duracion_paso,
+            "sondeo_s": args.sondeo,
+        },
+        "pasos": resultados,
+        "primera_tasa_saturada": limite,
+    }
+
+
+def imprimir(datos):
+    print(f"\n{'tasa':>8} {'public.':>8} {'perdidas':>9} {'filas/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9}")
+    for r in datos["pasos"]:
+        l = r["latencia"]
+        print(
+            f"{r['tasa_objetivo']:>8} {r['publicadas']:>8} {r['perdidas']:>9} {r['filas_por_s']:>9} "
+            f"{l['p50_ms'] or '-':>9} {l['p95_ms'] or '-':>9} {l['p99_ms'] or '-':>9} {l['max_ms'] or '-':>9}"
+        )
+    if datos["primera_tasa_saturada"] is None:
+        print("\nNinguna tasa saturó el pipeline.")
+    else:
+        print(f"\nPrimera tasa saturada: {datos['primera_tasa_saturada']} msg/s")
+
+
+# =============================
+# ORQUESTACIÓN
+# =============================
+def correr(args):
+    directorio = tempfile.mkdtemp(prefix="benchmark_pipeline_")
+    ruta_db = os.path.join(directorio, "benchmark.sqlite")
+    print(f"INFO: archivos del benchmark en {directorio}")
+    ids = preparar_base(ruta_db, args.collares)
+
+    procesos = []
+    logs = []
+
+    def log(nombre):
+        archivo = open(os.path.join(directorio, f"{nombre}.log"), "w")
+        logs.append(archivo)
+        return archivo
+
+    try:
+        if args.broker_local:
+            broker = execute.lanzar_broker(puerto=args.puerto, cwd=directorio, salida=log("broker"))
+            if broker is None:
+                return None
+            procesos.append(broker)
+            time.sleep(1)
+
+        url_api = f"http://127.0.0.1:{args.puerto_api}"
+        procesos.append(execute.lanzar("api", [
+            sys.executable, os.path.abspath(__file__), "--servir-api", ruta_db,
+            "--puerto-api", str(args.puerto_api), "--ingesta-modo", args.ingesta_modo,
+        ], cwd=directorio, salida=log("api")))
+        if not esperar_api(url_api):
+            print("ERROR: la API no respondió")
+            return None
+
+        script = "gateway-async" if args.gateway == "async" else "gateway"
+        procesos.append(execute.lanzar("gateway", execute.comando_python(
+            script, "--broker", args.broker, "--puerto", str(args.puerto), "--sin-tls",
+            "--api", url_api, "--reenvio", args.reenvio, "--spool", os.path.join(directorio, "spool.sqlite3"),
+        ), cwd=directorio, salida=log("gateway")))
+
+        cliente = mqtt.Client(client_id="benchmark-pipeline")
+        cliente.connect(args.broker, args.puerto, keepalive=60)
+        cliente.loop_start()
+
+        medicion = Medicion(sorted(ids))
+        observador = Observador(ruta_db, medicion, args.sondeo)
+        observador.start()
+
+        # Calentamiento: una lectura por collar, hasta que el gateway esté suscripto y todas lleguen
+        pasos = [(t, args.duracion_paso) for t in args.tasas]
+        calentamiento = len(pasos)
+        contador = 0
+        print("INFO: calentamiento...")
+        fin = time.monotonic() + args.espera_inicial
+        while time.monotonic() < fin:
+            contador = publicar_paso(cliente, medicion, ids, calentamiento, len(ids), 1, args.qos, contador)
+            time.sleep(1)
+            if medicion.por_paso[calentamiento]["latencias"]:
+                break
+        else:
+            print("ERROR: ninguna lectura llegó a la base; revisar los logs del gateway y la API")
+            return None
+        esperar_vaciado(medicion, args.espera_final)
+        medicion.descartar_pendientes()
+
+        for paso, (tasa, duracion) in enumerate(pasos):
+            print(f"INFO: paso {paso + 1}/{len(pasos)}: {tasa} msg/s durante {duracion} s")
+            observador.paso_actual = paso
+            contador = publicar_paso(cliente, medicion, ids, paso, tasa, duracion, args.qos, contador)
+            observador.paso_actual = None
+
+        print(f"INFO: esperando hasta {args.espera_final} s a que lleguen las pendientes...")
+        esperar_vaciado(medicion, args.espera_final)
+        observador.detener.set()
+        observador.join()
+        cliente.loop_stop()
+        cliente.disconnect()
+        return informe(args, medicion, pasos)
+    finally:
+        execute.terminar(procesos)
+        for archivo in logs:
+            archivo.close()
+
+
+def esperar_vaciado(medicion, limite):
+    fin = time.monotonic() + limite
+    while medicion.pendientes() and time.monotonic() < fin:
+        time.sleep(0.2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta de la telemetría")
+    parser.add_argument("--tasas", default="50,100,200,400", help="Mensajes por segundo de cada paso, separados por comas")
+    parser.add_argument("--duracion-paso", type=float, default=20)
+    parser.add_argument("--collares", type=int, default=100)
+    parser.add_argument("--qos", type=int, choices=[0, 1], default=1)
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--puerto", type=int, default=1883)
+    parser.add_argument("--broker-local", action="store_true", help="Iniciar mosquitto en --puerto")
+    parser.add_argument("--gateway", choices=["hilos", "async"], default="hilos")
+    parser.add_argument("--reenvio", choices=["lotes", "individual"], default="lotes")
+    parser.add_argument("--ingesta-modo", choices=["sincrono", "buffer"], default="sincrono")
+    parser.add_argument("--puerto-api", type=int, default=5055)
+    parser.add_argument("--sondeo", type=float, default=0.02, help="Segundos entre consultas a la base")
+    parser.add_argument("--espera-inicial", type=float, default=30)
+    parser.add_argument("--espera-final", type=float, default=30)
+    parser.add_argument("--etiqueta", default="")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--servir-api", metavar="RUTA_DB", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir_api:
+        servir_api(args.servir_api, args.puerto_api, args.ingesta_modo)
+        sys.exit(0)
+
+    args.tasas = [float(t) for t in args.tasas.split(",") if t.strip()]
+    datos = correr(args)
+    if datos is None:
+        sys.exit(1)
+
+    imprimir(datos)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
@@ -0,0 +1,336 @@
+# ~/tests/carga_ingesta.py
+
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import gzip
+import json
+import math
+import time
+import queue
+import random
+import argparse
+import itertools
+import threading
+from datetime import datetime, timedelta
+import requests
+
+from Comun.codec_binario import codificar_payload, TIPO_CONTENIDO as TIPO_BINARIO
+
+"""
+Prueba de carga de la ingesta HTTP contra un servidor local (python run.py).
+
+Envía lecturas a POST /api/datos (JSON o trama binaria) o lotes a POST /api/datos/batch
+(JSON, binario, opcionalmente gzip) de dos maneras:
+
+  - a tasa fija (--tasa): un planificador emite peticiones a ritmo constante y --concurrencia
+    hilos las envían. La latencia se mide desde el momento en que la petición debía salir,
+    así una cola que crece porque el servidor no da abasto se ve en los percentiles
+    (evita la "omisión coordinada").
+  - a concurrencia fija (sin --tasa): --concurrencia hilos envían sin pausa, uno tras otro.
+
+Informa peticiones y lecturas por segundo, latencias p50/p95/p99/máx y los errores por
+código HTTP (y, en los lotes, por código de cada lectura). Con --salida guarda el
+resultado en JSON; con --comparar muestra la diferencia con otra corrida.
+
+Los client_id deben existir como nodos autorizados con collar asignado (por defecto
+nodo-test-001..nodo-test-005). Cada lectura lleva un timestamp distinto por collar para
+que no se descarte como duplicada (las que igual lo sean, por ejemplo si se repite una
+corrida enseguida, se informan aparte). El limitador viene desactivado; si se activó
+INGESTA_LIMITE_* en la configuración, subirlo o volverlo a 0 para medir la base y no el
+limitador.
+
+    python tests/carga_ingesta.py --modo datos --tasa 200 --duracion 30
+    python tests/carga_ingesta.py --modo batch --lote 500 --gzip --concurrencia 4 --salida r.json
+"""
+
+MODOS = ("datos", "binario", "batch", "batch-binario")
+
+
+class GeneradorLecturas:
+    """Lecturas con timestamps crecientes por collar, seguro entre hilos."""
+
+    def __init__(self, client_ids, inicio=None):
+        self.client_ids = client_ids
+        self.inicio = inicio or datetime.now()
+        self._contador = itertools.count()
+        self._lock = threading.Lock()
+
+    def siguiente(self):
+        with self._lock:
+            n = next(self._contador)
+        client_id = self.client_ids[n % len(self.client_ids)]
+        timestamp = self.inicio + timedelta(seconds=n // len(self.client_ids))
+        return {
+            "client_id": client_id,
+            "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%S"),
+            "lat": round(-35.500422 + random.uniform(-0.0005, 0.0005), 6),
+            "lon": round(-60.348737 + random.uniform(-0.0005, 0.0005), 6),
+            "temperatura": round(random.uniform(37.0, 39.5), 2),
+            "temperatura_ambiente": round(random.uniform(25.0, 30.0), 2),
+            "acelerometro": {
+                "x": round(random.uniform(-1.0, 1.0), 2),
+                "y": round(random.uniform(-1.0, 1.0), 2),
+                "z": round(random.uniform(9.5, 10.5), 2),
+            },
+        }
+
+
+def armar_peticion(args, generador):
+    """(url, cuerpo, encabezados, lecturas) de la próxima petición según el modo."""
+    if args.modo in ("datos", "binario"):
+        lectura = generador.siguiente()
+        encabezados = {"X-Client-ID": lectura["client_id"]}
+        if args.modo == "binario":
+            encabezados["Content-Type"] = TIPO_BINARIO
+            return args.url + "/api/datos", codificar_payload(lectura), encabezados, 1
+        encabezados["Content-Type"] = "application/json"
+        return args.url + "/api/datos", json.dumps(lectura).encode("utf-8"), encabezados, 1
+
+    lecturas = [generador.siguiente() for _ in range(args.lote)]
+    if args.modo == "batch-binario":
+        cuerpo = b"".join(codificar_payload(lectura) for lectura in lecturas)
+        encabezados = {"Content-Type": TIPO_BINARIO}
+    else:
+        cuerpo = json.dumps(lecturas, separators=(",", ":")).encode("utf-8")
+        encabezados = {"Content-Type": "application/json"}
+    if args.gzip:
+        cuerpo = gzip.compress(cuerpo, compresslevel=5)
+        encabezados["Content-Encoding"] = "gzip"
+    return args.url + "/api/datos/batch", cuerpo, encabezados, len(lecturas)
+
+
+class Resultados:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = []  # segundos, solo de las peticiones respondidas
+        self.servicio = []   # segundos desde que la petición salió (sin la espera en cola)
+        self.peticiones = 0
+        self.lecturas_enviadas = 0
+        self.lecturas_guardadas = 0
+        self.lecturas_duplicadas = 0
+        self.por_codigo = {}
+        self.por_codigo_lectura = {}
+        self.errores_conexion = {}
+
+    def registrar(self, latencia, servicio, lecturas, respuesta=None, error=None):
+        with self._lock:
+            self.peticiones += 1
+            self.lecturas_enviadas += lecturas
+            if error is not None:
+                tipo = type(error).__name__
+                self.errores_conexion[tipo] = self.errores_conexion.get(tipo, 0) + 1
+                return
+
+            self.latencias.append(latencia)
+            self.servicio.append(servicio)
+            codigo = str(respuesta.status_code)
+            self.por_codigo[codigo] = self.por_codigo.get(codigo, 0) + 1
+
+            if respuesta.status_code not in (200, 202, 207):
+                return
+            try:
+                cuerpo = respuesta.json()
+            except ValueError:
+                return
+            if "summary" in cuerpo:
+                self.lecturas_guardadas += cuerpo["summary"].get("guardadas", 0)
+                self.lecturas_duplicadas += cuerpo["summary"].get("duplicadas", 0)
+                for resultado in cuerpo.get("resultados", []):
+                    if resultado.get("status") == "error":
+                        clave = str(resultado.get("code"))
+                        self.por_codigo_lectura[clave] = self.por_codigo_lectura.get(clave, 0) + 1
+            elif "duplicada" in cuerpo.get("message", ""):
+                self.lecturas_duplicadas += 1
+            else:
+                self.lecturas_guardadas += 1
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    # Rango más cercano: el menor valor que deja al menos p% de las muestras por debajo o igual
+    return ordenados[max(0, math.ceil(p / 100.0 * len(ordenados)) - 1)]
+
+
+def resumen_latencias(valores):
+    ordenados = sorted(valores)
+    a_ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "p50_ms": a_ms(percentil(ordenados, 50)),
+        "p95_ms": a_ms(percentil(ordenados, 95)),
+        "p99_ms": a_ms(percentil(ordenados, 99)),
+        "max_ms": a_ms(ordenados[-1] if ordenados else None),
+        "media_ms": a_ms(sum(ordenados) / len(ordenados) if ordenados else None),
+    }
+
+
+def enviar(sesion, args, generador, resultados, programada):
+    url, cuerpo, encabezados, lecturas = armar_peticion(args, generador)
+    salida = time.perf_counter()
+    try:
+        respuesta = sesion.post(url, data=cuerpo, headers=encabezados, timeout=args.timeout)
+    except requests.RequestException as e:
+        resultados.registrar(None, None, lecturas, error=e)
+        return
+    fin = time.perf_counter()
+    resultados.registrar(fin - programada, fin - salida, lecturas, respuesta)
+
+
+def worker_concurrencia(args, generador, resultados, fin):
+    sesion = requests.Session()
+    while time.perf_counter() < fin:
+        enviar(sesion, args, generador, resultados, time.perf_counter())
+
+
+def worker_tasa(args, generador, resultados, cola):
+    sesion = requests.Session()
+    while True:
+        programada = cola.get()
+        if programada is None:
+            return
+        enviar(sesion, args, generador, resultados, programada)
+
+
+def planificar(args, cola, fin):
+    """Encola el instante programado de cada petición, a intervalos regulares."""
+    intervalo = 1.0 / args.tasa
+    siguiente = time.perf_counter()
+    while siguiente < fin:
+        espera = siguiente - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        cola.put(siguiente)
+        siguiente += intervalo
+
+
+def correr(args, generador, duracion, resultados):
+    fin = time.perf_counter() + duracion
+
+    if args.tasa:
+        cola = queue.Queue()
+        hilos = [
+            threading.Thread(target=worker_tasa, args=(args, generador, resultados, cola), daemon=True)
+            for _ in range(args.concurrencia)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        planificar(args, cola, fin)
+        for _ in hilos:
+            cola.put(None)
+    else:
+        hilos = [
+            threading.Thread(target=worker_concurrencia, args=(args, generador, resultados, fin), daemon=True)
+            for _ in range(args.concurrencia)
+        ]
+        for hilo in hilos:
+            hilo.start()
+
+    for hilo in hilos:
+        hilo.join()
+
+
+def informe(args, resultados, duracion):
+    return {
+        "etiqueta": args.etiqueta,
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "configuracion": {
+            "url": args.url,
+            "modo": args.modo,
+            "lote": args.lote if args.modo.startswith("batch") else 1,
+            "gzip": bool(args.gzip and args.modo.startswith("batch")),
+            "tasa_objetivo": args.tasa,
+            "concurrencia": args.concurrencia,
+            "duracion_s": args.duracion,
+            "collares": len(args.client_ids),
+        },
+        "resultados": {
+            "duracion_s": round(duracion, 2),
+            "peticiones": resultados.peticiones,
+            "peticiones_por_s": round(resultados.peticiones / duracion, 1),
+            "lecturas_enviadas": resultados.lecturas_enviadas,
+            "lecturas_guardadas": resultados.lecturas_guardadas,
+            "lecturas_duplicadas": resultados.lecturas_duplicadas,
+            "lecturas_por_s": round(resultados.lecturas_guardadas / duracion, 1),
+            "latencia": resumen_latencias(resultados.latencias),
+            "latencia_servicio": resumen_latencias(resultados.servicio),
+            "por_codigo": resultados.por_codigo,
+            "por_codigo_lectura": resultados.por_codigo_lectura,
+            "errores_conexion": resultados.errores_conexion,
+        },
+    }
+
+
+def imprimir(datos):
+    c, r = datos["configuracion"], datos["resultados"]
+    objetivo = f"tasa {c['tasa_objetivo']}/s" if c["tasa_objetivo"] else "sin tasa"
+    print(f"\n== {c['modo']} (lote {c['lote']}{', gzip' if c['gzip'] else ''}) | {objetivo} | concurrencia {c['concurrencia']} ==")
+    print(f"Peticiones: {r['peticiones']} ({r['peticiones_por_s']}/s) | lecturas guardadas: {r['lecturas_guardadas']} ({r['lecturas_por_s']}/s), duplicadas: {r['lecturas_duplicadas']}")
+    for nombre in ("latencia", "latencia_servicio"):
+        l = r[nombre]
+        print(f"{nombre:18} p50 {l['p50_ms']} ms | p95 {l['p95_ms']} ms | p99 {l['p99_ms']} ms | máx {l['max_ms']} ms")
+    print(f"Códigos HTTP: {r['por_codigo']}")
+    if r["por_codigo_lectura"]:
+        print(f"Errores por lectura: {r['por_codigo_lectura']}")
+    if r["errores_conexion"]:
+        print(f"Errores de conexión: {r['errores_conexion']}")
+
+
+def comparar(actual, ruta):
+    with open(ruta, encoding="utf-8") as f:
+        previo = json.load(f)
+    a, p = actual["resultados"], previo["resultados"]
+    print(f"\nComparación con '{previo.get('etiqueta') or ruta}':")
+    metricas = [
+        ("peticiones_por_s", a["peticiones_por_s"], p["peticiones_por_s"]),
+        ("lecturas_por_s", a["lecturas_por_s"], p["lecturas_por_s"]),
+    ] + [
+        (f"latencia {k}", a["latencia"][k], p["latencia"][k]) for k in ("p50_ms", "p95_ms", "p99_ms")
+    ]
+    for nombre, valor, anterior in metricas:
+        if valor is None or not anterior:
+            print(f"  {nombre:22} {valor} (antes {anterior})")
+            continue
+        print(f"  {nombre:22} {valor} (antes {anterior}, {100.0 * (valor - anterior) / anterior:+.1f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de la ingesta HTTP")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--modo", choices=MODOS, default="datos")
+    parser.add_argument("--lote", type=int, default=100, help="Lecturas por petición en los modos batch")
+    parser.add_argument("--gzip", action="store_true", help="Comprimir los lotes")
+    parser.add_argument("--tasa", type=float, default=0, help="Peticiones por segundo (0 = sin pausa, a concurrencia fija)")
+    parser.add_argument("--concurrencia", type=int, default=8, help="Hilos que envían peticiones")
+    parser.add_argument("--duracion", type=float, default=30)
+    parser.add_argument("--calentamiento", type=float, default=3, help="Segundos iniciales que no se miden")
+    parser.add_argument("--collares", type=int, default=5, help="Cantidad de client_id a usar")
+    parser.add_argument("--prefijo", default="nodo-test-", help="Prefijo de los client_id (prefijo + 001, 002, ...)")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--etiqueta", default="", help="Nombre de la corrida en el JSON")
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para comparar")
+    args = parser.parse_args()
+
+    args.client_ids = [f"{args.prefijo}{i:03d}" for i in range(1, args.collares + 1)]
+    # Un solo generador para el calentamiento y la medición: los timestamps no se repiten
+    generador = GeneradorLecturas(args.client_ids)
+
+    if args.calentamiento:
+        print(f"Calentamiento ({args.calentamiento} s)...")
+        correr(args, generador, args.calentamiento, Resultados())
+
+    print(f"Midiendo ({args.duracion} s)...")
+    resultados = Resultados()
+    inicio = time.perf_counter()
+    correr(args, generador, args.duracion, resultados)
+    datos = informe(args, resultados, time.perf_counter() - inicio)
+
+    imprimir(datos)
+    if args.comparar:
+        comparar(datos, args.comparar)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.salida}")
@@ -3,141 +3,102 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Nodo")))
 
-import json
-import random
 import time
-from datetime import datetime
-from shapely.geometry import shape, Point
-from sqlalchemy import func
+import argparse
+from datetime import datetime, timedelta
 from sqlalchemy.orm import joinedload
 
 from Project import create_app, db
-from Project.models import Animal, Ubicacion, UbicacionActual, Collar, AsignacionCollar
-
-
-def get_random_point_within(polygon):
-    minx, miny, maxx, maxy = polygon.bounds
-    while True:
-        p = Point(random.uniform(minx, maxx), random.uniform(miny, maxy))
-        if polygon.contains(p):
-            return p
-
+from Project.models import Animal, Collar, AsignacionCollar
+from Project.backend.src.Services.ingesta import guardar_lecturas
+from escenarios import Escenario, poligono_de_geojson
+
+"""
+Simula el movimiento de todos los animales con collar escribiendo directo en la base
+(sin MQTT ni API), con el motor de Nodo/escenarios.py: caminata correlacionada dentro de
+la parcela de cada animal y, opcionalmente, los eventos de un escenario JSON.
+
+    python tests/cluster_movement.py --escenario escenario.json --semilla 7 --aceleracion 60
+"""
+
+
+def cargar_animales():
+    """(collar_id, animal_id, anillo) de los animales con collar activo y parcela con perímetro."""
+    filas = (
+        db.session.query(Animal, AsignacionCollar.collar_id)
+        .join(
+            AsignacionCollar,
+            (AsignacionCollar.animal_id == Animal.id) & (AsignacionCollar.fecha_fin.is_(None)),
+        )
+        .options(joinedload(Animal.parcela))
+        .all()
+    )
 
-def initialize_positions():
-    animales = db.session.query(Animal).options(joinedload(Animal.parcela)).all()
-    for animal in animales:
+    animales = []
+    for animal, collar_id in filas:
         if not animal.parcela or not animal.parcela.perimetro_geojson:
             continue
-
         try:
-            geojson = json.loads(animal.parcela.perimetro_geojson)
-            polygon = shape(geojson["geometry"])
+            anillo = poligono_de_geojson(animal.parcela.perimetro_geojson)
         except Exception as e:
             print(f"Error leyendo GeoJSON para Parcela ID {animal.parcela.id}: {e}")
             continue
-
-        punto = get_random_point_within(polygon)
-
-        collar_id = db.session.query(AsignacionCollar.collar_id).filter(
-            AsignacionCollar.animal_id == animal.id,
-            AsignacionCollar.fecha_fin.is_(None)
-        ).scalar()
-
-        if not collar_id:
-            continue
-
-        ubicacion = Ubicacion(
-            timestamp=datetime.utcnow(),
-            lat=punto.y,
-            lon=punto.x,
-            collar_id=collar_id
-        )
-        db.session.add(ubicacion)
-    db.session.commit()
-    print("Inicialización completa.")
-
-
-def update_positions():
-    # Subconsulta que devuelve (collar_id, timestamp) más reciente
-    subq = (
-        db.session.query(
-            Ubicacion.collar_id,
-            func.max(Ubicacion.timestamp).label("max_ts")
-        )
-        .group_by(Ubicacion.collar_id)
-        .subquery()
-    )
-
-    # Join entre Ubicacion y subconsulta para obtener las últimas ubicaciones por collar
-    posiciones = (
-        db.session.query(Ubicacion)
-        .join(subq, (Ubicacion.collar_id == subq.c.collar_id) & (Ubicacion.timestamp == subq.c.max_ts))
-        .all()
-    )
-
-    for pos in posiciones:
-        nuevo_punto = Point(
-            pos.lon + random.uniform(-0.0002, 0.0002),
-            pos.lat + random.uniform(-0.0002, 0.0002)
-        )
-
-        nueva_ubicacion = Ubicacion(
-            timestamp=datetime.utcnow(),
-            lat=nuevo_punto.y,
-            lon=nuevo_punto.x,
-            collar_id=pos.collar_id
-        )
-        db.session.add(nueva_ubicacion)
-
+        if anillo:
+            animales.append((collar_id, animal.id, anillo))
+    return animales
+
+
+def crear_escenario(animales, ruta=None, semilla=None):
+    collares = [(collar_id, anillo) for collar_id, _, anillo in animales]
+    if ruta:
+        return Escenario.desde_json(ruta, collares, semilla=semilla)
+    return Escenario(collares, semilla=semilla, paso_s=10)
+
+
+def guardar_paso(escenario, animal_por_collar, timestamp):
+    """Guarda las lecturas del paso (ubicación, temperatura, acelerómetro y UbicacionActual) y la batería."""
+    lecturas = escenario.lecturas(timestamp)
+    for lectura in lecturas:
+        lectura["collar_id"] = lectura.pop("client_id")
+        lectura["animal_id"] = animal_por_collar[lectura["collar_id"]]
+        lectura["timestamp"] = timestamp
+
+    guardar_lecturas(lecturas)
+    db.session.bulk_update_mappings(Collar, [
+        {"id": collar_id, "bateria": round(float(bateria), 1), "ultima_actividad": timestamp}
+        for collar_id, bateria in zip(escenario.client_ids, escenario.bateria)
+    ])
     db.session.commit()
+    return len(lecturas)
 
-def update_ubicacion_actual():
-    subquery = db.session.query(
-        Ubicacion.collar_id,
-        func.max(Ubicacion.timestamp).label("max_ts")
-    ).group_by(Ubicacion.collar_id).subquery()
-
-    ubicaciones = db.session.query(Ubicacion).join(
-        subquery,
-        (Ubicacion.collar_id == subquery.c.collar_id) &
-        (Ubicacion.timestamp == subquery.c.max_ts)
-    ).all()
-
-    for ubic in ubicaciones:
-        asignacion = db.session.query(AsignacionCollar).filter_by(
-            collar_id=ubic.collar_id,
-            fecha_fin=None
-        ).first()
-        if not asignacion:
-            continue
-
-        ubic_actual = db.session.query(UbicacionActual).filter_by(
-            animal_id=asignacion.animal_id
-        ).first()
-
-        if not ubic_actual:
-            ubic_actual = UbicacionActual(animal_id=asignacion.animal_id)
 
-        ubic_actual.timestamp = ubic.timestamp
-        ubic_actual.lat = ubic.lat
-        ubic_actual.lon = ubic.lon
-        db.session.merge(ubic_actual)
-    db.session.commit()
+def run_simulation(ruta=None, semilla=None, aceleracion=1.0):
+    print("Inicializando posiciones...")
+    animales = cargar_animales()
+    escenario = crear_escenario(animales, ruta, semilla)
+    animal_por_collar = {collar_id: animal_id for collar_id, animal_id, _ in animales}
 
+    inicio = datetime.now()
+    guardar_paso(escenario, animal_por_collar, inicio)
+    print(f"Inicialización completa: {escenario.n} animales.")
 
-def run_simulation():
-    print("Inicializando posiciones...")
-    initialize_positions()
     print("Comenzando simulación...")
     while True:
-        update_positions()
-        update_ubicacion_actual()
-        print(f"[{datetime.now()}] Posiciones actualizadas.")
-        time.sleep(10)
+        time.sleep(escenario.paso_s / aceleracion)
+        escenario.paso()
+        guardadas = guardar_paso(escenario, animal_por_collar, inicio + timedelta(seconds=escenario.t))
+        print(f"[{datetime.now()}] Posiciones actualizadas ({guardadas}): {escenario.resumen()}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulación de movimiento de los animales en la base")
+    parser.add_argument("--escenario", help="JSON de escenario (ver Nodo/escenarios.py)")
+    parser.add_argument("--semilla", type=int, help="Semilla para reproducir la simulación")
+    parser.add_argument("--aceleracion", type=float, default=1.0, help="Segundos simulados por segundo real")
+    args = parser.parse_args()
+
     app = create_app()
     with app.app_context():
-        run_simulation()
+        run_simulation(args.escenario, args.semilla, args.aceleracion)